@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Mini Shell builtin benchmarks
+Times grep, sort, wc, sha256sum, tail, du and find on a generated corpus, calling each
+builtin directly through MiniShell.execute_builtin, and runs the matching
+GNU command on the same files as a baseline. Results can be written as
+JSON and checked against thresholds, exiting 1 when one is exceeded.
+
+Usage: python3 benchmarks/bench_builtins.py [--scale N] [--repeat N]
+           [--only GLOB] [--json FILE] [--check THRESHOLDS] [--compare OLD.json]
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import fnmatch
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import corpus
+from mini_shell_core import MiniShell, CommandMeter
+
+RESULTS_VERSION = 1
+
+# Name and command line; {log}, {csv}, {words} and {tree} are corpus paths.
+# The same argv runs as a builtin and, with LC_ALL=C, as the GNU command.
+CASES = [
+    ('grep-literal', 'grep ERROR {log}'),
+    ('grep-count-icase', 'grep -c -i timeout {log}'),
+    ('grep-regex', 'grep -c status=5[0-9][0-9] {log}'),
+    ('grep-recursive', 'grep -r -l needle {tree}'),
+    ('wc', 'wc {log}'),
+    ('wc-lines', 'wc -l {log}'),
+    ('sha256sum', 'sha256sum {log} {csv} {words}'),
+    ('sort', 'sort {words}'),
+    ('sort-unique', 'sort -u {words}'),
+    ('sort-numeric-key', 'sort -t , -k 3,3n {csv}'),
+    ('tail', 'tail -n 1000 {log}'),
+    ('du', 'du -s {tree}'),
+    ('find-all', 'find {tree}'),
+    ('find-name', 'find {tree} -name *.py'),
+]
+
+# Runs in a fresh interpreter and starts every baseline command. A child
+# reaped with wait4 reports a peak RSS of at least its parent's RSS at fork
+# time, so baselines are forked from this small process rather than from
+# the benchmark, which holds a whole shell and its results. Output goes to
+# a temporary file: GNU grep stops at the first match when it sees that
+# its output is /dev/null.
+SPAWNER = r'''
+import os, sys, json, time, tempfile
+devnull = os.open(os.devnull, os.O_RDONLY)
+out = tempfile.TemporaryFile()
+env = dict(os.environ, LC_ALL='C')
+for line in sys.stdin:
+    argv = json.loads(line)
+    out.truncate(0)
+    start = time.perf_counter()
+    try:
+        pid = os.posix_spawnp(argv[0], argv, env,
+                              file_actions=[(os.POSIX_SPAWN_DUP2, devnull, 0),
+                                            (os.POSIX_SPAWN_DUP2, out.fileno(), 1)])
+    except OSError as e:
+        print(json.dumps(str(e)), flush=True)
+        continue
+    _, status, ru = os.wait4(pid, 0)
+    wall = time.perf_counter() - start
+    print(json.dumps([os.waitstatus_to_exitcode(status), wall, ru.ru_utime, ru.ru_stime,
+                      ru.ru_maxrss, ru.ru_inblock, ru.ru_oublock]), flush=True)
+'''
+
+
+class Spawner:
+    """Runs baseline commands through the SPAWNER process."""
+
+    def __init__(self):
+        self.proc = subprocess.Popen([sys.executable, '-I', '-S', '-c', SPAWNER],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        # What a do-nothing child weighs; subtracted to get each command's growth
+        self.floor = self.run(['true'])['maxrss']
+
+    def run(self, argv):
+        self.proc.stdin.write(json.dumps(argv) + '\n')
+        self.proc.stdin.flush()
+        reply = json.loads(self.proc.stdout.readline())
+        if isinstance(reply, str):
+            raise OSError(reply)
+        status, wall, user, sys_, maxrss, inblock, oublock = reply
+        return {'status': status, 'wall': wall, 'user': user, 'sys': sys_,
+                'maxrss': maxrss, 'inblock': inblock, 'oublock': oublock}
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+def resident_kib():
+    """This process's current RSS in KiB (0 where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        return 0
+
+
+def run_builtin(shell, argv):
+    """Run one builtin with its output going to a temporary file and measure it."""
+    out = shell.stdout
+    out.seek(0)
+    out.truncate()
+    gc.collect()
+    before = resident_kib()
+    meter = CommandMeter(builtins=True, reset_peak=True)
+    shell.execute_builtin(argv[0], argv[1:])
+    out.flush()
+    usage = meter.stop()
+    return {'status': shell.last_status, 'wall': usage.wall, 'user': usage.user,
+            'sys': usage.sys, 'maxrss': usage.maxrss, 'growth': max(usage.maxrss - before, 0),
+            'inblock': usage.inblock, 'oublock': usage.oublock}
+
+
+def summarize(runs):
+    walls = [r['wall'] for r in runs]
+    return {
+        'runs': len(runs),
+        'status': runs[-1]['status'],
+        'wall_median': round(statistics.median(walls), 6),
+        'wall_min': round(min(walls), 6),
+        'wall_max': round(max(walls), 6),
+        'user_median': round(statistics.median(r['user'] for r in runs), 6),
+        'sys_median': round(statistics.median(r['sys'] for r in runs), 6),
+        'maxrss_kib': max(r['maxrss'] for r in runs),
+        'growth_kib': max(r['growth'] for r in runs),
+        'inblock': max(r['inblock'] for r in runs),
+        'oublock': max(r['oublock'] for r in runs),
+    }
+
+
+def measure(run, argv, repeat):
+    """Warm the page cache with one untimed run, then time repeat runs."""
+    run(argv)
+    return summarize([run(argv) for _ in range(repeat)])
+
+
+def run_cases(paths, repeat, only=None, baseline=True):
+    shell = MiniShell(interactive=False)
+    out = tempfile.TemporaryFile('w+')
+    shell._io.stdout = out
+    shell._io.stdin = open(os.devnull)
+    spawner = Spawner() if baseline else None
+    results = {}
+    try:
+        for name, template in CASES:
+            if only and not any(fnmatch.fnmatchcase(name, pattern) for pattern in only):
+                continue
+            command = template.format(**paths)
+            argv = command.split()
+            result = {'command': command,
+                      'builtin': measure(lambda a: run_builtin(shell, a), argv, repeat),
+                      'baseline': None, 'ratio': None}
+            if spawner is not None:
+                def run_baseline(a):
+                    usage = spawner.run(a)
+                    usage['growth'] = max(usage['maxrss'] - spawner.floor, 0)
+                    return usage
+                try:
+                    result['baseline'] = measure(run_baseline, argv, repeat)
+                except (OSError, ValueError) as e:
+                    print(f"{name}: baseline failed: {e}", file=sys.stderr)
+                else:
+                    base = result['baseline']['wall_median']
+                    if base > 0:
+                        result['ratio'] = round(result['builtin']['wall_median'] / base, 3)
+            results[name] = result
+            print_row(name, result)
+    finally:
+        if spawner is not None:
+            spawner.close()
+        out.close()
+        shell._io.stdin.close()
+    return results
+
+
+def print_header():
+    print(f"{'case':<18} {'builtin ms':>11} {'gnu ms':>9} {'ratio':>7} "
+          f"{'growth MiB':>11} {'gnu MiB':>8}  status", file=sys.stderr)
+
+
+def print_row(name, result):
+    b, g = result['builtin'], result['baseline']
+    gnu_ms = f"{g['wall_median'] * 1000:9.1f}" if g else f"{'-':>9}"
+    gnu_mib = f"{g['growth_kib'] / 1024:8.1f}" if g else f"{'-':>8}"
+    ratio = f"{result['ratio']:7.2f}" if result['ratio'] is not None else f"{'-':>7}"
+    status = str(b['status']) + (f"/{g['status']}" if g else '')
+    print(f"{name:<18} {b['wall_median'] * 1000:11.1f} {gnu_ms} {ratio} "
+          f"{b['growth_kib'] / 1024:11.1f} {gnu_mib}  {status}", file=sys.stderr)
+
+
+def check_thresholds(results, thresholds):
+    """Limits per case, falling back to the defaults; returns the violations.
+
+    max_ratio bounds the builtin's median wall time as a multiple of the
+    baseline's, max_growth_mib its peak memory above the starting RSS.
+    """
+    failures = []
+    defaults = thresholds.get('default', {})
+    for name, result in results.items():
+        limits = dict(defaults, **thresholds.get('cases', {}).get(name, {}))
+        ratio = result['ratio']
+        if 'max_ratio' in limits and ratio is not None and ratio > limits['max_ratio']:
+            failures.append(f"{name}: {ratio:.2f}x the baseline (limit {limits['max_ratio']}x)")
+        growth = result['builtin']['growth_kib'] / 1024
+        if 'max_growth_mib' in limits and growth > limits['max_growth_mib']:
+            failures.append(f"{name}: {growth:.1f} MiB memory growth "
+                            f"(limit {limits['max_growth_mib']} MiB)")
+    return failures
+
+
+def compare_results(results, previous, tolerance):
+    """Cases whose builtin got more than tolerance slower than in previous.
+
+    Wall times are compared as ratios to the baseline when both runs have
+    one, which cancels out most of the difference between machines.
+    """
+    failures = []
+    for name, result in results.items():
+        old = previous.get('cases', {}).get(name)
+        if old is None:
+            continue
+        if result['ratio'] is not None and old.get('ratio'):
+            before, after, unit = old['ratio'], result['ratio'], 'x baseline'
+        else:
+            before = old['builtin']['wall_median']
+            after, unit = result['builtin']['wall_median'], 's'
+        if before > 0 and after > before * (1 + tolerance):
+            failures.append(f"{name}: {before:.3f} -> {after:.3f}{unit} "
+                            f"(+{(after / before - 1) * 100:.0f}%)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Mini Shell builtins against GNU tools.")
+    parser.add_argument('--scale', type=float, default=1.0, help="corpus size multiplier")
+    parser.add_argument('--seed', type=int, default=1, help="corpus random seed")
+    parser.add_argument('--corpus', metavar='DIR',
+                        help="where to generate the corpus (default: a directory in $TMPDIR)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per command")
+    parser.add_argument('--only', action='append', metavar='GLOB', help="run matching cases only")
+    parser.add_argument('--no-baseline', action='store_true', help="skip the GNU commands")
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON ('-' for stdout)")
+    parser.add_argument('--check', metavar='FILE', help="fail if a threshold in FILE is exceeded")
+    parser.add_argument('--compare', metavar='FILE', help="fail on regressions against older results")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown for --compare (default 0.25)")
+    args = parser.parse_args()
+
+    dest = args.corpus or os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                                       f"minishell-bench-{args.scale:g}-{args.seed}")
+    print(f"Corpus: {dest}", file=sys.stderr)
+    paths = corpus.generate(dest, args.scale, args.seed)
+
+    print_header()
+    results = run_cases(paths, max(args.repeat, 1), args.only, not args.no_baseline)
+    report = {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'scale': args.scale,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'cases': results,
+    }
+    if args.json == '-':
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    failures = []
+    if args.check:
+        with open(args.check) as f:
+            failures += check_thresholds(results, json.load(f))
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare_results(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
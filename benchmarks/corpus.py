@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Deterministic benchmark corpora for Mini Shell
+Generates a web-server style log, a CSV file, a word list and a deep
+directory tree. The same scale and seed always give byte-identical files,
+so timings from different runs and machines are comparable.
+
+Usage: python3 benchmarks/corpus.py [--scale N] [--seed N] DIR
+"""
+
+import os
+import sys
+import json
+import math
+import random
+import shutil
+import argparse
+
+# Bump when the generated files change, so stale corpora are rebuilt
+CORPUS_VERSION = 1
+
+LEVELS = ['INFO'] * 14 + ['DEBUG'] * 3 + ['WARN'] * 2 + ['ERROR']
+METHODS = ['GET'] * 6 + ['POST'] * 2 + ['PUT', 'DELETE']
+STATUSES = [200] * 16 + [201, 204, 301, 304, 400, 401, 403, 404, 404, 500, 502, 503]
+WORDS = ('alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima '
+         'mike november oscar papa quebec romeo sierra tango uniform victor whiskey '
+         'xray yankee zulu timeout retry cache session token upstream backend').split()
+CITIES = ['Amsterdam', 'Berlin', 'Chicago', 'Delhi', 'Lagos', 'Lima', 'Oslo',
+          'Osaka', 'Paris', 'Quito', 'Seoul', 'Sydney', 'Toronto', 'Zurich']
+EXTENSIONS = ['.py', '.txt', '.log', '.json', '.md', '.csv']
+
+# Base sizes, multiplied by --scale
+LOG_LINES = 200000
+CSV_ROWS = 200000
+WORD_LINES = 200000
+TREE_DEPTH = 5
+TREE_FANOUT = 4
+TREE_FILES = 4
+
+
+def log_line(rng, n):
+    """One access-log line; n is the line number, used as a timestamp."""
+    level = rng.choice(LEVELS)
+    seconds = 1700000000 + n // 7
+    path = '/'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    message = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 9)))
+    return (f"{seconds} {level} {rng.randint(1, 64):02d} {rng.choice(METHODS)} /{path} "
+            f"status={rng.choice(STATUSES)} ms={rng.randint(1, 5000)} "
+            f"user={rng.randint(1, 99999)} {message}\n")
+
+
+def write_log(path, rng, lines):
+    with open(path, 'w') as f:
+        f.writelines(log_line(rng, n) for n in range(lines))
+
+
+def write_csv(path, rng, rows):
+    with open(path, 'w') as f:
+        f.write('id,name,score,city,balance\n')
+        for n in range(rows):
+            name = rng.choice(WORDS).capitalize() + ' ' + rng.choice(WORDS).capitalize()
+            f.write(f"{n},{name},{rng.randint(0, 1000000)},{rng.choice(CITIES)},"
+                    f"{rng.uniform(-5000, 5000):.2f}\n")
+
+
+def write_words(path, rng, lines):
+    with open(path, 'w') as f:
+        f.writelines(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) + '\n'
+                     for _ in range(lines))
+
+
+def write_tree(root, rng, depth, fanout, files):
+    """A directory tree fanout wide and depth deep with files in every directory."""
+    stack = [(root, 0)]
+    while stack:
+        path, level = stack.pop()
+        os.makedirs(path, exist_ok=True)
+        for i in range(files):
+            name = os.path.join(path, f"file{i}{rng.choice(EXTENSIONS)}")
+            with open(name, 'w') as f:
+                f.writelines(log_line(rng, n) for n in range(rng.randint(1, 40)))
+                if rng.random() < 0.05:
+                    f.write('the needle is here\n')
+        if level < depth:
+            for i in range(fanout):
+                stack.append((os.path.join(path, f"{rng.choice(WORDS)}{i}"), level + 1))
+
+
+def generate(dest, scale=1.0, seed=1):
+    """Build the corpus in dest unless an identical one is already there.
+
+    Returns a dict naming the generated paths: log, csv, words and tree.
+    """
+    paths = {
+        'log': os.path.join(dest, 'app.log'),
+        'csv': os.path.join(dest, 'data.csv'),
+        'words': os.path.join(dest, 'words.txt'),
+        'tree': os.path.join(dest, 'tree'),
+    }
+    manifest = os.path.join(dest, 'manifest.json')
+    wanted = {'version': CORPUS_VERSION, 'scale': scale, 'seed': seed}
+    try:
+        with open(manifest) as f:
+            if json.load(f) == wanted:
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    if os.path.isdir(paths['tree']):
+        shutil.rmtree(paths['tree'])
+    os.makedirs(dest, exist_ok=True)
+    # A separate generator per file, so resizing one leaves the others alone
+    write_log(paths['log'], random.Random(f"{seed}:log"), int(LOG_LINES * scale))
+    write_csv(paths['csv'], random.Random(f"{seed}:csv"), int(CSV_ROWS * scale))
+    write_words(paths['words'], random.Random(f"{seed}:words"), int(WORD_LINES * scale))
+    # Each level multiplies the tree by the fanout, so it scales in steps
+    depth = max(TREE_DEPTH + math.floor(math.log(scale, TREE_FANOUT) + 1e-9), 1)
+    write_tree(paths['tree'], random.Random(f"{seed}:tree"), depth, TREE_FANOUT, TREE_FILES)
+    with open(manifest, 'w') as f:
+        json.dump(wanted, f)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the Mini Shell benchmark corpus.")
+    parser.add_argument('dest', help="directory to create the files in")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="size multiplier (default 1: about 60 MB)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    for name, path in generate(args.dest, args.scale, args.seed).items():
+        print(f"{name}\t{path}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
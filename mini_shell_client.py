@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Mini Shell client for server mode
+Runs a command line in a `mini_shell.py --server` and copies back its
+output and exit status. It imports nothing from the shell, so a call
+costs little more than starting the interpreter; the launcher hands
+--client straight to this module.
+
+Usage: mini_shell.py --client[=SOCKET] -c COMMANDS
+"""
+
+import os
+import sys
+import signal
+import socket
+
+# Shell server protocol. Both ways a stream of frames: a kind byte, a
+# 4-byte big-endian length and the payload. The client sends 'r' (the
+# request, see encode_request; its stdin travels along as an SCM_RIGHTS
+# descriptor) and then 'i' for each Ctrl+C; the server answers with '1'
+# (stdout data), '2' (stderr data) and finally 'x' (the exit status in
+# decimal).
+FRAME_HEADER = 5
+
+
+def default_socket_path():
+    """$MINISHELL_SOCKET, or a per-user socket in the runtime directory."""
+    path = os.environ.get('MINISHELL_SOCKET')
+    if path:
+        return path
+    base = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(base, f"minishell-{os.getuid()}.sock")
+
+
+def encode_request(command, cwd, environ):
+    """The 'r' payload: command, cwd and KEY=VALUE entries, NUL-separated.
+
+    Like execve's environment, this carries names and values as raw
+    bytes, so variables that are not valid UTF-8 arrive unchanged.
+    """
+    fields = [os.fsencode(command), os.fsencode(cwd)]
+    fields += [key + b'=' + value for key, value in environ.items()]
+    return b'\0'.join(fields)
+
+
+def decode_request(payload):
+    """Parse an 'r' payload into (command, cwd, environ as a bytes dict)."""
+    command, cwd, *entries = payload.split(b'\0')
+    environ = dict(entry.split(b'=', 1) for entry in entries if b'=' in entry)
+    return os.fsdecode(command), os.fsdecode(cwd), environ
+
+
+def send_frame(sock, kind, data=b''):
+    sock.sendall(kind + len(data).to_bytes(4, 'big') + data)
+
+
+def recv_exact(sock, n):
+    """Read exactly n bytes; returns fewer only at end of stream."""
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock, header=b''):
+    """The next (kind, payload), or None at end of stream."""
+    header += recv_exact(sock, FRAME_HEADER - len(header))
+    if len(header) < FRAME_HEADER:
+        return None
+    size = int.from_bytes(header[1:], 'big')
+    data = recv_exact(sock, size)
+    if len(data) < size:
+        return None
+    return header[:1], data
+
+
+def run_client(path, command):
+    """Run command in the server at path, copying its output; returns its status."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError as e:
+        print(f"mini-shell: cannot connect to {path}: {e.strerror}", file=sys.stderr)
+        return 2
+    payload = encode_request(command, os.getcwd(), os.environb)
+    header = b'r' + len(payload).to_bytes(4, 'big')
+    try:
+        os.fstat(0)
+    except OSError:
+        sock.sendall(header)
+    else:
+        socket.send_fds(sock, [header], [0])
+    sock.sendall(payload)
+
+    def interrupt(signum, frame):
+        send_frame(sock, b'i')
+    signal.signal(signal.SIGINT, interrupt)
+    outputs = {b'1': sys.stdout.buffer, b'2': sys.stderr.buffer}
+    while True:
+        frame = recv_frame(sock)
+        if frame is None:
+            print("mini-shell: lost the connection to the server", file=sys.stderr)
+            return 1
+        kind, data = frame
+        if kind == b'x':
+            return int(data)
+        out = outputs.get(kind)
+        if out is not None:
+            out.write(data)
+            out.flush()
+
+
+def main():
+    """Entry point for mini_shell.py --client[=SOCKET] -c COMMANDS."""
+    args = sys.argv[1:]
+    if not args or not args[0].startswith('--client') or args[1:2] != ['-c'] or len(args) < 3:
+        print("usage: mini_shell.py --client[=SOCKET] -c COMMANDS", file=sys.stderr)
+        sys.exit(2)
+    try:
+        sys.exit(run_client(args[0].partition('=')[2] or default_socket_path(), args[2]))
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(128 + 13)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6370 @@
+#!/usr/bin/env python3
+"""
+Mini Shell - A simple command-line interface
+Author: Your Name
+Date: November 2025
+
+The shell. Start it through the mini_shell.py launcher (or python3 -m
+mini_shell), which imports this module so its bytecode is cached.
+"""
+
+import time
+# Start of module execution, for --profile-startup when run directly
+_STARTED = time.perf_counter()
+
+import os
+import io
+import sys
+import stat
+import errno
+import fcntl
+import pwd
+import grp
+import itertools
+import importlib
+import _thread
+
+
+class LazyModule:
+    """Stand-in for a module that is imported the first time it is used.
+
+    Startup only pays for the modules the shell itself needs; the first
+    attribute access imports the real module and rebinds the global name
+    to it, so later uses go straight to the module.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        importlib.import_module(self._name)
+        top = self._name.partition('.')[0]
+        module = sys.modules[top]
+        globals()[top] = module
+        return getattr(module, attr)
+
+
+# Modules only some builtins need
+subprocess = LazyModule('subprocess')
+json = LazyModule('json')
+sqlite3 = LazyModule('sqlite3')
+shutil = LazyModule('shutil')
+fnmatch = LazyModule('fnmatch')
+re = LazyModule('re')
+mmap = LazyModule('mmap')
+tempfile = LazyModule('tempfile')
+functools = LazyModule('functools')
+concurrent = LazyModule('concurrent.futures')
+multiprocessing = LazyModule('multiprocessing')
+hashlib = LazyModule('hashlib')
+math = LazyModule('math')
+heapq = LazyModule('heapq')
+bisect = LazyModule('bisect')
+threading = LazyModule('threading')
+collections = LazyModule('collections')
+signal = LazyModule('signal')
+shlex = LazyModule('shlex')
+resource = LazyModule('resource')
+socket = LazyModule('socket')
+# The --client side and the protocol helpers the server shares with it
+mini_shell_client = LazyModule('mini_shell_client')
+# Only interactive sessions use line editing
+readline = LazyModule('readline')
+
+
+# Control operators recognised by the tokenizer, longest first.
+OPERATORS = ('>>', '|', '&', '>', '<')
+# Redirection operators; '2>' and friends are formed from '>' and '>>' by
+# a preceding unquoted 1 or 2, and '>&N' duplicates the descriptor N
+REDIRECTS = frozenset(('<', '>', '>>', '2>', '2>>', '2>&1', '>&2'))
+# Characters that make a line need the full tokenizer
+_OPERATOR_CHARS = frozenset(o[0] for o in OPERATORS)
+_SPECIAL_CHARS = _OPERATOR_CHARS | frozenset('\'"\\')
+
+
+class Operator(str):
+    """An unquoted control operator token such as '|', '&' or '>'."""
+
+
+class Argv(list):
+    """The words of a pipeline stage that has redirections.
+
+    redirects lists (operator, target) pairs in the order written; target
+    is the file name, or None for '2>&1' and '>&2'. Stages without
+    redirections stay plain lists.
+    """
+
+    def __init__(self, words=(), redirects=()):
+        super().__init__(words)
+        self.redirects = list(redirects)
+
+    def with_words(self, words):
+        """A stage with other words and the same redirections."""
+        return Argv(words, self.redirects)
+
+    def __repr__(self):
+        return f"Argv({list(self)!r}, {self.redirects!r})"
+
+
+class GlobStages(list):
+    """The stages of a parsed pipeline that has GlobWords to expand."""
+
+
+def format_stage(argv):
+    """A pipeline stage as a command line, quoted and with its redirections."""
+    words = [shlex.quote(word) for word in argv]
+    for op, target in getattr(argv, 'redirects', ()):
+        words.append(op if target is None else f"{op} {shlex.quote(target)}")
+    return ' '.join(words)
+
+
+# Characters that make an unquoted word subject to expansion
+_GLOB_CHARS = frozenset('*?[{')
+# Characters backslash-escaped in a GlobWord's pattern when quoted
+_GLOB_QUOTE = str.maketrans({c: '\\' + c for c in '\\*?[]{},'})
+
+
+class GlobWord(str):
+    """A word with unquoted glob or brace characters, expanded when run.
+
+    The string itself is the word with its quotes removed, which is what
+    is passed on when a pattern matches nothing. pattern is the same word
+    with quoted characters backslash-escaped, so they match literally.
+    """
+
+    def __new__(cls, word, pattern):
+        self = super().__new__(cls, word)
+        self.pattern = pattern
+        return self
+
+
+class PipelineClosed(BaseException):
+    """Raised in a pipeline stage when the downstream reader has gone away.
+
+    Derives from BaseException so the broad ``except Exception`` handlers
+    in the builtins don't swallow it and keep writing into a dead pipe.
+    """
+
+
+class PipeWriter(io.TextIOWrapper):
+    """Text stream over the write end of a pipe.
+
+    Turns EPIPE into PipelineClosed so an upstream builtin stops as soon as
+    a downstream stage (e.g. ``head``) has read all it needs.
+    """
+
+    def write(self, s):
+        try:
+            return super().write(s)
+        except BrokenPipeError:
+            raise PipelineClosed() from None
+
+    def flush(self):
+        try:
+            super().flush()
+        except BrokenPipeError:
+            raise PipelineClosed() from None
+
+    def close(self):
+        try:
+            super().close()
+        except (BrokenPipeError, PipelineClosed):
+            pass
+
+
+# Block size for builtin output redirected to a file
+SINK_BUFFER_SIZE = 1024 * 1024
+
+
+class _SinkBuffer(io.BufferedWriter):
+    """An OutputSink's block buffer; flush() can be held back."""
+
+    hold = False
+
+    def flush(self):
+        if not self.hold:
+            super().flush()
+
+
+class OutputSink(io.TextIOWrapper):
+    """Text stream for builtin output redirected with '>' or '>>'.
+
+    Writes collect in a SINK_BUFFER_SIZE block that goes to the file when
+    it is full and when the stream is closed, so line-at-a-time output
+    costs one system call per megabyte. write_bytes is the binary fast
+    path: it moves pending text into the block and appends the bytes
+    after it, without a flush to disk.
+    """
+
+    def __init__(self, fd):
+        super().__init__(_SinkBuffer(io.FileIO(fd, 'w'), SINK_BUFFER_SIZE),
+                         errors='surrogateescape')
+
+    def write_bytes(self, data):
+        buf = self.buffer
+        buf.hold = True
+        try:
+            self.flush()
+        finally:
+            buf.hold = False
+        buf.write(data)
+
+
+def split_command_line(line):
+    """Split a command line into words and Operator tokens.
+
+    Supports single quotes, double quotes and backslash escapes. Only
+    unquoted operator characters become Operator tokens, so ``grep '|'``
+    still passes a literal pipe to grep. Words with unquoted glob or brace
+    characters become GlobWords, expanded by the shell when they run.
+    """
+    if _SPECIAL_CHARS.isdisjoint(line):
+        # Nothing but words and whitespace
+        words = line.split()
+        if _GLOB_CHARS.isdisjoint(line):
+            return words
+        return [w if _GLOB_CHARS.isdisjoint(w) else GlobWord(w, w) for w in words]
+    tokens = []
+    word = []
+    # The word as a glob pattern, with quoted characters escaped
+    pattern = []
+    in_word = magic = quoted = False
+
+    def end_word():
+        text = ''.join(word)
+        tokens.append(GlobWord(text, ''.join(pattern)) if magic else text)
+        word.clear()
+        pattern.clear()
+
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c.isspace():
+            if in_word:
+                end_word()
+                in_word = magic = quoted = False
+            i += 1
+        elif c == "'":
+            j = line.find("'", i + 1)
+            if j < 0:
+                raise ValueError("unterminated single quote")
+            word.append(line[i + 1:j])
+            pattern.append(line[i + 1:j].translate(_GLOB_QUOTE))
+            in_word = quoted = True
+            i = j + 1
+        elif c == '"':
+            in_word = quoted = True
+            i += 1
+            start = len(word)
+            while i < n and line[i] != '"':
+                if line[i] == '\\' and i + 1 < n and line[i + 1] in '"\\$`':
+                    i += 1
+                word.append(line[i])
+                i += 1
+            if i >= n:
+                raise ValueError("unterminated double quote")
+            pattern.append(''.join(word[start:]).translate(_GLOB_QUOTE))
+            i += 1
+        elif c == '\\':
+            if i + 1 < n:
+                word.append(line[i + 1])
+                pattern.append(line[i + 1].translate(_GLOB_QUOTE))
+                in_word = quoted = True
+            i += 2
+        else:
+            op = None
+            if c in _OPERATOR_CHARS:
+                op = next((o for o in OPERATORS if line.startswith(o, i)), None)
+            if op is None:
+                word.append(c)
+                pattern.append(c)
+                magic = magic or c in _GLOB_CHARS
+                in_word = True
+                i += 1
+                continue
+            i += len(op)
+            if op[0] == '>':
+                # A lone unquoted 1 or 2 before '>' names the descriptor
+                fd = ''
+                if in_word and not quoted and word in (['1'], ['2']):
+                    fd = '' if word[0] == '1' else '2'
+                    word.clear()
+                    pattern.clear()
+                    in_word = False
+                if op == '>' and line[i:i + 2] in ('&1', '&2'):
+                    op = '>&' + line[i + 1]
+                    i += 2
+                op = fd + op
+                if op in ('>&1', '2>&2'):
+                    # Redirecting a descriptor to itself changes nothing
+                    op = None
+                elif op not in REDIRECTS:
+                    raise ValueError(f"syntax error near unexpected token `{op}'")
+            if in_word:
+                end_word()
+                in_word = magic = quoted = False
+            if op is not None:
+                tokens.append(Operator(op))
+    if in_word:
+        end_word()
+    return tokens
+
+
+def expand_braces(word, start=0):
+    """Brace-expand a glob pattern: a{b,c}d -> abd acd, {1..3} -> 1 2 3.
+
+    Like sh, braces without a top-level comma or a valid range ('{}',
+    '{1}', parallel's placeholders) are left alone, and backslash-escaped
+    characters never count. start skips a prefix already known to hold
+    no expandable braces.
+    """
+    i, n = start, len(word)
+    while i < n:
+        c = word[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c != '{':
+            i += 1
+            continue
+        # Find the matching brace and the commas at this level
+        depth, commas, j = 0, [], i + 1
+        while j < n:
+            d = word[j]
+            if d == '\\':
+                j += 2
+                continue
+            if d == '{':
+                depth += 1
+            elif d == '}':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif d == ',' and depth == 0:
+                commas.append(j)
+            j += 1
+        if j >= n:
+            return [word]
+        if commas:
+            bounds = [i] + commas + [j]
+            items = [word[a + 1:b] for a, b in zip(bounds, bounds[1:])]
+        else:
+            items = brace_sequence(word[i + 1:j])
+            if items is None:
+                i += 1
+                continue
+        prefix, suffix = word[:i], word[j + 1:]
+        result = []
+        for item in items:
+            result.extend(expand_braces(prefix + item + suffix, i))
+        return result
+    return [word]
+
+
+def brace_sequence(body):
+    """The words of a {first..last[..step]} range, or None if body isn't one."""
+    parts = body.split('..')
+    if len(parts) not in (2, 3):
+        return None
+    try:
+        step = abs(int(parts[2])) or 1 if len(parts) == 3 else 1
+    except ValueError:
+        return None
+    first, last = parts[0], parts[1]
+    try:
+        a, b = int(first), int(last)
+    except ValueError:
+        if len(first) == 1 and len(last) == 1 and first.isalpha() and last.isalpha():
+            a, b = ord(first), ord(last)
+            values = range(a, b + 1, step) if a <= b else range(a, b - 1, -step)
+            return [chr(v).translate(_GLOB_QUOTE) for v in values]
+        return None
+    values = range(a, b + 1, step) if a <= b else range(a, b - 1, -step)
+    # {01..10} pads to the wider of the two ends
+    width = max(len(first), len(last)) if first[:1] == '0' or last[:1] == '0' else 0
+    return [str(v).zfill(width) for v in values]
+
+
+def glob_has_magic(pattern):
+    """True if pattern has an unescaped *, ? or [."""
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+        elif c in '*?[':
+            return True
+        else:
+            i += 1
+    return False
+
+
+def glob_unescape(pattern):
+    """The literal text of a pattern without magic."""
+    if '\\' not in pattern:
+        return pattern
+    return re.sub(r'\\(.)', r'\1', pattern, flags=re.DOTALL)
+
+
+# Compiled glob components, by pattern
+_GLOB_REGEXES = {}
+
+
+def glob_regex(component):
+    """Compile one path component of a glob pattern.
+
+    The regex is anchored per line (re.MULTILINE) and never matches a
+    newline, so GlobExpander can run it over a whole directory listing
+    joined with newlines in one findall. Like sh, wildcards don't match
+    a leading dot.
+    """
+    regex = _GLOB_REGEXES.get(component)
+    if regex is not None:
+        return regex
+    if len(_GLOB_REGEXES) >= 1024:
+        _GLOB_REGEXES.clear()
+    out = []
+    i, n = 0, len(component)
+    while i < n:
+        c = component[i]
+        i += 1
+        if c == '\\' and i < n:
+            out.append(re.escape(component[i]))
+            i += 1
+        elif c == '*':
+            if not out or out[-1] != '[^/\n]*':
+                out.append('[^/\n]*')
+        elif c == '?':
+            out.append('[^/\n]')
+        elif c == '[':
+            j = i
+            if j < n and component[j] in '!^':
+                j += 1
+            if j < n and component[j] == ']':
+                j += 1
+            while j < n and component[j] != ']':
+                j += 1
+            if j >= n:
+                out.append('\\[')
+                continue
+            body = component[i:j]
+            i = j + 1
+            negate = body[:1] in ('!', '^')
+            if negate:
+                body = body[1:]
+            # Quoted characters arrive escaped; keep them literal in the set
+            body = re.sub(r'\\(.)', lambda m: re.escape(m.group(1)), body.replace('[', '\\['))
+            out.append(('[^/\n' if negate else '[') + body + ']')
+        else:
+            out.append(re.escape(c))
+    prefix = '' if component.startswith(('.', '\\.')) else '(?!\\.)'
+    regex = _GLOB_REGEXES[component] = re.compile('^' + prefix + ''.join(out) + '$', re.MULTILINE)
+    return regex
+
+
+def _entry_is_dir(entry):
+    """entry.is_dir(), False when a symlink's target can't be examined."""
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+class GlobExpander:
+    """Filename expansion for one command line.
+
+    Each directory is read once with os.scandir and kept as its names
+    joined by newlines, so a pattern component is matched against a whole
+    listing with one findall of its compiled regex. Directory-ness comes
+    from the scandir entries' d_type, so matching never stats an entry
+    (only symlinks are followed to see whether they point at directories).
+    """
+
+    def __init__(self):
+        # prefix ('' or ending in '/') -> (names, joined, dirs, subdirs)
+        self._listings = {}
+
+    def listing(self, prefix):
+        listing = self._listings.get(prefix)
+        if listing is None:
+            try:
+                with os.scandir(prefix or '.') as it:
+                    entries = list(it)
+            except OSError:
+                entries = []
+            names = [entry.name for entry in entries]
+            dir_entries = [entry for entry in entries if _entry_is_dir(entry)]
+            dirs = {entry.name for entry in dir_entries}
+            subdirs = [entry.name for entry in dir_entries if not entry.is_symlink()]
+            joined = '\n'.join(names)
+            if joined.count('\n') != max(len(names) - 1, 0):
+                # A name with a newline in it; match the names one by one
+                joined = None
+            listing = self._listings[prefix] = (names, joined, dirs, subdirs)
+        return listing
+
+    def match(self, prefix, regex):
+        """Names in the directory prefix that regex matches."""
+        names, joined, dirs, subdirs = self.listing(prefix)
+        if not names:
+            return []
+        if joined is None:
+            return [name for name in names if regex.fullmatch(name)]
+        return regex.findall(joined)
+
+    def walk(self, prefix):
+        """prefix and every directory below it, for '**'.
+
+        Like bash's globstar, hidden directories and symlinks to
+        directories are not descended into.
+        """
+        found = []
+        stack = [prefix]
+        while stack:
+            path = stack.pop()
+            found.append(path)
+            stack.extend(path + name + '/' for name in self.listing(path)[3]
+                         if not name.startswith('.'))
+        return found
+
+    def expand(self, pattern):
+        """Sorted paths matching a pattern with magic; [] if none do."""
+        parts = pattern.split('/')
+        prefixes = ['']
+        if parts[0] == '':
+            # Absolute: keep the leading '/' (and a second one, for '//x')
+            prefixes = ['/']
+            parts = parts[1:]
+        dir_only = len(parts) > 1 and parts[-1] == ''
+        parts = [part for part in parts if part]
+        results = []
+        for index, part in enumerate(parts):
+            last = index == len(parts) - 1
+            if part == '**':
+                dirs = [d for p in prefixes for d in self.walk(p)]
+                if not last:
+                    prefixes = dirs
+                    continue
+                # A final '**' matches everything below, files included
+                for d in dirs:
+                    names, _, subdirs, _ = self.listing(d)
+                    for name in names:
+                        if name.startswith('.'):
+                            continue
+                        if name in subdirs:
+                            results.append(d + name + '/' if dir_only else d + name)
+                        elif not dir_only:
+                            results.append(d + name)
+                break
+            if not glob_has_magic(part):
+                literal = glob_unescape(part)
+                if last:
+                    check = os.path.isdir if dir_only else os.path.lexists
+                    results = [p + literal + ('/' if dir_only else '')
+                               for p in prefixes if check(p + literal)]
+                else:
+                    prefixes = [p + literal + '/' for p in prefixes]
+                continue
+            regex = glob_regex(part)
+            matched = []
+            for p in prefixes:
+                names = self.match(p, regex)
+                if not names:
+                    continue
+                if last and not dir_only:
+                    matched.extend(p + name for name in names)
+                else:
+                    dirs = self.listing(p)[2]
+                    matched.extend(p + name + '/' for name in names if name in dirs)
+            if last:
+                results = matched
+            elif not matched:
+                return []
+            else:
+                prefixes = matched
+        # Only a second '**' can reach the same path twice
+        return sorted(set(results) if pattern.count('**') > 1 else results)
+
+    def expand_word(self, word, glob=True):
+        """The words a GlobWord stands for after brace and filename expansion.
+
+        Patterns that match nothing are kept as they are (without quotes
+        or escapes), like sh without nullglob.
+        """
+        words = []
+        for pattern in expand_braces(word.pattern):
+            if glob and glob_has_magic(pattern):
+                paths = self.expand(pattern)
+                if paths:
+                    words.extend(paths)
+                    continue
+            words.append(glob_unescape(pattern))
+        return words
+
+
+# Files smaller than this are read() rather than mmapped by grep
+GREP_MMAP_MIN_SIZE = 256 * 1024
+# Per-file work on at least this many files is spread over a process pool
+PARALLEL_MIN_FILES = 16
+
+
+def process_pool(workers):
+    """A ProcessPoolExecutor that is safe to start from any thread.
+
+    Builtins also run on pipeline stage and background job threads, and
+    a process forked while other threads run can deadlock on a lock one
+    of them held (a stream buffer, the history database). Workers are
+    forked directly only while the shell has a single thread; otherwise
+    they come from a forkserver, a clean single-threaded process.
+    """
+    context = None
+    if threading.active_count() > 1:
+        context = multiprocessing.get_context('forkserver')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def compile_grep_pattern(pattern, fixed=False, ignore_case=False):
+    """Compile a bytes grep pattern.
+
+    Returns None for a case-sensitive fixed string, which is searched with
+    bytes.find instead of the regex engine.
+    """
+    if fixed and not ignore_case:
+        return None
+    if fixed:
+        pattern = re.escape(pattern)
+    return re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+
+
+def grep_line_spans(buf, pattern, regex):
+    """Yield (start, end) offsets of each line in buf that matches.
+
+    The whole buffer is scanned with bytes.find (regex is None) or
+    regex.search, and only the hits are widened to their surrounding
+    line, so non-matching lines are never split out. end excludes the
+    newline. A regex hit that runs past the end of its line is checked
+    again against that line alone.
+    """
+    size = len(buf)
+    pos = 0
+    while pos < size:
+        if regex is None:
+            hit = buf.find(pattern, pos)
+            if hit < 0:
+                return
+        else:
+            m = regex.search(buf, pos)
+            if m is None:
+                return
+            hit = m.start()
+        start = buf.rfind(b'\n', 0, hit) + 1
+        end = buf.find(b'\n', hit)
+        if end < 0:
+            end = size
+        if regex is None or m.end() <= end or regex.search(buf[start:end]):
+            yield start, end
+        pos = end + 1
+
+
+def grep_inverted_spans(buf, spans):
+    """Yield the (start, end) line spans of buf that are not in spans."""
+    size = len(buf)
+    pos = 0
+    for start, end in itertools.chain(spans, ((size, size),)):
+        while pos < start:
+            eol = buf.find(b'\n', pos, start)
+            if eol < 0:
+                eol = start
+            yield pos, eol
+            pos = eol + 1
+        pos = end + 1
+
+
+def grep_file(path, pattern, fixed=False, ignore_case=False, invert=False,
+              mode='lines', show_names=True, line_numbers=False):
+    """Search one file and return (output_bytes, matched, error).
+
+    mode is 'lines', 'count' or 'list'. Matching lines are prefixed with
+    the file name when show_names is set and with their line number when
+    line_numbers is (grep -n). Large files are mmapped and small
+    ones read in one call. Module-level so grep can hand it to a process
+    pool; the output is fully formatted so the parent only has to write it.
+    """
+    regex = compile_grep_pattern(pattern, fixed, ignore_case)
+    name = os.fsencode(path)
+    try:
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < GREP_MMAP_MIN_SIZE:
+                buf = fh.read()
+            else:
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError as e:
+        return b'', False, f"{path}: {e.strerror}"
+    try:
+        spans = grep_line_spans(buf, pattern, regex)
+        if invert:
+            spans = grep_inverted_spans(buf, spans)
+        if mode == 'list':
+            matched = next(spans, None) is not None
+            return (name + b'\n' if matched else b''), matched, None
+        if mode == 'count':
+            count = sum(1 for _ in spans)
+            return (b'%s:%d\n' % (name, count) if show_names else b'%d\n' % count), count > 0, None
+        if buf.find(b'\0', 0, 8192) >= 0:
+            matched = next(spans, None) is not None
+            return (b'Binary file %s matches\n' % name if matched else b''), matched, None
+        out = []
+        prefix = name + b':' if show_names else b''
+        if not line_numbers:
+            out = [prefix + buf[start:end] + b'\n' for start, end in spans]
+            return b''.join(out), bool(out), None
+        lineno = 1
+        prev = 0
+        for start, end in spans:
+            lineno += buf[prev:start].count(b'\n')
+            prev = start
+            out.append(b'%s%d:%s\n' % (prefix, lineno, buf[start:end]))
+        return b''.join(out), bool(out), None
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+# Counts produced by wc_stream, in output order
+WC_COUNTS = ('lines', 'words', 'chars', 'bytes')
+WC_CHUNK_SIZE = 1024 * 1024
+# Every byte except UTF-8 continuation bytes (0x80-0xBF)
+_UTF8_NON_CONTINUATION = bytes(b for b in range(256) if not 0x80 <= b < 0xC0)
+
+
+def wc_stream(fh, want=frozenset(WC_COUNTS)):
+    """Count (lines, words, chars, bytes) of a binary stream.
+
+    Reads WC_CHUNK_SIZE chunks and counts each with C-level primitives:
+    bytes.count for newlines, bytes.split for words (a word straddling a
+    chunk boundary is only counted once) and bytes.translate to drop
+    continuation bytes for UTF-8 characters. Counts not in want stay 0.
+    """
+    lines = words = chars = nbytes = 0
+    in_word = False
+    count_words = 'words' in want
+    count_chars = 'chars' in want
+    for chunk in iter(lambda: fh.read(WC_CHUNK_SIZE), b''):
+        lines += chunk.count(b'\n')
+        if count_words:
+            words += len(chunk.split())
+            if in_word and not chunk[:1].isspace():
+                words -= 1
+            in_word = not chunk[-1:].isspace()
+        if count_chars:
+            chars += len(chunk) - len(chunk.translate(None, _UTF8_NON_CONTINUATION))
+        nbytes += len(chunk)
+    return lines, words, chars, nbytes
+
+
+def wc_file(path, want=frozenset(WC_COUNTS)):
+    """Count one file for wc and return (counts, error).
+
+    When only the byte count is wanted for a regular file it comes from
+    fstat without reading. Module-level so wc can use a process pool.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            st = os.fstat(fh.fileno())
+            if want == {'bytes'} and stat.S_ISREG(st.st_mode):
+                return (0, 0, 0, st.st_size), None
+            return wc_stream(fh, want), None
+    except OSError as e:
+        return None, f"{path}: {e.strerror}"
+
+
+# Checksum builtins and the hashlib algorithm behind each
+CHECKSUM_ALGORITHMS = {'md5sum': 'md5', 'sha1sum': 'sha1',
+                       'sha256sum': 'sha256', 'sha512sum': 'sha512'}
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+def checksum_stream(fh, algorithm):
+    """Hash a binary stream in CHECKSUM_CHUNK_SIZE reads; returns the hex digest.
+
+    Reads go into one reused buffer. hashlib releases the GIL while it
+    hashes a chunk this size, so threads hashing different files run in
+    parallel.
+    """
+    h = hashlib.new(algorithm)
+    buf = bytearray(CHECKSUM_CHUNK_SIZE)
+    view = memoryview(buf)
+    readinto = getattr(fh, 'readinto', None)
+    if readinto is None:
+        for chunk in iter(functools.partial(fh.read, CHECKSUM_CHUNK_SIZE), b''):
+            h.update(chunk)
+        return h.hexdigest()
+    while True:
+        n = readinto(buf)
+        if not n:
+            break
+        h.update(view[:n])
+    return h.hexdigest()
+
+
+def checksum_file(path, algorithm):
+    """Hash one file and return (digest, stat, error).
+
+    stat is the file's fstat from when it was opened, which the checksum
+    cache records the digest under. Files smaller than a chunk are read
+    in one call, without setting up a chunk buffer.
+    """
+    try:
+        with open(path, 'rb', buffering=0) as fh:
+            st = os.fstat(fh.fileno())
+            if stat.S_ISREG(st.st_mode) and st.st_size < CHECKSUM_CHUNK_SIZE:
+                return hashlib.new(algorithm, fh.read()).hexdigest(), st, None
+            return checksum_stream(fh, algorithm), st, None
+    except OSError as e:
+        return None, None, f"{path}: {e.strerror}"
+
+
+def checksum_line(digest, name):
+    """A sha256sum-style output line; names with a newline or backslash are escaped."""
+    if '\\' in name or '\n' in name or '\r' in name:
+        name = name.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+        return f"\\{digest}  {name}\n"
+    return f"{digest}  {name}\n"
+
+
+_CHECKSUM_LINE = None
+
+
+def parse_checksum_line(line, algorithm):
+    """Parse one line of a checksum manifest into (digest, name), or None.
+
+    Accepts the 'DIGEST  NAME' lines the checksum builtins print (with
+    '*' marking binary mode, and a leading backslash for escaped names)
+    and BSD-style 'SHA256 (NAME) = DIGEST' lines.
+    """
+    global _CHECKSUM_LINE
+    if _CHECKSUM_LINE is None:
+        _CHECKSUM_LINE = re.compile(
+            r'(\\?)(?:([0-9a-fA-F]+) [ *](.*)|(\w+) \((.*)\) = ([0-9a-fA-F]+))$', re.DOTALL)
+    m = _CHECKSUM_LINE.match(line)
+    if m is None:
+        return None
+    escaped, digest, name, tag, tag_name, tag_digest = m.groups()
+    if tag is not None:
+        if tag.replace('-', '').lower() != algorithm:
+            return None
+        digest, name = tag_digest, tag_name
+    if len(digest) != hashlib.new(algorithm).digest_size * 2 or not name:
+        return None
+    if escaped:
+        name = re.sub(r'\\(.)', lambda e: {'n': '\n', 'r': '\r'}.get(e.group(1), e.group(1)), name)
+    return digest.lower(), name
+
+
+# Default in-memory run size for sort (-S)
+SORT_BUFFER_SIZE = 64 * 1024 * 1024
+# Rough per-line cost of a Python str in a list, used against -S
+SORT_LINE_OVERHEAD = 64
+# Maximum number of runs merged at once; more runs are merged in passes
+SORT_MERGE_FANIN = 64
+# Compiled on first use by numeric_prefix
+_NUMERIC_PREFIX = None
+_SIZE_SUFFIXES = {'': 1, 'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_size(text):
+    """Parse a size such as '512', '64K', '100M' or '2G' into bytes."""
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([bkmgt]?)', text.strip().lower())
+    if not m:
+        raise ValueError(f"invalid size: '{text}'")
+    return int(float(m.group(1)) * _SIZE_SUFFIXES[m.group(2)])
+
+
+def numeric_prefix(text):
+    """Return the leading number of text as a float (0.0 if none), like sort -n."""
+    global _NUMERIC_PREFIX
+    if _NUMERIC_PREFIX is None:
+        _NUMERIC_PREFIX = re.compile(r'\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+))')
+    m = _NUMERIC_PREFIX.match(text)
+    return float(m.group(1)) if m else 0.0
+
+
+class SortKey:
+    """Picklable sort key built from sort's -n, -t, -k and -u options.
+
+    keys is a list of (first_field, last_field, numeric) with 1-based
+    field numbers; last_field None means the end of the line. Unless
+    unique is set, the whole line is appended as a last-resort key.
+    """
+
+    def __init__(self, keys=(), separator=None, numeric=False, unique=False):
+        self.keys = list(keys)
+        self.separator = separator
+        self.numeric = numeric
+        self.unique = unique
+
+    def __call__(self, line):
+        if self.keys:
+            fields = line.split(self.separator)
+            joiner = self.separator or ' '
+            parts = tuple(
+                numeric_prefix(joiner.join(fields[first - 1:last])) if numeric
+                else joiner.join(fields[first - 1:last])
+                for first, last, numeric in self.keys)
+        else:
+            parts = (numeric_prefix(line) if self.numeric else line,)
+        return parts if self.unique else parts + (line,)
+
+
+def write_sort_run(lines, key, reverse, tmpdir):
+    """Sort lines and spill them to a new temp file; returns its path.
+
+    Module-level so sort can hand runs to a process pool.
+    """
+    lines.sort(key=key, reverse=reverse)
+    fd, path = tempfile.mkstemp(prefix='minishell-sort-', dir=tmpdir)
+    with open(fd, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        for i in range(0, len(lines), 4096):
+            f.write('\n'.join(lines[i:i + 4096]))
+            f.write('\n')
+    return path
+
+
+def read_sort_run(path):
+    """Yield the lines of a spilled run without their newlines."""
+    with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        for line in f:
+            yield line[:-1]
+
+
+# Edit distance after which diff settles for a good split over the optimal one
+DIFF_COST_LIMIT = 256
+DIFF_CHUNK_SIZE = 1024 * 1024
+
+
+def _diff_split(a, a0, a1, b, b0, b1):
+    """Find a point (i, j) on a shortest edit path of a[a0:a1] -> b[b0:b1].
+
+    Runs Myers' O(ND) search forward from the start and backward from the
+    end at the same time and returns where the two meet (the middle
+    snake). Past DIFF_COST_LIMIT steps it gives up on optimality and
+    returns the furthest point the forward search reached. Returns None
+    if no split is found, in which case the ranges are treated as
+    entirely different.
+    """
+    n = a1 - a0
+    m = b1 - b0
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    vf = [-1] * (2 * max_d + 2)
+    vf[offset + 1] = 0
+    vb = vf[:]
+    delta = n - m
+    front = delta % 2 != 0
+    kf_start = kf_end = kb_start = kb_end = 0
+    for d in range(max_d):
+        if d > DIFF_COST_LIMIT:
+            best = None
+            for k in range(-d + 1 + kf_start, d - kf_end, 2):
+                x = vf[offset + k]
+                if 0 <= x <= n and 0 <= x - k <= m and (best is None or x + x - k > sum(best)):
+                    best = (x, x - k)
+            if best is None or best in ((0, 0), (n, m)):
+                return None
+            return a0 + best[0], b0 + best[1]
+        for k in range(-d + kf_start, d + 1 - kf_end, 2):
+            ko = offset + k
+            if k == -d or (k != d and vf[ko - 1] < vf[ko + 1]):
+                x = vf[ko + 1]
+            else:
+                x = vf[ko - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            vf[ko] = x
+            if x > n:
+                kf_end += 2
+            elif y > m:
+                kf_start += 2
+            elif front:
+                kbo = offset + delta - k
+                if 0 <= kbo < len(vb) and vb[kbo] != -1 and x >= n - vb[kbo]:
+                    return a0 + x, b0 + y
+        for k in range(-d + kb_start, d + 1 - kb_end, 2):
+            ko = offset + k
+            if k == -d or (k != d and vb[ko - 1] < vb[ko + 1]):
+                x = vb[ko + 1]
+            else:
+                x = vb[ko - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a1 - x - 1] == b[b1 - y - 1]:
+                x += 1
+                y += 1
+            vb[ko] = x
+            if x > n:
+                kb_end += 2
+            elif y > m:
+                kb_start += 2
+            elif not front:
+                kfo = offset + delta - k
+                if 0 <= kfo < len(vf) and vf[kfo] != -1:
+                    fx = vf[kfo]
+                    if fx >= n - x:
+                        return a0 + fx, b0 + fx - (kfo - offset)
+    return None
+
+
+def _diff_core(a, b):
+    """Return sorted (i, j) pairs of matching items in sequences a and b.
+
+    Trims the common prefix and suffix of every subproblem and splits the
+    rest at the middle snake, using an explicit stack instead of recursion.
+    """
+    matches = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            matches.append((a0, b0))
+            a0 += 1
+            b0 += 1
+        while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+            a1 -= 1
+            b1 -= 1
+            matches.append((a1, b1))
+        if a0 == a1 or b0 == b1:
+            continue
+        split = _diff_split(a, a0, a1, b, b0, b1)
+        if split is not None:
+            i, j = split
+            stack.append((i, a1, j, b1))
+            stack.append((a0, i, b0, j))
+    matches.sort()
+    return matches
+
+
+def diff_matches(a_lines, b_lines):
+    """Return sorted (i, j) pairs of lines that stay the same from a to b.
+
+    Lines are interned to integer ids and the common prefix and suffix are
+    trimmed first. Lines that occur in only one of the files can never
+    match, so they are set aside before the Myers search runs on the rest.
+    """
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    n, m = len(a), len(b)
+    pre = 0
+    while pre < n and pre < m and a[pre] == b[pre]:
+        pre += 1
+    suf = 0
+    while suf < n - pre and suf < m - pre and a[n - 1 - suf] == b[m - 1 - suf]:
+        suf += 1
+    in_a = set(a[pre:n - suf])
+    in_b = set(b[pre:m - suf])
+    a_keep = [i for i in range(pre, n - suf) if a[i] in in_b]
+    b_keep = [j for j in range(pre, m - suf) if b[j] in in_a]
+    core = _diff_core([a[i] for i in a_keep], [b[j] for j in b_keep])
+    matches = [(i, i) for i in range(pre)]
+    matches.extend((a_keep[i], b_keep[j]) for i, j in core)
+    matches.extend((n - suf + k, m - suf + k) for k in range(suf))
+    return matches
+
+
+def diff_opcodes(n, m, matches):
+    """Yield (tag, i1, i2, j1, j2) opcodes, as difflib's get_opcodes does."""
+    i = j = 0
+    equal_from = None
+    for mi, mj in matches:
+        if mi == i and mj == j:
+            if equal_from is None:
+                equal_from = (i, j)
+        else:
+            if equal_from is not None:
+                yield 'equal', equal_from[0], i, equal_from[1], j
+            tag = 'replace' if mi > i and mj > j else 'delete' if mi > i else 'insert'
+            yield tag, i, mi, j, mj
+            equal_from = (mi, mj)
+        i, j = mi + 1, mj + 1
+    if equal_from is not None:
+        yield 'equal', equal_from[0], i, equal_from[1], j
+    if i < n or j < m:
+        tag = 'replace' if i < n and j < m else 'delete' if i < n else 'insert'
+        yield tag, i, n, j, m
+
+
+def diff_hunks(codes, context=3):
+    """Group opcodes into hunks with up to context lines around each change.
+
+    Same grouping as difflib.SequenceMatcher.get_grouped_opcodes.
+    """
+    codes = list(codes) or [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _unified_range(start, stop):
+    """Format a hunk range for a unified diff header."""
+    length = stop - start
+    if length == 1:
+        return b'%d' % (start + 1)
+    return b'%d,%d' % (start + 1 if length else start, length)
+
+
+def unified_diff(a_lines, b_lines, from_label, to_label, context=3):
+    """Yield a unified diff of two lists of byte lines as byte chunks.
+
+    One chunk is produced per hunk, so output starts before the whole
+    diff has been formatted.
+    """
+    matches = diff_matches(a_lines, b_lines)
+    started = False
+    for group in diff_hunks(diff_opcodes(len(a_lines), len(b_lines), matches), context):
+        out = []
+        if not started:
+            out.append(b'--- %s\n+++ %s\n' % (os.fsencode(from_label), os.fsencode(to_label)))
+            started = True
+        first, last = group[0], group[-1]
+        out.append(b'@@ -%s +%s @@\n' % (_unified_range(first[1], last[2]),
+                                         _unified_range(first[3], last[4])))
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                lines = [(b' ', line) for line in a_lines[i1:i2]]
+            else:
+                lines = [(b'-', line) for line in a_lines[i1:i2]]
+                lines.extend((b'+', line) for line in b_lines[j1:j2])
+            for prefix, line in lines:
+                out.append(prefix + line)
+                if not line.endswith(b'\n'):
+                    out.append(b'\n\\ No newline at end of file\n')
+        yield b''.join(out)
+
+
+def files_identical(a, b):
+    """Quick content comparison: sizes first, then chunk by chunk.
+
+    Stops at the first differing chunk, so most unequal files are decided
+    without reading them to the end.
+    """
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        while True:
+            ca = fa.read(DIFF_CHUNK_SIZE)
+            if ca != fb.read(DIFF_CHUNK_SIZE):
+                return False
+            if not ca:
+                return True
+
+
+class PathEntry:
+    """os.DirEntry look-alike for a path named on the command line.
+
+    Caches its lstat result the same way a DirEntry does, so traversal
+    code can treat roots and scandir entries alike.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path.rstrip(os.sep)) or path
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.stat(self.path)
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def _mode(self, follow_symlinks):
+        try:
+            return self.stat(follow_symlinks).st_mode
+        except OSError:
+            return 0
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self._mode(follow_symlinks))
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self._mode(follow_symlinks))
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._mode(False))
+
+
+# Units for find -size; a bare number counts 512-byte blocks
+_FIND_SIZE_UNITS = {'c': 1, 'w': 2, 'b': 512, 'k': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+_FIND_TYPES = {
+    'f': lambda e: e.is_file(follow_symlinks=False),
+    'd': lambda e: e.is_dir(follow_symlinks=False),
+    'l': lambda e: e.is_symlink(),
+}
+
+
+class FindMatch:
+    """Per-entry state filled in while a find expression is evaluated."""
+
+    __slots__ = ('prune', 'printed')
+
+    def __init__(self):
+        self.prune = False
+        self.printed = False
+
+
+def _find_compare(spec, what):
+    """Parse a find numeric argument ('+N', '-N' or 'N') into a test."""
+    m = re.fullmatch(r'([-+]?)(\d+)', spec)
+    if not m:
+        raise ValueError(f"invalid argument '{spec}' to {what}")
+    sign, n = m.group(1), int(m.group(2))
+    if sign == '+':
+        return lambda v: v > n
+    if sign == '-':
+        return lambda v: v < n
+    return lambda v: v == n
+
+
+class FindExpression:
+    """Compile a find expression into a predicate over directory entries.
+
+    Supports -name, -iname, -path, -ipath, -type, -size, -mtime, -mmin,
+    -prune and -print combined with implicit AND, -a, -o, ! / -not and
+    parentheses. Predicates only stat an entry when they need its size or
+    mtime; types come from the cached d_type of the DirEntry.
+    """
+
+    def __init__(self, tokens, now=None):
+        self.tokens = list(tokens)
+        self.pos = 0
+        self.now = time.time() if now is None else now
+        self.has_print = False
+        if self.tokens:
+            self.test = self._parse_or()
+            if self.pos < len(self.tokens):
+                raise ValueError(f"unexpected argument '{self.tokens[self.pos]}'")
+        else:
+            self.test = lambda entry, match: True
+
+    def evaluate(self, entry):
+        """Return (output, prune) for one entry."""
+        match = FindMatch()
+        result = self.test(entry, match)
+        return (match.printed if self.has_print else result), match.prune
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self, what=None):
+        if self.pos >= len(self.tokens):
+            raise ValueError(f"missing argument to '{what}'")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _parse_or(self):
+        left = self._parse_and()
+        while self._peek() in ('-o', '-or'):
+            self.pos += 1
+            right = self._parse_and()
+            left = (lambda l, r: lambda e, m: l(e, m) or r(e, m))(left, right)
+        return left
+
+    def _parse_and(self):
+        left = self._parse_not()
+        while self._peek() not in (None, '-o', '-or', ')'):
+            if self._peek() in ('-a', '-and'):
+                self.pos += 1
+            right = self._parse_not()
+            left = (lambda l, r: lambda e, m: l(e, m) and r(e, m))(left, right)
+        return left
+
+    def _parse_not(self):
+        if self._peek() in ('!', '-not'):
+            self.pos += 1
+            inner = self._parse_not()
+            return lambda e, m: not inner(e, m)
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        token = self._next()
+        if token == '(':
+            inner = self._parse_or()
+            if self._next('(') != ')':
+                raise ValueError("missing ')'")
+            return inner
+        if token in ('-name', '-iname', '-path', '-ipath'):
+            flags = re.IGNORECASE if token.startswith('-i') else 0
+            regex = re.compile(fnmatch.translate(self._next(token)), flags)
+            if token.endswith('name'):
+                return lambda e, m: regex.match(e.name) is not None
+            return lambda e, m: regex.match(e.path) is not None
+        if token == '-type':
+            kinds = self._next(token).split(',')
+            if not all(k in _FIND_TYPES for k in kinds):
+                raise ValueError(f"unknown argument to -type: {','.join(kinds)}")
+            tests = [_FIND_TYPES[k] for k in kinds]
+            return lambda e, m: any(t(e) for t in tests)
+        if token == '-size':
+            spec = self._next(token)
+            unit = _FIND_SIZE_UNITS.get(spec[-1:], None)
+            if unit is None:
+                unit = 512
+            else:
+                spec = spec[:-1]
+            compare = _find_compare(spec, token)
+            # Sizes are rounded up to whole units, as find does
+            return lambda e, m: compare(-(-e.stat(follow_symlinks=False).st_size // unit))
+        if token in ('-mtime', '-mmin'):
+            compare = _find_compare(self._next(token), token)
+            period = 86400 if token == '-mtime' else 60
+            now = self.now
+            return lambda e, m: compare(int((now - e.stat(follow_symlinks=False).st_mtime) // period))
+        if token == '-prune':
+            def prune(e, m):
+                m.prune = True
+                return True
+            return prune
+        if token == '-print':
+            self.has_print = True
+
+            def do_print(e, m):
+                m.printed = True
+                return True
+            return do_print
+        raise ValueError(f"unknown predicate '{token}'")
+
+
+def human_size(n):
+    """Format a byte count the way coreutils -h does: 512, 4.0K, 12K, 1.3M."""
+    for unit in ('', 'K', 'M', 'G', 'T', 'P', 'E'):
+        if n < 1024 or unit == 'E':
+            break
+        n /= 1024
+    if not unit:
+        return str(int(n))
+    if n < 10 and math.ceil(n * 10) < 100:
+        return f"{math.ceil(n * 10) / 10:.1f}{unit}"
+    return f"{math.ceil(n)}{unit}"
+
+
+def format_columns(cells, widths, width):
+    """Lay out cells column-major in as few rows as fit in width, like ls -C.
+
+    widths gives the display width of each cell (cells may contain ANSI
+    colour codes). Returns the rows as a list of strings.
+    """
+    n = len(cells)
+    if not n:
+        return []
+    # No layout can use fewer rows than this
+    rows = max(1, -(-(sum(widths) + 2 * n) // (width + 2)))
+    while rows < n:
+        cols = -(-n // rows)
+        col_widths = [max(widths[c * rows:(c + 1) * rows]) for c in range(cols)]
+        if sum(col_widths) + 2 * (cols - 1) <= width:
+            break
+        rows += 1
+    else:
+        return list(cells)
+    lines = []
+    for r in range(rows):
+        parts = []
+        for c in range(cols):
+            i = c * rows + r
+            if i >= n:
+                break
+            if i + rows < n:
+                parts.append(cells[i] + ' ' * (col_widths[c] - widths[i] + 2))
+            else:
+                parts.append(cells[i])
+        lines.append(''.join(parts))
+    return lines
+
+
+def gitignore_regex(pattern):
+    """Translate one .gitignore glob into a regex matched against the
+    path relative to the directory holding the .gitignore."""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j < 0:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return re.compile(prefix + ''.join(parts) + r'\Z', re.DOTALL)
+
+
+class GitIgnore:
+    """The .gitignore rules in effect for one directory.
+
+    Each instance holds the rules from a single .gitignore and a link to
+    the rules of the enclosing directories; later rules (and deeper files)
+    override earlier ones, and '!' re-includes a path.
+    """
+
+    def __init__(self, parent, base, lines):
+        self.parent = parent
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if not line.endswith('\\ '):
+                line = line.rstrip()
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if line:
+                self.rules.append((gitignore_regex(line), negate, dir_only))
+
+    @classmethod
+    def load(cls, parent, dirpath, base):
+        """Return the rules for dirpath, reading its .gitignore if present."""
+        try:
+            with open(os.path.join(dirpath, '.gitignore'), errors='surrogateescape') as fh:
+                return cls(parent, base, fh)
+        except OSError:
+            return parent
+
+    def ignored(self, relpath, is_dir):
+        """Whether relpath (relative to the tree root) is ignored."""
+        result = self.parent.ignored(relpath, is_dir) if self.parent else False
+        sub = relpath[len(self.base):]
+        for regex, negate, dir_only in self.rules:
+            if (is_dir or not dir_only) and regex.match(sub):
+                result = not negate
+        return result
+
+
+# Bytes handed to one copy_file_range call
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# ioctl(FICLONE): make dst share src's extents (btrfs, XFS, bcachefs)
+_FICLONE = 0x40049409
+# errnos meaning "this copy method is not available here", not a real failure
+_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                         errno.ENOTTY, errno.EBADF, errno.EPERM, errno.ETXTBSY}
+
+
+# st_dev of source file systems where FICLONE has failed once already
+_NO_REFLINK_DEVICES = set()
+
+
+def copy_file_data(src_fd, dst_fd, size, dev=None):
+    """Copy the contents of src_fd to dst_fd, fastest method first.
+
+    Tries a reflink clone, then os.copy_file_range (an in-kernel copy that
+    file systems may offload), then plain read/write. Files that report a
+    size of 0 (e.g. under /proc) go straight to read/write. dev is the
+    source st_dev, used to stop trying reflinks where they never work.
+    """
+    method = 'range' if hasattr(os, 'copy_file_range') else 'read'
+    if not size:
+        method = 'read'
+    elif dev not in _NO_REFLINK_DEVICES:
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            return
+        except OSError as e:
+            if dev is not None and e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL):
+                _NO_REFLINK_DEVICES.add(dev)
+    if method == 'range':
+        try:
+            while os.copy_file_range(src_fd, dst_fd, COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    # copy_file_range advances both offsets, so this resumes where it stopped
+    while True:
+        chunk = os.read(src_fd, 1024 * 1024)
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def copy_metadata(target, st, follow_symlinks=True):
+    """Give target (a path or open fd) the owner, mode and times in st.
+
+    Ownership is best effort: it only sticks for root or when the source
+    already belongs to the caller.
+    """
+    if (st.st_uid, st.st_gid) != (os.geteuid(), os.getegid()):
+        try:
+            os.chown(target, st.st_uid, st.st_gid, follow_symlinks=follow_symlinks)
+        except OSError:
+            pass
+    if follow_symlinks:
+        os.chmod(target, stat.S_IMODE(st.st_mode))
+    os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=follow_symlinks)
+
+
+def copy_file(src, dst, st):
+    """Copy one regular file and its metadata; returns the bytes copied."""
+    src_fd = os.open(src, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+        try:
+            copy_file_data(src_fd, dst_fd, st.st_size, st.st_dev)
+            copy_metadata(dst_fd, st)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return st.st_size
+
+
+class TransferStats:
+    """Counters shared by the cp/mv copy workers."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self.lock:
+            self.files += 1
+            self.bytes += nbytes
+
+    def summary(self):
+        """e.g. '1520 files, 1.3G in 4.2s (310M/s, 361 files/s)'."""
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        text = (f"{self.files} file{'' if self.files == 1 else 's'}, {human_size(self.bytes)} "
+                f"in {elapsed:.1f}s ({human_size(int(self.bytes / elapsed))}/s, "
+                f"{self.files / elapsed:.0f} files/s)")
+        if self.skipped:
+            text += f", {self.skipped} skipped"
+        return text
+
+
+class DuNode:
+    """A directory in du's traversal, waiting for its subdirectories."""
+
+    __slots__ = ('path', 'parts', 'parent', 'size', 'pending')
+
+    def __init__(self, path, parts, parent, size):
+        self.path = path
+        self.parts = parts
+        self.parent = parent
+        self.size = size
+        self.pending = 0
+
+
+class RmNode:
+    """A directory in rm -r's traversal, removed once its children are gone.
+
+    dir_fd is the parent directory's descriptor and fd this directory's
+    own, so every unlink and rmdir is relative to an open directory.
+    """
+
+    __slots__ = ('name', 'path', 'parent', 'dir_fd', 'fd', 'pending', 'kept')
+
+    def __init__(self, name, path, parent, dir_fd):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.dir_fd = dir_fd
+        self.fd = None
+        self.pending = 0
+        # Set when something below could not (or should not) be removed
+        self.kept = False
+
+
+class CommandHash:
+    """Remembered PATH lookups for external commands, like bash's hash table.
+
+    The table is dropped whenever $PATH changes; callers forget() an
+    entry when its binary turns out to be gone, and look it up again.
+    """
+
+    def __init__(self):
+        self.table = {}
+        self.path = None
+
+    def _check_path(self):
+        path = os.environ.get('PATH', os.defpath)
+        if path != self.path:
+            self.table.clear()
+            self.path = path
+        return path
+
+    def lookup(self, name, count=True):
+        """Return the executable for name, or None if it is not in PATH."""
+        if os.sep in name:
+            return name
+        path = self._check_path()
+        entry = self.table.get(name)
+        if entry is None:
+            resolved = shutil.which(name, path=path)
+            if resolved is None:
+                return None
+            if not os.path.isabs(resolved):
+                # Relative PATH entries depend on the cwd; never remember them
+                return resolved
+            entry = self.table[name] = [resolved, 0]
+        if count:
+            entry[1] += 1
+        return entry[0]
+
+    def remember(self, name, resolved):
+        self._check_path()
+        self.table[name] = [resolved, 0]
+
+    def forget(self, name):
+        return self.table.pop(name, None) is not None
+
+    def clear(self):
+        self.table.clear()
+
+    def items(self):
+        self._check_path()
+        return sorted((name, entry[0], entry[1]) for name, entry in self.table.items())
+
+
+def exit_status(returncode):
+    """Turn a subprocess returncode into a shell status (128+N for signal N)."""
+    return 128 - returncode if returncode < 0 else returncode
+
+
+# Signals that pause or resume a job rather than end it
+_JOB_STOP_SIGNALS = ('SIGSTOP', 'SIGTSTP', 'SIGTTIN', 'SIGTTOU')
+
+
+class Job:
+    """A pipeline started in the background with '&'.
+
+    External stages run in sessions of their own, so Ctrl+C at the
+    prompt does not reach them; builtin stages run in a thread and stop
+    when cancel is set.
+    """
+
+    def __init__(self, number, command):
+        self.number = number
+        self.command = command
+        # External stages, appended as they are spawned
+        self.procs = []
+        self.cancel = threading.Event()
+        # Set once every stage has been started, and when the job ends
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.status = None
+        self.stopped = False
+
+    @property
+    def pid(self):
+        """The process id of the last external stage, if any."""
+        return self.procs[-1].pid if self.procs else None
+
+    def state(self):
+        """'Running', 'Stopped', 'Done', 'Exit N' or the name of a fatal signal."""
+        if not self.finished.is_set():
+            return 'Stopped' if self.stopped else 'Running'
+        if self.status == 0:
+            return 'Done'
+        if self.status > 128:
+            try:
+                return signal.strsignal(self.status - 128) or f"Exit {self.status}"
+            except ValueError:
+                pass
+        return f"Exit {self.status}"
+
+    def send(self, sig):
+        """Deliver sig to the job's running processes."""
+        for proc in self.procs:
+            if proc.poll() is None:
+                try:
+                    proc.send_signal(sig)
+                except ProcessLookupError:
+                    pass
+        if sig == signal.SIGCONT:
+            self.stopped = False
+        elif signal.Signals(sig).name in _JOB_STOP_SIGNALS:
+            self.stopped = True
+        elif sig:
+            # Builtin stages cannot take signals; ask them to stop instead
+            self.cancel.set()
+
+
+class JobTable:
+    """Background jobs by job number, as listed by the jobs builtin."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, command):
+        number = max(self.jobs, default=0) + 1
+        job = self.jobs[number] = Job(number, command)
+        return job
+
+    def remove(self, job):
+        self.jobs.pop(job.number, None)
+
+    def __iter__(self):
+        return iter([self.jobs[n] for n in sorted(self.jobs)])
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def current(self, previous=False):
+        """The most recent job ('%+'), or the one before it ('%-')."""
+        numbers = sorted(self.jobs)
+        index = -2 if previous else -1
+        return self.jobs[numbers[index]] if len(numbers) >= -index else None
+
+    def find(self, spec, pids=False):
+        """Return the job named by spec, or None.
+
+        spec is %N, %+ or %% (current), %- (previous) or %TEXT (a command
+        starting with TEXT). A bare number is a job number, or a process
+        id when pids is true.
+        """
+        if spec in ('%', '%%', '%+'):
+            return self.current()
+        if spec == '%-':
+            return self.current(previous=True)
+        text = spec[1:] if spec.startswith('%') else spec
+        if text.isdigit():
+            number = int(text)
+            if pids and not spec.startswith('%'):
+                return next((j for j in self if any(p.pid == number for p in j.procs)), None)
+            return self.jobs.get(number)
+        if spec.startswith('%'):
+            matches = [j for j in self if j.command.startswith(text)]
+            return matches[-1] if matches else None
+        return None
+
+    def format(self, job, pids=False):
+        """One line of jobs output, e.g. '[1]+  Running    sleep 10 &'."""
+        current = self.current()
+        mark = '+' if job is current else '-' if job is self.current(previous=True) else ' '
+        pid = f"{job.pid or '':>7} " if pids else ''
+        suffix = ' &' if not job.finished.is_set() else ''
+        return f"[{job.number}]{mark}  {pid}{job.state():<24}{job.command}{suffix}"
+
+    def reap(self):
+        """Remove finished jobs and return their jobs lines ('Done' notices)."""
+        done = [job for job in self if job.finished.is_set()]
+        lines = [self.format(job) for job in done]
+        for job in done:
+            self.remove(job)
+        return lines
+
+
+def wait_process(proc):
+    """Wait for a Popen child and return its rusage (from os.wait4).
+
+    Returns None if the child was already reaped elsewhere.
+    """
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        proc.wait()
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+
+def reset_peak_rss():
+    """Reset this process's peak RSS so ru_maxrss counts from now on.
+
+    Uses Linux's /proc/self/clear_refs; returns False where that is not
+    available, in which case ru_maxrss stays the lifetime peak.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class ResourceUsage:
+    """What one command cost: seconds, peak RSS in KiB and block I/O."""
+
+    __slots__ = ('wall', 'user', 'sys', 'maxrss', 'inblock', 'oublock')
+
+    def __init__(self, wall, user, sys, maxrss, inblock, oublock):
+        self.wall = wall
+        self.user = user
+        self.sys = sys
+        self.maxrss = maxrss
+        self.inblock = inblock
+        self.oublock = oublock
+
+    def format(self, posix=False):
+        """time's report: bash's layout, or POSIX 'time -p' with posix."""
+        if posix:
+            return f"real {self.wall:.2f}\nuser {self.user:.2f}\nsys {self.sys:.2f}\n"
+        lines = [''] + [f"{name}\t{int(t // 60)}m{t % 60:.3f}s"
+                        for name, t in (('real', self.wall), ('user', self.user), ('sys', self.sys))]
+        lines.append(f"maxrss\t{human_size(self.maxrss * 1024)}")
+        lines.append(f"io\t{self.inblock} in, {self.oublock} out (blocks)")
+        return '\n'.join(lines) + '\n'
+
+
+class CommandMeter:
+    """Measures a foreground command with getrusage.
+
+    CPU time and block I/O are the growth of RUSAGE_SELF (builtins run in
+    the shell) plus RUSAGE_CHILDREN (processes it waited for). Peak memory
+    is the largest child's, as reported by wait4, or the shell's own peak
+    when builtins were involved; resetting that peak first (reset_peak)
+    costs a few tens of microseconds, so only time does it.
+    """
+
+    def __init__(self, builtins=False, reset_peak=False):
+        self.builtins = builtins
+        if builtins and reset_peak:
+            reset_peak_rss()
+        self.child_maxrss = 0
+        self.start_self = resource.getrusage(resource.RUSAGE_SELF)
+        self.start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.start = time.perf_counter()
+
+    def add_child(self, usage):
+        """Account for a child reaped with wait_process."""
+        if usage is not None:
+            self.child_maxrss = max(self.child_maxrss, usage.ru_maxrss)
+
+    def stop(self):
+        wall = time.perf_counter() - self.start
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        deltas = [(own, self.start_self), (children, self.start_children)]
+        maxrss = self.child_maxrss
+        if self.builtins:
+            maxrss = max(maxrss, own.ru_maxrss)
+        return ResourceUsage(
+            wall,
+            sum(end.ru_utime - start.ru_utime for end, start in deltas),
+            sum(end.ru_stime - start.ru_stime for end, start in deltas),
+            maxrss,
+            sum(end.ru_inblock - start.ru_inblock for end, start in deltas),
+            sum(end.ru_oublock - start.ru_oublock for end, start in deltas))
+
+
+class CommandStats:
+    """Totals for one command name under --trace.
+
+    Wall times also go into a histogram of power-of-two microsecond
+    buckets, which stays small however many commands are recorded and
+    gives percentiles to within a factor of two.
+    """
+
+    __slots__ = ('count', 'failures', 'wall', 'user', 'sys', 'min_wall', 'max_wall',
+                 'maxrss', 'inblock', 'oublock', 'buckets')
+
+    def __init__(self):
+        self.count = self.failures = 0
+        self.wall = self.user = self.sys = 0.0
+        self.min_wall = float('inf')
+        self.max_wall = 0.0
+        self.maxrss = self.inblock = self.oublock = 0
+        # Upper bound in microseconds -> number of commands
+        self.buckets = {}
+
+    def add(self, usage, status):
+        self.count += 1
+        self.failures += status != 0
+        self.wall += usage.wall
+        self.user += usage.user
+        self.sys += usage.sys
+        self.min_wall = min(self.min_wall, usage.wall)
+        self.max_wall = max(self.max_wall, usage.wall)
+        self.maxrss = max(self.maxrss, usage.maxrss)
+        self.inblock += usage.inblock
+        self.oublock += usage.oublock
+        us = max(int(usage.wall * 1e6), 1)
+        bound = 1 << (us - 1).bit_length()
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+
+    def percentile(self, q):
+        """Wall time (seconds) below which a fraction q of the runs fall."""
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= q * self.count:
+                return min(bound / 1e6, self.max_wall)
+        return self.max_wall
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'failures': self.failures,
+            'wall_total': round(self.wall, 6),
+            'wall_mean': round(self.wall / self.count, 6),
+            'wall_min': round(self.min_wall, 6),
+            'wall_max': round(self.max_wall, 6),
+            'wall_p50': round(self.percentile(0.5), 6),
+            'wall_p90': round(self.percentile(0.9), 6),
+            'wall_p99': round(self.percentile(0.99), 6),
+            'user_total': round(self.user, 6),
+            'sys_total': round(self.sys, 6),
+            'maxrss_kib': self.maxrss,
+            'inblock': self.inblock,
+            'oublock': self.oublock,
+            # Runs taking at most N microseconds (and more than N/2)
+            'histogram_us': {str(bound): self.buckets[bound] for bound in sorted(self.buckets)},
+        }
+
+
+class PrefixIndex:
+    """A sorted list of names answering prefix queries with two bisects."""
+
+    def __init__(self, names, dirs=()):
+        self.names = sorted(set(names))
+        # Names to complete with a trailing '/'
+        self.dirs = frozenset(dirs)
+
+    def matching(self, prefix):
+        lo = bisect.bisect_left(self.names, prefix)
+        hi = bisect.bisect_left(self.names, prefix + '\U0010ffff', lo)
+        return self.names[lo:hi]
+
+
+def fuzzy_span(pattern, text):
+    """Length of the shortest window of text containing pattern as a
+    subsequence (case-insensitive), or None if it does not."""
+    pattern = pattern.lower()
+    text = text.lower()
+    best = None
+    start = text.find(pattern[0]) if pattern else -1
+    while start >= 0:
+        # Forward: where does the earliest match starting here end?
+        pos = start
+        for ch in pattern[1:]:
+            pos = text.find(ch, pos + 1)
+            if pos < 0:
+                return best
+        end = pos
+        # Backward: the latest start that still reaches end
+        for ch in reversed(pattern[:-1]):
+            pos = text.rfind(ch, 0, pos)
+        span = end - pos + 1
+        if best is None or span < best:
+            best = span
+        start = text.find(pattern[0], pos + 1)
+    return best
+
+
+class HistoryStore:
+    """Command history in SQLite, written one command at a time.
+
+    Each command is inserted when it starts and gets its exit status when
+    it finishes, so nothing is lost if the shell dies. The database runs
+    in WAL mode, letting several shells append to it concurrently. When
+    SQLite has FTS5, a trigram index serves substring searches.
+    """
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS history (
+               id INTEGER PRIMARY KEY,
+               command TEXT NOT NULL,
+               started REAL,
+               duration REAL,
+               cwd TEXT,
+               status INTEGER,
+               session INTEGER)""",
+        "CREATE INDEX IF NOT EXISTS history_command ON history(command)",
+    )
+    FTS_SCHEMA = (
+        """CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+               command, content='history', content_rowid='id', tokenize='trigram')""",
+        """CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+               INSERT INTO history_fts(rowid, command) VALUES (new.id, new.command);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+               INSERT INTO history_fts(history_fts, rowid, command)
+               VALUES ('delete', old.id, old.command);
+           END""",
+    )
+    # Compact after this many inserts
+    COMPACT_EVERY = 1000
+
+    def __init__(self, path, max_entries=100000, dedupe='consecutive'):
+        self.max_entries = max_entries
+        # 'consecutive' (like bash ignoredups), 'all' (erasedups) or 'none'
+        self.dedupe = dedupe
+        self.session = os.getpid()
+        self.lock = threading.Lock()
+        self._last = None
+        self._inserted = 0
+        self.db = sqlite3.connect(str(path), timeout=5, isolation_level=None,
+                                  check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            for statement in self.SCHEMA:
+                self.db.execute(statement)
+        try:
+            with self.db:
+                for statement in self.FTS_SCHEMA:
+                    self.db.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # No FTS5 or no trigram tokenizer: substring search scans instead
+            self.fts = False
+
+    def is_empty(self):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM history LIMIT 1').fetchone() is None
+
+    def import_lines(self, lines):
+        """Load commands from an old plain-text history file."""
+        with self.lock, self.db:
+            self.db.executemany('INSERT INTO history (command) VALUES (?)',
+                                ((line,) for line in lines if line.strip()))
+
+    def add(self, command, cwd):
+        """Record a command as it starts; returns its row id."""
+        now = time.time()
+        with self.lock, self.db:
+            if self._last is not None and self._last[1] == command and self.dedupe != 'none':
+                # Same as this session's previous command: refresh that row
+                self.db.execute('UPDATE history SET started = ?, cwd = ?, status = NULL, '
+                                'duration = NULL WHERE id = ?', (now, cwd, self._last[0]))
+                return self._last[0]
+            if self.dedupe == 'all':
+                self.db.execute('DELETE FROM history WHERE command = ?', (command,))
+            rowid = self.db.execute(
+                'INSERT INTO history (command, started, cwd, session) VALUES (?, ?, ?, ?)',
+                (command, now, cwd, self.session)).lastrowid
+        self._last = (rowid, command)
+        self._inserted += 1
+        if self._inserted % self.COMPACT_EVERY == 0:
+            self.compact()
+        return rowid
+
+    def finish(self, rowid, status, duration):
+        """Store the exit status and run time of a recorded command."""
+        with self.lock:
+            self.db.execute('UPDATE history SET status = ?, duration = ? WHERE id = ?',
+                            (status, duration, rowid))
+
+    def compact(self):
+        """Drop the oldest entries beyond max_entries."""
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM history WHERE id <= (SELECT id FROM history '
+                            'ORDER BY id DESC LIMIT 1 OFFSET ?)', (self.max_entries,))
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM history')
+        self._last = None
+
+    def recent(self, limit):
+        """Return the last limit entries, oldest first, as
+        (id, command, started, duration, cwd, status) tuples."""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT id, command, started, duration, cwd, status FROM history '
+                'ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        rows.reverse()
+        return rows
+
+    def _distinct(self, query, params, limit):
+        """Run query (newest first) and keep the first row per command.
+
+        Rows are pulled from SQLite one at a time, so the scan stops as
+        soon as limit distinct commands have been found.
+        """
+        seen = set()
+        rows = []
+        with self.lock:
+            for row in self.db.execute(query, params):
+                if row[1] not in seen:
+                    seen.add(row[1])
+                    rows.append(row)
+                    if len(rows) >= limit:
+                        break
+        return rows
+
+    def _like(self, text):
+        return re.sub(r'([%_\\])', r'\\\1', text)
+
+    def search(self, text, limit):
+        """Most recent distinct commands containing text (case-insensitive)."""
+        columns = 'h.id, h.command, h.started, h.duration, h.cwd, h.status'
+        if self.fts and len(text) >= 3:
+            query = (f'SELECT {columns} FROM history_fts JOIN history h ON h.id = history_fts.rowid '
+                     'WHERE history_fts MATCH ? ORDER BY history_fts.rowid DESC')
+            param = '"' + text.replace('"', '""') + '"'
+        else:
+            query = (f"SELECT {columns} FROM history h WHERE h.command LIKE ? ESCAPE '\\' "
+                     'ORDER BY h.id DESC')
+            param = '%' + self._like(text) + '%'
+        rows = self._distinct(query, (param,), limit)
+        rows.reverse()
+        return rows
+
+    def fuzzy(self, text, limit, candidates=2000):
+        """Distinct commands containing the characters of text in order,
+        best (tightest) matches last; ties go to the most recent."""
+        pattern = '%' + '%'.join(self._like(c) for c in text) + '%'
+        rows = self._distinct(
+            'SELECT id, command, started, duration, cwd, status FROM history '
+            "WHERE command LIKE ? ESCAPE '\\' ORDER BY id DESC", (pattern,), candidates)
+        scored = []
+        for row in rows:
+            span = fuzzy_span(text, row[1])
+            if span is not None:
+                scored.append((span, -row[0], row))
+        scored.sort()
+        best = [row for _, _, row in scored[:limit]]
+        best.reverse()
+        return best
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class ChecksumCache:
+    """Digests of files in SQLite, reused while a file looks unchanged.
+
+    An entry is keyed by the file's absolute path and the algorithm and is
+    only used while the file's size, mtime_ns and inode still match, so
+    re-hashing a mostly unchanged tree costs a stat per file. Files
+    modified within RACY_NS of being hashed are not recorded: a write in
+    the same timestamp tick would leave the mtime unchanged. New digests
+    are buffered and written in batches.
+    """
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS checksums (
+                    path BLOB NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    digest TEXT,
+                    PRIMARY KEY (path, algorithm)) WITHOUT ROWID"""
+    RACY_NS = 2 * 10 ** 9
+    # Digests buffered before they are written in one transaction
+    WRITE_BATCH = 1000
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self._pending = []
+        self.db = sqlite3.connect(str(path), timeout=5, isolation_level=None,
+                                  check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(self.SCHEMA)
+
+    @staticmethod
+    def _key(path):
+        return os.fsencode(os.path.abspath(path))
+
+    def lookup(self, path, algorithm, st):
+        """The recorded digest of path if it still has st's size, mtime and inode."""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT digest FROM checksums WHERE path = ? AND algorithm = ? '
+                'AND size = ? AND mtime_ns = ? AND inode = ?',
+                (self._key(path), algorithm, st.st_size, st.st_mtime_ns, st.st_ino)).fetchone()
+        return row[0] if row else None
+
+    def store(self, path, algorithm, st, digest):
+        if time.time_ns() - st.st_mtime_ns < self.RACY_NS:
+            return
+        with self.lock:
+            self._pending.append((self._key(path), algorithm, st.st_size,
+                                  st.st_mtime_ns, st.st_ino, digest))
+            if len(self._pending) >= self.WRITE_BATCH:
+                self._write()
+
+    def _write(self):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?)',
+                                self._pending)
+        self._pending.clear()
+
+    def flush(self):
+        with self.lock:
+            if self._pending:
+                self._write()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.db.close()
+
+
+_PARALLEL_PLACEHOLDER = None
+
+
+def parallel_argv(command, values):
+    """Build the argv of one parallel job from its command template.
+
+    '{}' stands for all of the job's values and '{N}' for the Nth; '.',
+    '/', '//' or '/.' before the closing brace removes the extension,
+    keeps the basename, keeps the dirname or keeps the basename without
+    its extension. Without any placeholder the values are appended.
+    """
+    global _PARALLEL_PLACEHOLDER
+    if _PARALLEL_PLACEHOLDER is None:
+        _PARALLEL_PLACEHOLDER = re.compile(r'\{(\d*)(\.|/|//|/\.)?\}')
+    used = False
+
+    def replace(m):
+        nonlocal used
+        used = True
+        index = int(m.group(1) or 0)
+        if index > len(values):
+            raise ValueError(f"{m.group(0)}: there are only {len(values)} input sources")
+        value = values[index - 1] if index else ' '.join(values)
+        modifier = m.group(2)
+        if modifier in ('/', '/.'):
+            value = os.path.basename(value)
+        elif modifier == '//':
+            value = os.path.dirname(value)
+        if modifier in ('.', '/.'):
+            value = os.path.splitext(value)[0]
+        return value
+
+    argv = [_PARALLEL_PLACEHOLDER.sub(replace, word) if '{' in word else word for word in command]
+    if not used:
+        argv.extend(values)
+    return argv
+
+
+def iter_tree_files(root):
+    """Yield regular files below root in sorted, depth-first order.
+
+    Symlinked directories are not followed.
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+            except OSError:
+                pass
+        stack.extend(reversed(subdirs))
+
+
+class MiniShell:
+    """A simple command-line shell with basic commands, aliases, and reverse search."""
+    
+    def __init__(self, interactive=True):
+        self.running = True
+        # False for -c and scripts: no readline, prompt or history
+        self.interactive = interactive
+        self.current_dir = os.getcwd()
+        home = os.path.expanduser('~')
+        self.config_file = os.path.join(home, ".minishell_config.json")
+        self.history_db = os.path.join(home, ".minishell_history.db")
+        # Digests recorded by the checksum builtins' --cache
+        self.checksum_db = os.path.join(home, ".minishell_checksums.db")
+        self._checksum_cache = None
+        # Plain-text history of older versions, imported once
+        self.history_file = os.path.join(home, ".minishell_history")
+        # Config and history are loaded on first use (see the aliases and
+        # history properties), so they never delay the first prompt
+        self._aliases = None
+        # Settings for the history store ('max_entries', 'dedupe')
+        self.history_settings = {}
+        self._history = None
+        # Exit status of the last command
+        self.last_status = 0
+        # Shell options turned on with set (see cmd_set)
+        self.options = set()
+        # Per-command timings recorded under set -o trace, by command name
+        self.trace = {}
+        # Parsed pipelines by command line; cleared when aliases change
+        self._parse_cache = {}
+        self._builtins = None
+        # Resolved paths of external commands (see cmd_hash)
+        self.command_hash = CommandHash()
+        # Pipelines started with '&'
+        self.job_table = JobTable()
+        # Per-thread stdin/stdout so builtins can run as pipeline stages
+        # (threading.local itself, without importing all of threading)
+        self._io = _thread._local()
+        # Tab completion: command index and per-directory listings
+        self._command_index = None
+        self._command_index_key = None
+        self._dir_indexes = {}
+        self._completions = []
+        
+        # Setup readline for command history and reverse search
+        if interactive:
+            self.setup_readline()
+        
+    @property
+    def aliases(self):
+        """The alias table; the config file is read when first needed."""
+        if self._aliases is None:
+            self.load_config()
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, value):
+        self._aliases = value
+        self._parse_cache.clear()
+
+    @property
+    def history(self):
+        """The HistoryStore, opened when first needed."""
+        if self._history is None:
+            self.load_history()
+        return self._history
+
+    def setup_readline(self):
+        """Configure readline for command history and reverse search."""
+        # Enable tab completion
+        readline.set_completer(self.complete)
+        readline.set_completer_delims(' \t\n|&')
+        readline.parse_and_bind("tab: complete")
+        
+        # Set history length
+        readline.set_history_length(self.READLINE_HISTORY)
+
+    def load_readline_history(self):
+        """Load recent history into readline for arrow keys and Ctrl+R."""
+        if not self.interactive:
+            return
+        for entry in self.history.recent(self.READLINE_HISTORY):
+            readline.add_history(entry[1])
+
+    def start_interactive(self):
+        """Prepare for the first prompt of an interactive session.
+
+        Only the readline history is needed before the prompt appears;
+        the config is read by a pre-input hook once the prompt is on
+        screen. Scripts that never show a prompt pay for neither.
+        """
+        try:
+            self.load_readline_history()
+        except Exception as e:
+            print(f"Warning: Could not load history: {e}", file=self.stderr)
+        if hasattr(readline, 'set_pre_input_hook'):
+            readline.set_pre_input_hook(self.after_first_prompt)
+        else:
+            self.after_first_prompt()
+
+    def after_first_prompt(self):
+        """Deferred startup work, run once the first prompt is showing."""
+        if hasattr(readline, 'set_pre_input_hook'):
+            readline.set_pre_input_hook(None)
+        try:
+            self.aliases
+        except Exception as e:
+            print(f"\nWarning: Could not load config: {e}", file=self.stderr)
+        # Index PATH in the background so the first Tab is already fast
+        _thread.start_new_thread(self._commands_for_completion, ())
+
+    # Directory listings kept for path completion
+    COMPLETION_CACHE_DIRS = 64
+
+    def _commands_for_completion(self):
+        """Return the PrefixIndex of builtins, aliases and PATH executables.
+
+        Rebuilt only when PATH, a PATH directory's mtime or the alias
+        names change; checking that costs one stat per PATH directory.
+        """
+        path_dirs = [d for d in os.environ.get('PATH', os.defpath).split(os.pathsep) if d]
+        mtimes = []
+        for d in path_dirs:
+            try:
+                mtimes.append(os.stat(d).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        key = (tuple(path_dirs), tuple(mtimes), tuple(self.aliases))
+        if self._command_index is not None and key == self._command_index_key:
+            return self._command_index
+        names = set(self.get_builtins())
+        names.update(self.aliases)
+        names.update(('exit', 'quit'))
+        for d in path_dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_file() and os.access(entry.path, os.X_OK):
+                                names.add(entry.name)
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+        self._command_index = PrefixIndex(names)
+        self._command_index_key = key
+        return self._command_index
+
+    def _dir_for_completion(self, directory):
+        """Return the PrefixIndex for one directory, cached by its mtime."""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        cache = self._dir_indexes
+        cached = cache.pop(directory, None)
+        if cached is None or cached[0] != mtime:
+            names = []
+            dirs = []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        names.append(entry.name)
+                        try:
+                            if entry.is_dir():
+                                dirs.append(entry.name)
+                        except OSError:
+                            pass
+            except OSError:
+                return None
+            cached = (mtime, PrefixIndex(names, dirs))
+        # Most recently used last; drop the oldest beyond the limit
+        cache[directory] = cached
+        if len(cache) > self.COMPLETION_CACHE_DIRS:
+            del cache[next(iter(cache))]
+        return cached[1]
+
+    def _complete_path(self, text):
+        """Complete text as a path; directories get a trailing '/'."""
+        head, _, prefix = text.rpartition('/')
+        if text.startswith('/') and not head:
+            head = '/'
+        directory = os.path.expanduser(head) if head else '.'
+        index = self._dir_for_completion(directory)
+        if index is None:
+            return []
+        base = text[:len(text) - len(prefix)]
+        matches = []
+        for name in index.matching(prefix):
+            # Hidden entries only when asked for
+            if name.startswith('.') and not prefix.startswith('.'):
+                continue
+            matches.append(base + name + ('/' if name in index.dirs else ''))
+        return matches
+
+    def complete(self, text, state):
+        """readline completer: commands at command position, else paths."""
+        if state == 0:
+            try:
+                line = readline.get_line_buffer()
+                before = line[:readline.get_begidx()].rstrip()
+                if (not before or before[-1] in '|&') and '/' not in text:
+                    matches = self._commands_for_completion().matching(text)
+                else:
+                    matches = self._complete_path(text)
+                if len(matches) == 1 and not matches[0].endswith('/'):
+                    matches = [matches[0] + ' ']
+                self._completions = matches
+            except Exception:
+                # Never let a completion error reach readline
+                self._completions = []
+        if state < len(self._completions):
+            return self._completions[state]
+        return None
+
+    def load_config(self):
+        """Load aliases and configuration from file."""
+        self._aliases = {}
+        self._parse_cache.clear()
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+                    self._aliases = config.get('aliases', {})
+                    self.history_settings = config.get('history', {})
+            except Exception as e:
+                print(f"Warning: Could not load config: {e}", file=self.stderr)
+        if self._history is not None:
+            self._configure_history()
+    
+    def save_config(self):
+        """Save aliases and configuration to file."""
+        try:
+            config = {'aliases': self.aliases}
+            if self.history_settings:
+                config['history'] = self.history_settings
+            with open(self.config_file, 'w') as f:
+                json.dump(config, f, indent=2)
+        except Exception as e:
+            print(f"Error: Could not save config: {e}", file=self.stderr)
+    
+    # Most recent commands loaded into readline
+    READLINE_HISTORY = 1000
+
+    def _configure_history(self):
+        """Apply the config file's history settings and trim to max_entries."""
+        settings = self.history_settings
+        try:
+            self._history.max_entries = int(settings.get('max_entries', self._history.max_entries))
+        except ValueError:
+            print(f"Warning: invalid history max_entries: {settings['max_entries']!r}",
+                  file=self.stderr)
+        self._history.dedupe = settings.get('dedupe', self._history.dedupe)
+        try:
+            self._history.compact()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not compact history: {e}", file=self.stderr)
+
+    def load_history(self):
+        """Open the history database, importing an old history file once.
+
+        Settings from the config file are applied once it has been read
+        (see load_config), so opening history does not wait for it.
+        """
+        try:
+            self._history = HistoryStore(self.history_db)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open history database: {e}", file=self.stderr)
+            # Keep this session's history in memory at least
+            self._history = HistoryStore(':memory:')
+            return
+        if os.path.exists(self.history_file) and self._history.is_empty():
+            try:
+                with open(self.history_file, 'r', errors='surrogateescape') as f:
+                    self._history.import_lines(line.rstrip('\n') for line in f)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: Could not import history: {e}", file=self.stderr)
+        if self._aliases is not None:
+            self._configure_history()
+    
+    def save_history(self):
+        """Close the history database; entries are already on disk."""
+        if self._history is not None:
+            try:
+                self._history.close()
+            except sqlite3.Error as e:
+                print(f"Error: Could not save history: {e}", file=self.stderr)
+    
+    def add_to_history(self, command):
+        """Record a command as it starts; returns its history id or None."""
+        if not command.strip():
+            return None
+        if self.interactive:
+            readline.add_history(command)
+        try:
+            return self.history.add(command, os.getcwd())
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: Could not save history: {e}", file=self.stderr)
+            return None
+
+    def finish_history(self, entry, started):
+        """Store the exit status and run time of a recorded command."""
+        if entry is None:
+            return
+        try:
+            self.history.finish(entry, self.last_status, time.time() - started)
+        except sqlite3.Error:
+            pass
+    
+    def get_prompt(self):
+        """Generate the shell prompt."""
+        user = os.environ.get('USER', 'user')
+        hostname = os.uname().nodename
+        cwd = os.getcwd()
+        
+        # Shorten home directory to ~
+        home = os.path.expanduser('~')
+        if cwd.startswith(home):
+            cwd = '~' + cwd[len(home):]
+        
+        return f"\033[1;32m{user}@{hostname}\033[0m:\033[1;34m{cwd}\033[0m$ "
+
+    @property
+    def stdin(self):
+        """Input stream for the builtin running in the current thread."""
+        return getattr(self._io, 'stdin', None) or sys.stdin
+
+    @property
+    def stdout(self):
+        """Output stream for the builtin running in the current thread."""
+        return getattr(self._io, 'stdout', None) or sys.stdout
+
+    @property
+    def stderr(self):
+        """Stream for the current builtin's error messages."""
+        return getattr(self._io, 'stderr', None) or sys.stderr
+    
+    def parse_command(self, command):
+        """Parse command and expand aliases."""
+        stages = self.parse_pipeline(command)
+        return list(stages[0]) if stages else []
+
+    def parse_pipeline(self, command_line):
+        """Split a command line into pipeline stages, expanding aliases.
+
+        Returns a list of argv lists, one per '|'-separated stage, for the
+        first pipeline on the line.
+        """
+        jobs = self.parse_line(command_line)
+        return jobs[0][0] if jobs else []
+
+    # Parsed command lines kept for scripts that repeat them
+    PARSE_CACHE_SIZE = 4096
+
+    def parse_line(self, command_line):
+        """Split a command line into pipelines, expanding aliases.
+
+        Returns a list of (stages, background) pairs, one per pipeline,
+        where stages is a list of argv lists and background is True for
+        a pipeline ended by '&'. Callers must not modify the result, since
+        repeated lines get the cached copy.
+        """
+        cache = self._parse_cache
+        jobs = cache.get(command_line)
+        if jobs is None:
+            jobs = self._parse_line(command_line)
+            if len(cache) >= self.PARSE_CACHE_SIZE:
+                # Lines seen once (generated scripts) just cycle through
+                cache.clear()
+            cache[command_line] = jobs
+        return jobs
+
+    def _parse_line(self, command_line):
+        """Parse a command line without consulting the cache."""
+        aliases = self.aliases
+        jobs = []
+        stages = [[]]
+        # A redirection operator waiting for its file name
+        redirect = None
+        for token in split_command_line(command_line.strip()):
+            if (not isinstance(token, Operator) and not stages[-1] and redirect is None
+                    and token in aliases):
+                # Alias values may contain operators of their own
+                expansion = split_command_line(aliases[token])
+            else:
+                expansion = (token,)
+            for token in expansion:
+                if redirect is not None:
+                    if isinstance(token, Operator):
+                        raise ValueError(f"syntax error near unexpected token `{token}'")
+                    stages[-1].redirects.append((redirect, token))
+                    redirect = None
+                elif not isinstance(token, Operator):
+                    stages[-1].append(token)
+                elif token in REDIRECTS:
+                    if not isinstance(stages[-1], Argv):
+                        stages[-1] = Argv(stages[-1])
+                    if token in ('2>&1', '>&2'):
+                        stages[-1].redirects.append((token, None))
+                    else:
+                        redirect = token
+                elif not stages[-1]:
+                    raise ValueError(f"syntax error near unexpected token `{token}'")
+                elif token == '|':
+                    stages.append([])
+                else:
+                    jobs.append((stages, True))
+                    stages = [[]]
+        if redirect is not None:
+            raise ValueError("syntax error near unexpected token `newline'")
+        if stages[-1]:
+            jobs.append((stages, False))
+        elif isinstance(stages[-1], Argv):
+            raise ValueError("syntax error: redirection without a command")
+        elif len(stages) > 1:
+            raise ValueError("syntax error: missing command after `|'")
+        # Mark the pipelines that expand_stages has work to do on
+        for i, (stages, background) in enumerate(jobs):
+            words = [word for argv in stages for word in argv]
+            words += [target for argv in stages if isinstance(argv, Argv)
+                      for _, target in argv.redirects]
+            if any(type(word) is GlobWord for word in words):
+                jobs[i] = (GlobStages(stages), background)
+        return jobs
+    
+    # Built-in Commands
+    
+    def cmd_cd(self, args):
+        """Change directory."""
+        if not args:
+            # No argument, go to home directory
+            target = os.path.expanduser('~')
+        else:
+            target = args[0]
+        
+        try:
+            os.chdir(target)
+            self.current_dir = os.getcwd()
+        except FileNotFoundError:
+            print(f"cd: {target}: No such file or directory", file=self.stderr)
+            return 1
+        except PermissionError:
+            print(f"cd: {target}: Permission denied", file=self.stderr)
+            return 1
+        except Exception as e:
+            print(f"cd: {e}", file=self.stderr)
+            return 1
+    
+    def cmd_pwd(self, args):
+        """Print working directory."""
+        print(os.getcwd(), file=self.stdout)
+    
+    def _ls_name(self, entry, color):
+        """Return (text, display_width) for an entry name in ls output."""
+        name = entry.name
+        if not color:
+            return name, len(name)
+        # Color coding: directories in blue, executables in green
+        if entry.is_dir(follow_symlinks=False):
+            return f"\033[1;34m{name}/\033[0m", len(name) + 1
+        if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mode & 0o111:
+            return f"\033[1;32m{name}*\033[0m", len(name) + 1
+        return name, len(name)
+
+    def _ls_long(self, entries, names, human, owners, groups):
+        """Format entries as ls -l rows, with columns aligned."""
+        six_months_ago = time.time() - 182 * 86400
+        rows = []
+        for entry, (name, _) in zip(entries, names):
+            st = entry.stat(follow_symlinks=False)
+            if st.st_uid not in owners:
+                try:
+                    owners[st.st_uid] = pwd.getpwuid(st.st_uid).pw_name
+                except KeyError:
+                    owners[st.st_uid] = str(st.st_uid)
+            if st.st_gid not in groups:
+                try:
+                    groups[st.st_gid] = grp.getgrgid(st.st_gid).gr_name
+                except KeyError:
+                    groups[st.st_gid] = str(st.st_gid)
+            when = time.localtime(st.st_mtime)
+            if st.st_mtime > six_months_ago:
+                stamp = time.strftime('%b %e %H:%M', when)
+            else:
+                stamp = time.strftime('%b %e  %Y', when)
+            if stat.S_ISLNK(st.st_mode):
+                try:
+                    name = f"{name} -> {os.readlink(entry.path)}"
+                except OSError:
+                    pass
+            size = human_size(st.st_size) if human else str(st.st_size)
+            rows.append((stat.filemode(st.st_mode), str(st.st_nlink), owners[st.st_uid],
+                         groups[st.st_gid], size, stamp, name))
+        if not rows:
+            return []
+        w = [max(len(r[i]) for r in rows) for i in range(5)]
+        return [f"{m} {l:>{w[1]}} {o:<{w[2]}} {g:<{w[3]}} {sz:>{w[4]}} {t} {n}"
+                for m, l, o, g, sz, t, n in rows]
+
+    def _ls_listing(self, path, opts, owners, groups):
+        """Return (lines, subdirs) for one directory listing."""
+        with os.scandir(path) as it:
+            if 'a' in opts or 'A' in opts:
+                entries = list(it)
+            else:
+                entries = [e for e in it if not e.name.startswith('.')]
+        if 'a' in opts:
+            entries += [PathEntry(os.path.join(path, '.')), PathEntry(os.path.join(path, '..'))]
+        entries = self._ls_sort(entries, opts)
+        lines = []
+        if 'l' in opts:
+            blocks = sum(e.stat(follow_symlinks=False).st_blocks for e in entries) * 512
+            lines.append(f"total {human_size(blocks) if 'h' in opts else -(-blocks // 1024)}")
+        lines.extend(self._ls_format(entries, opts, owners, groups))
+        subdirs = []
+        if 'R' in opts:
+            subdirs = [e.path for e in entries
+                       if e.name not in ('.', '..') and e.is_dir(follow_symlinks=False)]
+        return lines, subdirs
+
+    def _ls_sort(self, entries, opts):
+        """Sort entries by name, or by size (-S) / mtime (-t); -r reverses."""
+        if 'S' in opts:
+            entries.sort(key=lambda e: (-e.stat(follow_symlinks=False).st_size, e.name))
+        elif 't' in opts:
+            entries.sort(key=lambda e: (-e.stat(follow_symlinks=False).st_mtime, e.name))
+        else:
+            entries.sort(key=lambda e: e.name)
+        if 'r' in opts:
+            entries.reverse()
+        return entries
+
+    def _ls_format(self, entries, opts, owners, groups):
+        """Format sorted entries in long, single-column or column layout."""
+        out = self.stdout
+        color = out.isatty()
+        names = [self._ls_name(e, color) for e in entries]
+        if 'l' in opts:
+            return self._ls_long(entries, names, 'h' in opts, owners, groups)
+        if '1' in opts or not color:
+            return [name for name, _ in names]
+        width = shutil.get_terminal_size().columns
+        return format_columns([n for n, _ in names], [w for _, w in names], width)
+
+    def cmd_ls(self, args):
+        """List directory contents. Usage: ls [-lahSRrt1A] [path...]
+
+        Built on os.scandir: names and types come from the directory
+        listing, and an entry is only stat-ed for -l, -S, -t or to colour
+        executables. Everything is written in one call per directory.
+        """
+        opts = set()
+        paths = []
+        for a in args:
+            if len(a) > 1 and a[0] == '-':
+                unknown = set(a[1:]) - set('lahSRrt1A')
+                if unknown:
+                    print(f"ls: invalid option -- '{sorted(unknown)[0]}'", file=self.stderr)
+                    return 2
+                opts.update(a[1:])
+            else:
+                paths.append(a)
+        paths = paths or ['.']
+        owners = {}
+        groups = {}
+        files = []
+        dirs = []
+        status = 0
+        for path in paths:
+            try:
+                entry = PathEntry(path)
+                entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                print(f"ls: cannot access '{path}': No such file or directory", file=self.stderr)
+                status = 2
+                continue
+            except PermissionError:
+                print(f"ls: cannot access '{path}': Permission denied", file=self.stderr)
+                status = 2
+                continue
+            if entry.is_dir():
+                dirs.append(path)
+            else:
+                entry.name = path
+                files.append(entry)
+        out = self.stdout
+        wrote = False
+        if files:
+            out.write('\n'.join(self._ls_format(self._ls_sort(files, opts), opts, owners, groups)) + '\n')
+            wrote = True
+        show_headers = len(paths) > 1 or 'R' in opts
+        stack = list(reversed(dirs))
+        while stack:
+            path = stack.pop()
+            try:
+                lines, subdirs = self._ls_listing(path, opts, owners, groups)
+            except PermissionError:
+                print(f"ls: cannot open directory '{path}': Permission denied", file=self.stderr)
+                status = status or 1
+                continue
+            except OSError as e:
+                print(f"ls: cannot access '{path}': {e.strerror}", file=self.stderr)
+                status = status or 1
+                continue
+            if show_headers:
+                lines.insert(0, f"{path}:")
+            if wrote:
+                lines.insert(0, '')
+            lines.append('')
+            out.write('\n'.join(lines))
+            wrote = True
+            stack.extend(reversed(subdirs))
+        return status
+
+    def cmd_echo(self, args):
+        """Print arguments."""
+        print(' '.join(args), file=self.stdout)
+    
+    def cmd_clear(self, args):
+        """Clear the screen."""
+        os.system('clear' if os.name != 'nt' else 'cls')
+
+    # File operations
+    # Size of each read/write when a kernel copy is not possible
+    CAT_CHUNK_SIZE = 1024 * 1024
+
+    def _copy_fd(self, in_fd, out_fd):
+        """Copy everything from in_fd to out_fd.
+
+        Regular files go through os.sendfile and pipes through os.splice,
+        so the data never enters Python. If the kernel refuses (e.g. an
+        O_APPEND destination, or a platform without these calls) the copy
+        falls back to CAT_CHUNK_SIZE reads and writes.
+        """
+        mode = os.fstat(in_fd).st_mode
+        if stat.S_ISREG(mode) and hasattr(os, 'sendfile'):
+            offset = os.lseek(in_fd, 0, os.SEEK_CUR)
+            try:
+                while True:
+                    sent = os.sendfile(out_fd, in_fd, offset, self.CAT_CHUNK_SIZE * 8)
+                    if not sent:
+                        return
+                    offset += sent
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                os.lseek(in_fd, offset, os.SEEK_SET)
+        elif hasattr(os, 'splice') and (stat.S_ISFIFO(mode) or stat.S_ISFIFO(os.fstat(out_fd).st_mode)):
+            try:
+                while os.splice(in_fd, out_fd, self.CAT_CHUNK_SIZE):
+                    pass
+                return
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+        while True:
+            data = os.read(in_fd, self.CAT_CHUNK_SIZE)
+            if not data:
+                return
+            view = memoryview(data)
+            while view:
+                view = view[os.write(out_fd, view):]
+
+    def _cat_numbered(self, fh, start):
+        """Write lines of binary file fh prefixed with line numbers.
+
+        Lines are streamed and batched into CAT_CHUNK_SIZE writes, so the
+        file is never held in memory. Returns the next line number.
+        """
+        batch = []
+        size = 0
+        number = start
+        for line in fh:
+            batch.append(b'%6d\t%s' % (number, line))
+            size += len(line) + 7
+            number += 1
+            if size >= self.CAT_CHUNK_SIZE:
+                self._write_bytes(b''.join(batch))
+                batch = []
+                size = 0
+        if batch:
+            self._write_bytes(b''.join(batch))
+        return number
+
+    def cmd_cat(self, args):
+        """Concatenate and print files to stdout. Usage: cat [-n] [file...]"""
+        number = '-n' in args
+        paths = [a for a in args if a != '-n'] or ['-']
+        out = self.stdout
+        try:
+            out_fd = out.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            out_fd = None
+        line_no = 1
+        status = 0
+        for path in paths:
+            try:
+                if path == '-':
+                    # No files: copy stdin, so cat works as a pipeline stage
+                    fh = self.stdin.buffer if hasattr(self.stdin, 'buffer') else None
+                    if fh is None:
+                        for line in self.stdin:
+                            out.write(line)
+                        continue
+                    fh = open(fh.fileno(), 'rb', closefd=False)
+                else:
+                    fh = open(path, 'rb')
+                with fh:
+                    if number:
+                        line_no = self._cat_numbered(fh, line_no)
+                    elif out_fd is not None:
+                        out.flush()
+                        self._copy_fd(fh.fileno(), out_fd)
+                    else:
+                        for chunk in iter(lambda: fh.read(self.CAT_CHUNK_SIZE), b''):
+                            self._write_bytes(chunk)
+            except BrokenPipeError:
+                raise PipelineClosed() from None
+            except FileNotFoundError:
+                print(f"cat: {path}: No such file or directory", file=self.stderr)
+                status = 1
+            except IsADirectoryError:
+                print(f"cat: {path}: Is a directory", file=self.stderr)
+                status = 1
+            except Exception as e:
+                print(f"cat: {e}", file=self.stderr)
+                status = 1
+        return status
+
+    def cmd_touch(self, args):
+        """Create an empty file or update its timestamp."""
+        if not args:
+            print("touch: missing file operand", file=self.stderr)
+            return 1
+        status = 0
+        for path in args:
+            try:
+                parent = os.path.dirname(path)
+                if parent:
+                    os.makedirs(parent, exist_ok=True)
+                with open(path, 'a'):
+                    os.utime(path, None)
+            except Exception as e:
+                print(f"touch: {e}", file=self.stderr)
+                status = 1
+        return status
+
+    def cmd_mkdir(self, args):
+        """Create directories."""
+        if not args:
+            print("mkdir: missing operand", file=self.stderr)
+            return 1
+        status = 0
+        for d in args:
+            try:
+                os.makedirs(d, exist_ok=True)
+            except Exception as e:
+                print(f"mkdir: cannot create directory '{d}': {e}", file=self.stderr)
+                status = 1
+        return status
+
+    # Threads used by rm -r to delete subtrees concurrently
+    RM_WORKERS = 8
+
+    def _rm_confirm(self, question):
+        """Ask an rm -i question on the terminal."""
+        try:
+            return input(f"rm: {question}? ").strip().lower().startswith('y')
+        except EOFError:
+            return False
+
+    def _rm_scan(self, node, opts, root_dev):
+        """Open node's directory and unlink everything in it but subdirectories.
+
+        Runs on a worker thread. Returns (removed, subdirs, lines, errors);
+        lines are -v messages, printed by the caller.
+        """
+        removed = 0
+        subdirs = []
+        lines = []
+        errors = []
+        flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+        try:
+            node.fd = os.open(node.name, flags, dir_fd=node.dir_fd)
+            it = os.scandir(node.fd)
+        except OSError as e:
+            errors.append(f"cannot remove '{node.path}': {e.strerror}")
+            node.kept = True
+            return removed, subdirs, lines, errors
+        with it:
+            for entry in it:
+                path = os.path.join(node.path, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if root_dev is not None and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                            errors.append(f"skipping '{path}', since it's on a different device")
+                            node.kept = True
+                        else:
+                            subdirs.append(entry.name)
+                        continue
+                    if 'i' in opts and not self._rm_confirm(f"remove '{path}'"):
+                        node.kept = True
+                        continue
+                    os.unlink(entry.name, dir_fd=node.fd)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    errors.append(f"cannot remove '{path}': {e.strerror}")
+                    node.kept = True
+                    continue
+                removed += 1
+                if 'v' in opts:
+                    lines.append(f"removed '{path}'")
+        return removed, subdirs, lines, errors
+
+    def _rm_tree(self, top, opts):
+        """Remove the directory top and everything below it; returns the count.
+
+        Each directory is scanned (and its files unlinked) as a separate
+        task on a thread pool; a directory is rmdir-ed by the calling
+        thread once all of its subdirectories are gone. Tasks are taken
+        newest first, which keeps the walk close to depth-first and bounds
+        the number of open directory descriptors.
+        """
+        workers = 1 if 'i' in opts else opts['workers']
+        root_dev = os.lstat(top).st_dev if 'x' in opts else None
+        out = self.stdout
+        removed = 0
+        pending = {}
+        todo = []
+        finished_nodes = []
+        pool = None
+        if workers > 1:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        def finish(node):
+            nonlocal removed
+            while node is not None and node.pending == 0:
+                os.close(node.fd)
+                node.fd = None
+                if not node.kept:
+                    if 'i' in opts and not self._rm_confirm(f"remove directory '{node.path}'"):
+                        node.kept = True
+                    else:
+                        try:
+                            os.rmdir(node.name, dir_fd=node.dir_fd)
+                            removed += 1
+                            if 'v' in opts:
+                                out.write(f"removed directory '{node.path}'\n")
+                        except OSError as e:
+                            print(f"rm: cannot remove '{node.path}': {e.strerror}",
+                                  file=self.stderr)
+                            node.kept = True
+                parent = node.parent
+                if parent is not None:
+                    parent.pending -= 1
+                    parent.kept = parent.kept or node.kept
+                node = parent
+
+        parent_fd = os.open(os.path.dirname(top.rstrip(os.sep)) or '.', os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+        try:
+            todo.append(RmNode(os.path.basename(top.rstrip(os.sep)), top, None, parent_fd))
+            while todo or pending:
+                if pool is None:
+                    node = todo.pop()
+                    done = [(node, self._rm_scan(node, opts, root_dev))]
+                else:
+                    while todo and len(pending) < 2 * workers:
+                        node = todo.pop()
+                        pending[pool.submit(self._rm_scan, node, opts, root_dev)] = node
+                    finished, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    done = [(pending.pop(f), f.result()) for f in finished]
+                for node, (count, subdirs, lines, errors) in done:
+                    finished_nodes.append(node)
+                    removed += count
+                    if lines:
+                        out.write('\n'.join(lines) + '\n')
+                    for error in errors:
+                        print(f"rm: {error}", file=self.stderr)
+                    if node.fd is None:
+                        # Could not be opened; leave it and its ancestors alone
+                        node.pending = -1
+                        if node.parent is not None:
+                            node.parent.pending -= 1
+                            node.parent.kept = True
+                            finish(node.parent)
+                        continue
+                    node.pending = len(subdirs)
+                    for name in subdirs:
+                        todo.append(RmNode(name, os.path.join(node.path, name), node, node.fd))
+                    if not subdirs:
+                        finish(node)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            for node in itertools.chain(finished_nodes, pending.values()):
+                if node.fd is not None:
+                    os.close(node.fd)
+                    node.fd = None
+            os.close(parent_fd)
+        return removed
+
+    def cmd_rm(self, args):
+        """Remove files or directories. Usage: rm [-rfvi] [--one-file-system] [-j N] <path>...
+
+        Directories are deleted by _rm_tree, which works relative to open
+        directory descriptors and removes independent subtrees in parallel.
+        """
+        opts = {'workers': self.RM_WORKERS}
+        long_flags = {'--recursive': 'r', '--force': 'f', '--verbose': 'v',
+                      '--interactive': 'i', '--one-file-system': 'x'}
+        paths = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '-j':
+                value = args[i + 1] if i + 1 < len(args) else ''
+                if not value.isdigit():
+                    print(f"rm: invalid number: '{value}'", file=self.stderr)
+                    return 1
+                opts['workers'] = max(int(value), 1)
+                i += 2
+                continue
+            if a in long_flags:
+                opts[long_flags[a]] = True
+            elif a == '--':
+                paths.extend(args[i + 1:])
+                break
+            elif len(a) > 1 and a[0] == '-' and not a.startswith('--'):
+                for c in a[1:]:
+                    if c not in 'rRfvi':
+                        print(f"rm: invalid option -- '{c}'", file=self.stderr)
+                        return 1
+                    opts['r' if c == 'R' else c] = True
+            elif a.startswith('--'):
+                print(f"rm: unrecognized option '{a}'", file=self.stderr)
+                return 1
+            else:
+                paths.append(a)
+            i += 1
+        if 'f' in opts:
+            opts.pop('i', None)
+        if not paths:
+            if 'f' not in opts:
+                print("rm: missing operand", file=self.stderr)
+                return 1
+            return 0
+        start = time.monotonic()
+        removed = 0
+        trees = 0
+        status = 0
+        for p in paths:
+            try:
+                st = os.lstat(p)
+                if not stat.S_ISDIR(st.st_mode):
+                    if 'i' in opts and not self._rm_confirm(f"remove '{p}'"):
+                        continue
+                    os.unlink(p)
+                    removed += 1
+                    if 'v' in opts:
+                        print(f"removed '{p}'", file=self.stdout)
+                elif 'r' not in opts:
+                    print(f"rm: cannot remove '{p}': Is a directory", file=self.stderr)
+                    status = 1
+                elif os.path.basename(p.rstrip(os.sep)) in ('.', '..'):
+                    print(f"rm: refusing to remove '.' or '..' directory: skipping '{p}'",
+                          file=self.stderr)
+                    status = 1
+                elif os.path.realpath(p) == os.sep:
+                    print(f"rm: it is dangerous to operate recursively on '{p}'", file=self.stderr)
+                    status = 1
+                else:
+                    removed += self._rm_tree(p, opts)
+                    trees += 1
+                    # Anything left behind that was not declined at -i failed
+                    if 'i' not in opts and os.path.lexists(p):
+                        status = 1
+            except FileNotFoundError:
+                if 'f' not in opts:
+                    print(f"rm: cannot remove '{p}': No such file or directory", file=self.stderr)
+                    status = 1
+            except OSError as e:
+                print(f"rm: cannot remove '{p}': {e.strerror}", file=self.stderr)
+                status = 1
+        if trees and 'v' in opts:
+            elapsed = time.monotonic() - start
+            print(f"rm: removed {removed} entr{'y' if removed == 1 else 'ies'} in {elapsed:.2f}s",
+                  file=self.stderr)
+        return status
+
+    def cmd_rmdir(self, args):
+        """Remove empty directories."""
+        if not args:
+            print("rmdir: missing operand", file=self.stderr)
+            return 1
+        status = 0
+        for d in args:
+            try:
+                os.rmdir(d)
+            except FileNotFoundError:
+                print(f"rmdir: failed to remove '{d}': No such file or directory", file=self.stderr)
+                status = 1
+            except OSError as e:
+                print(f"rmdir: failed to remove '{d}': {e}", file=self.stderr)
+                status = 1
+        return status
+
+    # Threads used by cp/mv to copy files concurrently
+    COPY_WORKERS = 8
+    # Copies queued per worker before the directory walk waits for them
+    COPY_QUEUE_DEPTH = 64
+
+    def _parse_copy_args(self, name, args, flags):
+        """Parse cp/mv options; returns (opts, paths) or (None, None)."""
+        long_flags = {'--recursive': 'r', '--no-clobber': 'n', '--update': 'u', '--progress': 'p'}
+        opts = {'workers': self.COPY_WORKERS}
+        paths = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '-j' or a.startswith('--jobs='):
+                value = a.split('=', 1)[1] if '=' in a else (args[i+1] if i + 1 < len(args) else '')
+                if not value.isdigit():
+                    print(f"{name}: invalid number: '{value}'", file=self.stderr)
+                    return None, None
+                opts['workers'] = max(int(value), 1)
+                i += 1 if '=' in a else 2
+                continue
+            if a in long_flags and long_flags[a] in flags:
+                opts[long_flags[a]] = True
+            elif len(a) > 1 and a[0] == '-' and not a.startswith('--'):
+                for c in a[1:]:
+                    if c not in flags:
+                        print(f"{name}: invalid option -- '{c}'", file=self.stderr)
+                        return None, None
+                    opts['r' if c == 'R' else c] = True
+            elif a.startswith('--'):
+                print(f"{name}: unrecognized option '{a}'", file=self.stderr)
+                return None, None
+            else:
+                paths.append(a)
+            i += 1
+        return opts, paths
+
+    def _copy_skip(self, st, dst, opts):
+        """Whether -n/-u say the existing dst should be left alone."""
+        if not ('n' in opts or 'u' in opts):
+            return False
+        try:
+            dst_st = os.lstat(dst)
+        except OSError:
+            return False
+        if 'n' in opts:
+            return True
+        # -u: unchanged when the size matches and dst is not older
+        return dst_st.st_size == st.st_size and dst_st.st_mtime_ns >= st.st_mtime_ns
+
+    def _copy_job(self, src, dst, st, stats):
+        """Worker body: copy one file; returns an error message or None."""
+        try:
+            stats.add(copy_file(src, dst, st))
+        except OSError as e:
+            return f"cannot copy '{src}' to '{dst}': {e.strerror}"
+        return None
+
+    def _copy_link(self, src, dst, st):
+        """Recreate the symlink src at dst."""
+        target = os.readlink(src)
+        try:
+            os.symlink(target, dst)
+        except FileExistsError:
+            os.unlink(dst)
+            os.symlink(target, dst)
+        copy_metadata(dst, st, follow_symlinks=False)
+
+    def _copy_tree(self, src, dst, opts, stats, submit):
+        """Walk src, creating directories under dst and handing files to submit.
+
+        Directory metadata is applied last, deepest first, so copying the
+        files inside does not disturb the directory mtimes. Returns the
+        number of errors.
+        """
+        errors = 0
+        root_st = os.stat(src)
+        fresh = not os.path.isdir(dst)
+        os.makedirs(dst, exist_ok=True)
+        dirs = [(dst, root_st)]
+        stack = [(src, dst, fresh)]
+        while stack:
+            src_dir, dst_dir, fresh = stack.pop()
+            try:
+                it = os.scandir(src_dir)
+            except OSError as e:
+                print(f"{opts['name']}: cannot open directory '{src_dir}': {e.strerror}",
+                      file=self.stderr)
+                errors += 1
+                continue
+            with it:
+                for entry in it:
+                    target = os.path.join(dst_dir, entry.name)
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        if stat.S_ISDIR(st.st_mode):
+                            try:
+                                os.mkdir(target)
+                                created = True
+                            except FileExistsError:
+                                created = False
+                            dirs.append((target, st))
+                            stack.append((entry.path, target, created))
+                        # Inside a directory we just created there is nothing to skip
+                        elif not fresh and self._copy_skip(st, target, opts):
+                            stats.skipped += 1
+                        elif stat.S_ISREG(st.st_mode):
+                            submit(entry.path, target, st)
+                        elif stat.S_ISLNK(st.st_mode):
+                            self._copy_link(entry.path, target, st)
+                            stats.add(0)
+                        else:
+                            print(f"{opts['name']}: skipping special file '{entry.path}'",
+                                  file=self.stderr)
+                    except OSError as e:
+                        print(f"{opts['name']}: cannot copy '{entry.path}': {e.strerror}",
+                              file=self.stderr)
+                        errors += 1
+        return errors, dirs
+
+    def _copy_progress(self, stats, done, err):
+        """Redraw a one-line progress report on the terminal err until done is set.
+
+        Runs on its own thread, so err is the builtin's stderr passed in.
+        """
+        while not done.wait(0.5):
+            err.write('\r' + stats.summary() + '\033[K')
+            err.flush()
+        err.write('\r\033[K')
+        err.flush()
+
+    def _transfer(self, jobs, opts, remove_source=False):
+        """Copy each (src, dst) pair with a pool of workers.
+
+        Files are copied by COPY_WORKERS threads; the directory walk runs in
+        the calling thread and waits once COPY_QUEUE_DEPTH copies per worker
+        are outstanding, so memory stays bounded on huge trees. With
+        remove_source (cross-device mv), each source is deleted once it
+        has been copied without errors. Returns the number of failures.
+        """
+        name = opts['name']
+        stats = TransferStats()
+        done = threading.Event()
+        reporter = None
+        if 'p' in opts and self.stderr.isatty():
+            # Redrawing only makes sense on a terminal; elsewhere the
+            # final summary below is all that is printed
+            reporter = threading.Thread(target=self._copy_progress,
+                                        args=(stats, done, self.stderr), daemon=True)
+            reporter.start()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=opts['workers'])
+        pending = collections.deque()
+        failures = [0]
+
+        def drain(limit):
+            while len(pending) > limit:
+                error = pending.popleft().result()
+                if error:
+                    print(f"{name}: {error}", file=self.stderr)
+                    failures[0] += 1
+
+        def submit(src, dst, st):
+            pending.append(pool.submit(self._copy_job, src, dst, st, stats))
+            drain(opts['workers'] * self.COPY_QUEUE_DEPTH)
+
+        try:
+            for src, dst in jobs:
+                before = failures[0]
+                try:
+                    # mv moves a symlink itself; cp copies what it points to
+                    st = os.lstat(src) if remove_source else os.stat(src)
+                    if stat.S_ISLNK(st.st_mode):
+                        self._copy_link(src, dst, st)
+                        stats.add(0)
+                    elif stat.S_ISDIR(st.st_mode):
+                        errors, dirs = self._copy_tree(src, dst, opts, stats, submit)
+                        drain(0)
+                        for path, dir_st in reversed(dirs):
+                            copy_metadata(path, dir_st)
+                        failures[0] += errors
+                    elif self._copy_skip(st, dst, opts):
+                        stats.skipped += 1
+                        continue
+                    else:
+                        submit(src, dst, st)
+                        drain(0)
+                except OSError as e:
+                    print(f"{name}: cannot copy '{src}': {e.strerror}", file=self.stderr)
+                    failures[0] += 1
+                    continue
+                if remove_source and failures[0] == before:
+                    if stat.S_ISDIR(st.st_mode):
+                        shutil.rmtree(src)
+                    else:
+                        os.unlink(src)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            done.set()
+            if reporter is not None:
+                reporter.join()
+        if 'p' in opts:
+            print(f"{name}: {stats.summary()}", file=self.stdout)
+        return failures[0]
+
+    def cmd_mv(self, args):
+        """Move (rename) files. Usage: mv [-n|-u] [-p] [-j N] <src>... <dest>
+
+        Renames within a file system; across file systems the source is
+        copied with the cp engine and then removed.
+        """
+        opts, paths = self._parse_copy_args('mv', args, 'nup')
+        if opts is None:
+            return 1
+        if len(paths) < 2:
+            print("mv: missing file operand", file=self.stderr)
+            return 1
+        opts['name'] = 'mv'
+        srcs = paths[:-1]
+        dest = paths[-1]
+        if len(srcs) > 1:
+            # Move multiple into directory
+            os.makedirs(dest, exist_ok=True)
+        copies = []
+        status = 0
+        for src in srcs:
+            target = dest
+            if os.path.isdir(dest):
+                target = os.path.join(dest, os.path.basename(src.rstrip(os.sep)))
+            try:
+                if self._copy_skip(os.lstat(src), target, opts):
+                    continue
+                os.rename(src, target)
+            except OSError as e:
+                if e.errno == errno.EXDEV:
+                    copies.append((src, target))
+                else:
+                    print(f"mv: cannot move '{src}' to '{target}': {e.strerror}", file=self.stderr)
+                    status = 1
+        if copies and self._transfer(copies, opts, remove_source=True):
+            status = 1
+        return status
+
+    def cmd_cp(self, args):
+        """Copy files or directories. Usage: cp [-r] [-n|-u] [-p] [-j N] <src>... <dest>
+
+        Data is copied with reflinks or os.copy_file_range where possible,
+        by a pool of worker threads; mode, owner and timestamps are kept.
+        """
+        opts, paths = self._parse_copy_args('cp', args, 'rRnup')
+        if opts is None:
+            return 1
+        if len(paths) < 2:
+            print("cp: missing file operand", file=self.stderr)
+            return 1
+        opts['name'] = 'cp'
+        srcs = paths[:-1]
+        dest = paths[-1]
+        if len(srcs) > 1:
+            os.makedirs(dest, exist_ok=True)
+        jobs = []
+        status = 0
+        for s in srcs:
+            if not os.path.exists(s):
+                print(f"cp: cannot stat '{s}': No such file or directory", file=self.stderr)
+                status = 1
+                continue
+            if os.path.isdir(s):
+                if 'r' not in opts:
+                    print(f"cp: -r not specified; omitting directory '{s}'", file=self.stderr)
+                    status = 1
+                    continue
+                # A single directory is copied into dest; several go underneath it
+                target = os.path.join(dest, os.path.basename(s.rstrip(os.sep))) if len(srcs) > 1 else dest
+                inside = os.path.realpath(target)
+                if (inside + os.sep).startswith(os.path.realpath(s) + os.sep):
+                    print(f"cp: cannot copy a directory, '{s}', into itself, '{target}'",
+                          file=self.stderr)
+                    status = 1
+                    continue
+            elif os.path.isdir(dest):
+                target = os.path.join(dest, os.path.basename(s))
+            else:
+                target = dest
+            if not os.path.isdir(s) and os.path.exists(target) and os.path.samefile(s, target):
+                print(f"cp: '{s}' and '{target}' are the same file", file=self.stderr)
+                status = 1
+                continue
+            jobs.append((s, target))
+        if self._transfer(jobs, opts):
+            status = 1
+        return status
+
+    # Text processing
+    def _parse_count_args(self, args, options=()):
+        """Parse [-n N] [-N] plus simple flags for head/tail.
+
+        Returns (n, flags, values, files) where flags is the set of flag
+        options seen and values maps value options (e.g. '-s') to strings.
+        """
+        n = 10
+        flags = set()
+        values = {}
+        files = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '-n' and i + 1 < len(args):
+                try:
+                    n = int(args[i+1])
+                    i += 2
+                    continue
+                except ValueError:
+                    pass
+            elif a in options and options[a] and i + 1 < len(args):
+                values[a] = args[i+1]
+                i += 2
+                continue
+            elif a in options:
+                flags.add(a)
+                i += 1
+                continue
+            elif len(a) > 1 and a[0] == '-' and a[1:].isdigit():
+                n = int(a[1:])
+                i += 1
+                continue
+            files.append(a)
+            i += 1
+        return n, flags, values, files
+
+    def _write_bytes(self, data, out=None):
+        """Write raw bytes to the current stdout (or out), bypassing text decoding."""
+        if out is None:
+            out = self.stdout
+        if type(out) is OutputSink:
+            out.write_bytes(data)
+            return
+        buf = getattr(out, 'buffer', None)
+        if buf is None:
+            out.write(data.decode(getattr(out, 'encoding', None) or 'utf-8', 'surrogateescape'))
+            return
+        out.flush()
+        try:
+            buf.write(data)
+        except BrokenPipeError:
+            raise PipelineClosed() from None
+
+    def cmd_head(self, args):
+        """Show first lines of a file. Usage: head [-n N] file"""
+        n, _, _, files = self._parse_count_args(args)
+        out = self.stdout
+        if not files:
+            # Stop after n lines so upstream pipeline stages are released
+            for l in itertools.islice(self.stdin, max(n, 0)):
+                out.write(l)
+            return 0
+        status = 0
+        for f in files:
+            try:
+                with open(f, 'r', errors='surrogateescape') as fh:
+                    # Only the first n lines are ever read
+                    for l in itertools.islice(fh, max(n, 0)):
+                        out.write(l)
+            except Exception as e:
+                print(f"head: {e}", file=self.stderr)
+                status = 1
+        return status
+
+    # Block size used when scanning backward from EOF and when following
+    TAIL_BLOCK_SIZE = 64 * 1024
+
+    def _tail_lines(self, fh, n):
+        """Return the last n lines of a binary file as bytes.
+
+        Reads fixed-size blocks backward from EOF until more than n
+        newlines have been seen, so the cost depends on n and the line
+        length, not on the file size. The file is left positioned at the
+        EOF that was read. Non-seekable inputs fall back to a bounded deque.
+        """
+        if n <= 0:
+            fh.seek(0, os.SEEK_END)
+            return b''
+        try:
+            end = fh.seek(0, os.SEEK_END)
+        except (OSError, io.UnsupportedOperation):
+            return b''.join(collections.deque(fh, maxlen=n))
+        pos = end
+        chunks = []
+        newlines = 0
+        while pos > 0 and newlines <= n:
+            size = min(self.TAIL_BLOCK_SIZE, pos)
+            pos -= size
+            fh.seek(pos)
+            chunk = fh.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+        fh.seek(end)
+        data = b''.join(reversed(chunks))
+        # A trailing newline ends the last line rather than starting a new one
+        cut = len(data) - 1 if data.endswith(b'\n') else len(data)
+        for _ in range(n):
+            cut = data.rfind(b'\n', 0, cut)
+            if cut < 0:
+                break
+        return data[cut + 1:]
+
+    def _cancelled(self):
+        """True once the pipeline running this stage has finished."""
+        event = getattr(self._io, 'cancel', None)
+        return event is not None and event.is_set()
+
+    def _follow(self, followed, by_name, interval):
+        """Print data appended to files, like tail -f / tail -F.
+
+        followed is a list of [path, fh, offset] entries, where offset is
+        the byte position already shown. Between polls the loop sleeps for
+        interval seconds instead of spinning. Truncation is detected by the
+        size dropping below the offset; when following by name, rotation is
+        detected by the path resolving to a different inode, and the new
+        file is read from the start once the old one is drained.
+        """
+        out = self.stdout
+        current = followed[-1][0] if followed else None
+        try:
+            while not self._cancelled():
+                progressed = False
+                for entry in followed:
+                    path, fh, offset = entry
+                    if fh is None:
+                        # -F: wait for the path to (re)appear
+                        try:
+                            fh = open(path, 'rb')
+                        except OSError:
+                            continue
+                        entry[1], entry[2] = fh, 0
+                        offset = 0
+                        print(f"tail: '{path}' has appeared; following new file", file=self.stderr)
+                    data = fh.read(self.TAIL_BLOCK_SIZE)
+                    if data:
+                        if len(followed) > 1 and current != path:
+                            out.write(f"\n==> {path} <==\n")
+                            current = path
+                        self._write_bytes(data)
+                        entry[2] = offset + len(data)
+                        progressed = True
+                        continue
+                    fst = os.fstat(fh.fileno())
+                    if fst.st_size < offset:
+                        print(f"tail: {path}: file truncated at byte {offset}", file=self.stderr)
+                        fh.seek(0)
+                        entry[2] = 0
+                        continue
+                    if not by_name:
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        st = None
+                    if st is None or (st.st_dev, st.st_ino) != (fst.st_dev, fst.st_ino):
+                        # Old file is fully drained; switch to whatever has the name now
+                        if st is None:
+                            print(f"tail: '{path}' has become inaccessible at byte {offset}",
+                                  file=self.stderr)
+                        else:
+                            print(f"tail: '{path}' has been replaced at byte {offset}; following new file",
+                                  file=self.stderr)
+                        fh.close()
+                        entry[1] = None
+                if progressed:
+                    out.flush()
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            print(file=self.stdout)
+        finally:
+            for path, fh, offset in followed:
+                if fh is not None:
+                    fh.close()
+                    print(f"tail: {path}: stopped at byte {offset}", file=self.stderr)
+
+    def cmd_tail(self, args):
+        """Show last lines of a file. Usage: tail [-n N] [-f|-F] [-s SECS] file..."""
+        n, flags, values, files = self._parse_count_args(
+            args, {'-f': False, '-F': False, '-s': True})
+        out = self.stdout
+        if not files:
+            for l in collections.deque(self.stdin, maxlen=max(n, 0)):
+                out.write(l)
+            return 0
+        try:
+            interval = float(values.get('-s', 1.0))
+        except ValueError:
+            print(f"tail: invalid number of seconds: '{values['-s']}'", file=self.stderr)
+            return 1
+        by_name = '-F' in flags
+        follow = by_name or '-f' in flags
+        followed = []
+        status = 0
+        for index, f in enumerate(files):
+            try:
+                fh = open(f, 'rb')
+            except Exception as e:
+                print(f"tail: {e}", file=self.stderr)
+                status = 1
+                if by_name:
+                    followed.append([f, None, 0])
+                continue
+            try:
+                if len(files) > 1:
+                    out.write(f"\n==> {f} <==\n" if index else f"==> {f} <==\n")
+                self._write_bytes(self._tail_lines(fh, n))
+            except PipelineClosed:
+                fh.close()
+                raise
+            except Exception as e:
+                print(f"tail: {e}", file=self.stderr)
+                status = 1
+                fh.close()
+                continue
+            if follow:
+                followed.append([f, fh, fh.tell()])
+            else:
+                fh.close()
+        if followed:
+            out.flush()
+            self._follow(followed, by_name, interval)
+        return status
+
+    def _parallel_map(self, func, files):
+        """Yield func(path) for each file, in order.
+
+        Many files are spread over a process pool; results still come back
+        in input order so output is deterministic. func must be picklable.
+        """
+        workers = os.cpu_count() or 1
+        if len(files) < PARALLEL_MIN_FILES or workers < 2:
+            yield from map(func, files)
+            return
+        pool = process_pool(workers)
+        try:
+            chunksize = max(1, min(64, len(files) // (workers * 4)))
+            yield from pool.map(func, files, chunksize=chunksize)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def cmd_grep(self, args):
+        """Search for a pattern. Usage: grep [-rFivcln] PATTERN [file...]
+
+        Like grep(1), returns 0 if a line matched, 1 if none did and 2 on
+        errors.
+        """
+        flags = set()
+        operands = []
+        for i, a in enumerate(args):
+            if a == '--':
+                operands.extend(args[i+1:])
+                break
+            if len(a) > 1 and a[0] == '-' and set(a[1:]) <= set('rRFEivcln'):
+                flags.update(a[1:])
+            else:
+                operands.append(a)
+        if not operands:
+            print("grep: missing pattern", file=self.stderr)
+            return 2
+        pattern, paths = operands[0], operands[1:]
+        fixed = 'F' in flags
+        ignore_case = 'i' in flags
+        invert = 'v' in flags
+        mode = 'list' if 'l' in flags else 'count' if 'c' in flags else 'lines'
+        recursive = 'r' in flags or 'R' in flags
+        try:
+            compile_grep_pattern(os.fsencode(pattern), fixed, ignore_case)
+        except re.error as e:
+            print(f"grep: invalid pattern: {e}", file=self.stderr)
+            return 2
+        out = self.stdout
+        if not paths and not recursive:
+            # read stdin line by line so grep streams inside pipelines
+            if fixed and not ignore_case:
+                matches = lambda line: pattern in line
+            else:
+                regex = re.compile(re.escape(pattern) if fixed else pattern,
+                                   re.IGNORECASE if ignore_case else 0)
+                matches = lambda line: regex.search(line) is not None
+            count = 0
+            numbered = 'n' in flags
+            for lineno, line in enumerate(self.stdin, 1):
+                if matches(line) != invert:
+                    count += 1
+                    if mode == 'list':
+                        out.write("(standard input)\n")
+                        return 0
+                    if mode == 'lines':
+                        out.write(f"{lineno}:{line}" if numbered else line)
+            if mode == 'count':
+                out.write(f"{count}\n")
+            return 0 if count else 1
+        files = []
+        errors = False
+        for p in paths or ['.']:
+            if not os.path.isdir(p):
+                files.append(p)
+            elif recursive:
+                files.extend(iter_tree_files(p))
+            else:
+                print(f"grep: {p}: Is a directory", file=self.stderr)
+                errors = True
+        # Like grep(1), prefix file names only when there can be several files
+        search = functools.partial(grep_file, pattern=os.fsencode(pattern), fixed=fixed,
+                                   ignore_case=ignore_case, invert=invert, mode=mode,
+                                   show_names=len(files) > 1 or recursive,
+                                   line_numbers='n' in flags)
+        found = False
+        for output, matched, error in self._parallel_map(search, files):
+            if error:
+                print(f"grep: {error}", file=self.stderr)
+                errors = True
+            elif output:
+                self._write_bytes(output)
+            found = found or matched
+        return 2 if errors else 0 if found else 1
+
+    def cmd_wc(self, args):
+        """Word/line/byte count. Usage: wc [-lwmc] [file...]"""
+        flags = set()
+        files = []
+        for a in args:
+            if len(a) > 1 and a[0] == '-' and set(a[1:]) <= set('lwmc'):
+                flags.update(a[1:])
+            else:
+                files.append(a)
+        # Columns come out in the fixed order lines, words, chars, bytes
+        columns = [i for i, flag in enumerate('lwmc') if flag in flags] or [0, 1, 3]
+        want = frozenset(WC_COUNTS[i] for i in columns)
+        out = self.stdout
+
+        def row(counts, name=''):
+            line = ' '.join(f"{counts[i]:7d}" for i in columns)
+            return f"{line} {name}\n" if name else line + '\n'
+
+        if not files:
+            stdin = self.stdin
+            if hasattr(stdin, 'buffer'):
+                counts = wc_stream(stdin.buffer, want)
+            else:
+                counts = wc_stream(io.BytesIO(stdin.read().encode('utf-8', 'surrogateescape')), want)
+            out.write(row(counts))
+            return 0
+        totals = [0, 0, 0, 0]
+        status = 0
+        count = functools.partial(wc_file, want=want)
+        for f, (counts, error) in zip(files, self._parallel_map(count, files)):
+            if error:
+                print(f"wc: {error}", file=self.stderr)
+                status = 1
+                continue
+            totals = [t + c for t, c in zip(totals, counts)]
+            out.write(row(counts, f))
+        if len(files) > 1:
+            out.write(row(totals, 'total'))
+        return status
+
+    # Files hashed ahead of the output, per worker thread
+    CHECKSUM_QUEUE_DEPTH = 64
+
+    def _open_checksum_cache(self, name):
+        """The ChecksumCache, opened on first use; None if it cannot be opened."""
+        if self._checksum_cache is None:
+            try:
+                self._checksum_cache = ChecksumCache(self.checksum_db)
+            except sqlite3.Error as e:
+                print(f"{name}: cannot open checksum cache: {e}", file=self.stderr)
+        return self._checksum_cache
+
+    def _checksum_stdin(self, stdin, algorithm):
+        """Hash stdin; returns (digest, None, error) like checksum_file."""
+        try:
+            if hasattr(stdin, 'buffer'):
+                return checksum_stream(stdin.buffer, algorithm), None, None
+            data = stdin.read().encode('utf-8', 'surrogateescape')
+            return checksum_stream(io.BytesIO(data), algorithm), None, None
+        except OSError as e:
+            return None, None, f"-: {e.strerror}"
+
+    def _checksums(self, algorithm, items, workers, cache):
+        """Yield (path, data, digest, error) for each (path, data) in items, in order.
+
+        Files are hashed by a pool of worker threads that runs at most
+        CHECKSUM_QUEUE_DEPTH files per worker ahead of the output; '-' is
+        stdin. With a cache, a regular file whose size, mtime and inode
+        match a recorded digest is not read at all.
+        """
+        stdin = self.stdin
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        pending = collections.deque()
+
+        def finish():
+            path, data, result = pending.popleft()
+            if isinstance(result, str):
+                return path, data, result, None
+            digest, st, error = result.result()
+            if cache is not None and st is not None and stat.S_ISREG(st.st_mode):
+                cache.store(path, algorithm, st, digest)
+            return path, data, digest, error
+
+        try:
+            for path, data in items:
+                if path == '-':
+                    result = pool.submit(self._checksum_stdin, stdin, algorithm)
+                else:
+                    result = None
+                    if cache is not None:
+                        try:
+                            st = os.stat(path)
+                        except OSError:
+                            pass
+                        else:
+                            if stat.S_ISREG(st.st_mode):
+                                result = cache.lookup(path, algorithm, st)
+                    if result is None:
+                        result = pool.submit(checksum_file, path, algorithm)
+                pending.append((path, data, result))
+                # Write out whatever is ready, waiting only when too far ahead
+                while pending and (len(pending) > workers * self.CHECKSUM_QUEUE_DEPTH
+                                   or isinstance(pending[0][2], str) or pending[0][2].done()):
+                    yield finish()
+            while pending:
+                yield finish()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if cache is not None:
+                cache.flush()
+
+    def _checksum_check(self, name, algorithm, manifests, opts, cache):
+        """Verify the files listed in checksum manifests; returns the exit status."""
+        out = self.stdout
+        quiet = 'quiet' in opts
+        silent = 'status' in opts
+        status = 0
+        improper = unreadable = mismatched = 0
+        for manifest in manifests:
+            try:
+                fh = self.stdin if manifest == '-' else open(manifest, errors='surrogateescape')
+            except OSError as e:
+                print(f"{name}: {manifest}: {e.strerror}", file=self.stderr)
+                status = 1
+                continue
+            listed = 0
+
+            def entries():
+                nonlocal improper, listed
+                for line in fh:
+                    line = line.rstrip('\n')
+                    if line.endswith('\r'):
+                        line = line[:-1]
+                    if not line or line.startswith('#'):
+                        continue
+                    entry = parse_checksum_line(line, algorithm)
+                    if entry is None:
+                        improper += 1
+                        continue
+                    listed += 1
+                    yield entry[1], entry[0]
+
+            try:
+                for path, expected, digest, error in self._checksums(
+                        algorithm, entries(), opts['workers'], cache):
+                    if error:
+                        unreadable += 1
+                        if not silent:
+                            print(f"{name}: {error}", file=self.stderr)
+                            out.write(f"{path}: FAILED open or read\n")
+                    elif digest != expected:
+                        mismatched += 1
+                        if not silent:
+                            out.write(f"{path}: FAILED\n")
+                    elif not quiet and not silent:
+                        out.write(f"{path}: OK\n")
+            finally:
+                if fh is not self.stdin:
+                    fh.close()
+            if not listed:
+                label = 'standard input' if manifest == '-' else manifest
+                print(f"{name}: {label}: no properly formatted checksum lines found",
+                      file=self.stderr)
+                status = 1
+        if not silent:
+            if improper:
+                print(f"{name}: WARNING: {improper} line{'s are' if improper > 1 else ' is'} "
+                      f"improperly formatted", file=self.stderr)
+            if unreadable:
+                print(f"{name}: WARNING: {unreadable} listed file{'s' if unreadable > 1 else ''} "
+                      f"could not be read", file=self.stderr)
+            if mismatched:
+                print(f"{name}: WARNING: {mismatched} computed checksum"
+                      f"{'s' if mismatched > 1 else ''} did NOT match", file=self.stderr)
+        return 1 if status or unreadable or mismatched else 0
+
+    def _checksum(self, name, args):
+        """Shared body of md5sum, sha1sum, sha256sum and sha512sum.
+
+        Files are hashed in parallel and printed in the order given; -c
+        reads 'DIGEST  NAME' manifests and checks every file listed.
+        --cache reuses digests of files unchanged since they were last
+        hashed (see ChecksumCache).
+        """
+        algorithm = CHECKSUM_ALGORITHMS[name]
+        long_flags = {'--check': 'check', '--cache': 'cache', '--quiet': 'quiet',
+                      '--status': 'status', '--binary': None, '--text': None}
+        # The ThreadPoolExecutor default: one per CPU plus a few to overlap reads
+        opts = {'workers': min(32, (os.cpu_count() or 1) + 4)}
+        files = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '--':
+                files.extend(args[i+1:])
+                break
+            if a == '-j' or a.startswith('--jobs='):
+                value = a.split('=', 1)[1] if '=' in a else (args[i+1] if i + 1 < len(args) else '')
+                if not value.isdigit():
+                    print(f"{name}: invalid number: '{value}'", file=self.stderr)
+                    return 1
+                opts['workers'] = max(int(value), 1)
+                i += 1 if '=' in a else 2
+                continue
+            if a in long_flags:
+                if long_flags[a]:
+                    opts[long_flags[a]] = True
+            elif len(a) > 1 and a[0] == '-' and not a.startswith('--'):
+                for c in a[1:]:
+                    if c not in 'cbt':
+                        print(f"{name}: invalid option -- '{c}'", file=self.stderr)
+                        return 1
+                    if c == 'c':
+                        opts['check'] = True
+            elif a.startswith('--'):
+                print(f"{name}: unrecognized option '{a}'", file=self.stderr)
+                return 1
+            else:
+                files.append(a)
+            i += 1
+        for flag in ('quiet', 'status'):
+            if flag in opts and 'check' not in opts:
+                print(f"{name}: the --{flag} option is meaningful only when verifying checksums",
+                      file=self.stderr)
+                return 1
+        files = files or ['-']
+        cache = self._open_checksum_cache(name) if 'cache' in opts else None
+        if 'check' in opts:
+            return self._checksum_check(name, algorithm, files, opts, cache)
+        out = self.stdout
+        status = 0
+        for path, _, digest, error in self._checksums(
+                algorithm, ((f, None) for f in files), opts['workers'], cache):
+            if error:
+                print(f"{name}: {error}", file=self.stderr)
+                status = 1
+            else:
+                out.write(checksum_line(digest, path))
+        return status
+
+    def cmd_md5sum(self, args):
+        """Compute or check MD5 digests. Usage: md5sum [-c] [--cache] [-j N] [file...]"""
+        return self._checksum('md5sum', args)
+
+    def cmd_sha1sum(self, args):
+        """Compute or check SHA-1 digests. Usage: sha1sum [-c] [--cache] [-j N] [file...]"""
+        return self._checksum('sha1sum', args)
+
+    def cmd_sha256sum(self, args):
+        """Compute or check SHA-256 digests. Usage: sha256sum [-c] [--cache] [-j N] [file...]"""
+        return self._checksum('sha256sum', args)
+
+    def cmd_sha512sum(self, args):
+        """Compute or check SHA-512 digests. Usage: sha512sum [-c] [--cache] [-j N] [file...]"""
+        return self._checksum('sha512sum', args)
+
+    def _sort_input_lines(self, files, failed):
+        """Yield input lines for sort, without newlines, from files or stdin.
+
+        Files that cannot be read are reported and appended to failed.
+        """
+        if not files:
+            for line in self.stdin:
+                yield line[:-1] if line.endswith('\n') else line
+            return
+        for f in files:
+            try:
+                with open(f, 'r', errors='surrogateescape', newline='\n') as fh:
+                    for line in fh:
+                        yield line[:-1] if line.endswith('\n') else line
+            except Exception as e:
+                print(f"sort: {e}", file=self.stderr)
+                failed.append(f)
+
+    def _merge_runs(self, paths, key, reverse, tmpdir):
+        """Merge spilled runs in passes until at most SORT_MERGE_FANIN remain.
+
+        Runs stay in input order, so equal keys keep their input order
+        (which -u relies on to pick the first of each group).
+        """
+        while len(paths) > SORT_MERGE_FANIN:
+            merged_paths = []
+            for i in range(0, len(paths), SORT_MERGE_FANIN):
+                group = paths[i:i + SORT_MERGE_FANIN]
+                fd, merged = tempfile.mkstemp(prefix='minishell-sort-', dir=tmpdir)
+                merged_paths.append(merged)
+                with open(fd, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+                    for line in heapq.merge(*map(read_sort_run, group), key=key, reverse=reverse):
+                        f.write(line + '\n')
+                for path in group:
+                    os.unlink(path)
+            paths[:] = merged_paths
+        return paths
+
+    def cmd_sort(self, args):
+        """Sort lines of files or stdin.
+
+        Usage: sort [-nru] [-t SEP] [-k F1[,F2][n]] [-S SIZE] [-T DIR] [--parallel N] [file...]
+
+        Runs of up to -S bytes are sorted in memory and spilled to temp
+        files, then k-way merged with heapq.merge, so memory stays bounded
+        for inputs of any size. With --parallel N, runs are sorted in N
+        worker processes.
+        """
+        numeric = reverse = unique = False
+        separator = None
+        keys = []
+        buffer_size = SORT_BUFFER_SIZE
+        tmpdir = None
+        workers = 1
+        files = []
+        i = 0
+        try:
+            while i < len(args):
+                a = args[i]
+                option = None
+                if a[:2] in ('-t', '-k', '-S', '-T') and len(a) > 2:
+                    # Attached value, e.g. -k2,2 or -S1G
+                    option, value = a[:2], a[2:]
+                    i += 1
+                elif a in ('-t', '-k', '-S', '-T', '--parallel') and i + 1 < len(args):
+                    option, value = a, args[i+1]
+                    i += 2
+                if option is not None:
+                    a = option
+                    if a == '-t':
+                        separator = value
+                    elif a == '-k':
+                        m = re.fullmatch(r'(\d+)(?:,(\d+))?(n?)', value)
+                        if not m or int(m.group(1)) < 1:
+                            raise ValueError(f"invalid key: '{value}'")
+                        last = int(m.group(2)) if m.group(2) else None
+                        keys.append((int(m.group(1)), last, bool(m.group(3)) or numeric))
+                    elif a == '-S':
+                        buffer_size = max(parse_size(value), 1024)
+                    elif a == '-T':
+                        tmpdir = value
+                    else:
+                        workers = max(int(value), 1)
+                    continue
+                if len(a) > 1 and a[0] == '-' and set(a[1:]) <= set('nru'):
+                    numeric = numeric or 'n' in a
+                    reverse = reverse or 'r' in a
+                    unique = unique or 'u' in a
+                else:
+                    files.append(a)
+                i += 1
+        except ValueError as e:
+            print(f"sort: {e}", file=self.stderr)
+            return 2
+        if numeric:
+            keys = [(first, last, True) for first, last, _ in keys]
+        key = None
+        if keys or numeric or unique:
+            key = SortKey(keys, separator, numeric, unique)
+
+        runs = []
+        pending = []
+        failed = []
+        pool = None
+        if workers > 1:
+            pool = process_pool(workers)
+        try:
+            buf = []
+            size = 0
+            for line in self._sort_input_lines(files, failed):
+                buf.append(line)
+                size += len(line) + SORT_LINE_OVERHEAD
+                if size < buffer_size:
+                    continue
+                if pool is None:
+                    runs.append(write_sort_run(buf, key, reverse, tmpdir))
+                else:
+                    # Keep at most one run per worker in flight to bound memory
+                    if len(pending) >= workers:
+                        runs.append(pending.pop(0).result())
+                    pending.append(pool.submit(write_sort_run, buf, key, reverse, tmpdir))
+                buf = []
+                size = 0
+            runs.extend(f.result() for f in pending)
+            pending = []
+            buf.sort(key=key, reverse=reverse)
+            if runs:
+                runs = self._merge_runs(runs, key, reverse, tmpdir)
+                merged = heapq.merge(*map(read_sort_run, runs), buf, key=key, reverse=reverse)
+            else:
+                merged = iter(buf)
+            if unique:
+                merged = (next(group) for _, group in itertools.groupby(merged, key=key))
+            out = self.stdout
+            while True:
+                chunk = list(itertools.islice(merged, 4096))
+                if not chunk:
+                    break
+                out.write('\n'.join(chunk))
+                out.write('\n')
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            for f in pending:
+                if f.done() and not f.cancelled() and f.exception() is None:
+                    runs.append(f.result())
+            for path in runs:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        return 2 if failed else 0
+
+    def _diff_files(self, a, b, context, quick, header=None):
+        """Compare two files and write the result; returns True if they differ."""
+        if files_identical(a, b):
+            return False
+        if header:
+            self.stdout.write(header)
+        if quick:
+            self.stdout.write(f"Files {a} and {b} differ\n")
+            return True
+        with open(a, 'rb') as fa, open(b, 'rb') as fb:
+            a_lines = fa.readlines()
+            b_lines = fb.readlines()
+        if any(b'\0' in lines[0][:8192] for lines in (a_lines, b_lines) if lines):
+            self.stdout.write(f"Binary files {a} and {b} differ\n")
+            return True
+        for chunk in unified_diff(a_lines, b_lines, a, b, context):
+            self._write_bytes(chunk)
+        return True
+
+    def _diff_dirs(self, a, b, context, quick):
+        """Recursively compare two directories, like diff -r.
+
+        Returns diff's exit status: 0 if identical, 1 if they differ and
+        2 if something could not be read.
+        """
+        try:
+            a_names = set(os.listdir(a))
+            b_names = set(os.listdir(b))
+        except OSError as e:
+            print(f"diff: {e}", file=self.stderr)
+            return 2
+        status = 0
+        for name in sorted(a_names | b_names):
+            pa = os.path.join(a, name)
+            pb = os.path.join(b, name)
+            if name not in b_names:
+                self.stdout.write(f"Only in {a}: {name}\n")
+                status = max(status, 1)
+            elif name not in a_names:
+                self.stdout.write(f"Only in {b}: {name}\n")
+                status = max(status, 1)
+            elif os.path.isdir(pa) and os.path.isdir(pb):
+                status = max(status, self._diff_dirs(pa, pb, context, quick))
+            elif os.path.isdir(pa) or os.path.isdir(pb):
+                kinds = ['directory' if os.path.isdir(p) else 'regular file' for p in (pa, pb)]
+                self.stdout.write(f"File {pa} is a {kinds[0]} while file {pb} is a {kinds[1]}\n")
+                status = max(status, 1)
+            else:
+                try:
+                    if self._diff_files(pa, pb, context, quick, header=f"diff -r {pa} {pb}\n"):
+                        status = max(status, 1)
+                except OSError as e:
+                    print(f"diff: {e}", file=self.stderr)
+                    status = 2
+        return status
+
+    def cmd_diff(self, args):
+        """Show unified diff between two files. Usage: diff [-qru] [-U N] a b
+
+        Uses a Myers O(ND) diff on interned lines, so large files with few
+        changes are compared quickly. -q only reports whether files differ,
+        -r compares directories recursively, -U sets the context size.
+        Returns 0 if the inputs are the same, 1 if they differ, 2 on errors.
+        """
+        quick = recursive = False
+        context = 3
+        operands = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '-U' and i + 1 < len(args) and args[i+1].isdigit():
+                context = int(args[i+1])
+                i += 2
+                continue
+            if a.startswith('--unified=') and a[10:].isdigit():
+                context = int(a[10:])
+            elif a.startswith('-U') and a[2:].isdigit():
+                context = int(a[2:])
+            elif len(a) > 1 and a[0] == '-' and set(a[1:]) <= set('qru'):
+                quick = quick or 'q' in a
+                recursive = recursive or 'r' in a
+            else:
+                operands.append(a)
+            i += 1
+        if len(operands) != 2:
+            print("diff: need two file operands", file=self.stderr)
+            return 2
+        a, b = operands
+        try:
+            if os.path.isdir(a) and os.path.isdir(b):
+                if recursive:
+                    return self._diff_dirs(a, b, context, quick)
+                print(f"diff: {a} and {b} are directories (use -r)", file=self.stderr)
+                return 2
+            # diff FILE DIR compares against the file of the same name in DIR
+            if os.path.isdir(b):
+                b = os.path.join(b, os.path.basename(a))
+            elif os.path.isdir(a):
+                a = os.path.join(a, os.path.basename(b))
+            return 1 if self._diff_files(a, b, context, quick) else 0
+        except FileNotFoundError as e:
+            print(f"diff: {e.filename}: No such file or directory", file=self.stderr)
+        except Exception as e:
+            print(f"diff: {e}", file=self.stderr)
+        return 2
+
+    # Search / system utilities
+    def _find_visit(self, entry, depth, expr, mindepth, maxdepth):
+        """Evaluate one entry; returns (output, descend)."""
+        try:
+            output, prune = expr.evaluate(entry) if depth >= mindepth else (False, False)
+        except OSError as e:
+            print(f"find: '{entry.path}': {e.strerror}", file=self.stderr)
+            return False, False
+        descend = (depth < maxdepth and not prune and entry.is_dir(follow_symlinks=False))
+        return output, descend
+
+    def _find_serial(self, root, expr, mindepth, maxdepth):
+        """Yield matching paths below root in pre-order, one scandir at a time."""
+        output, descend = self._find_visit(PathEntry(root), 0, expr, mindepth, maxdepth)
+        if output:
+            yield root
+        if not descend:
+            return
+        stack = []
+        try:
+            stack.append((os.scandir(root), 1))
+        except OSError as e:
+            print(f"find: '{root}': {e.strerror}", file=self.stderr)
+        try:
+            while stack:
+                it, depth = stack[-1]
+                entry = next(it, None)
+                if entry is None:
+                    it.close()
+                    stack.pop()
+                    continue
+                output, descend = self._find_visit(entry, depth, expr, mindepth, maxdepth)
+                if output:
+                    yield entry.path
+                if descend:
+                    try:
+                        stack.append((os.scandir(entry.path), depth + 1))
+                    except OSError as e:
+                        print(f"find: '{entry.path}': {e.strerror}", file=self.stderr)
+        finally:
+            for it, _ in stack:
+                it.close()
+
+    def _find_scan_dir(self, path, depth, expr, mindepth, maxdepth):
+        """Scan one directory for the threaded walk; returns (matches, subdirs)."""
+        matches = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    output, descend = self._find_visit(entry, depth, expr, mindepth, maxdepth)
+                    if output:
+                        matches.append(entry.path)
+                    if descend:
+                        subdirs.append(entry.path)
+        except OSError as e:
+            print(f"find: '{path}': {e.strerror}", file=self.stderr)
+        return matches, subdirs
+
+    def _find_parallel(self, root, expr, mindepth, maxdepth, workers):
+        """Yield matching paths, scanning sibling directories concurrently.
+
+        Each directory is scanned by a pool thread and results are yielded
+        as soon as any scan finishes, so output order is not deterministic.
+        """
+        output, descend = self._find_visit(PathEntry(root), 0, expr, mindepth, maxdepth)
+        if output:
+            yield root
+        if not descend:
+            return
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            pending = {pool.submit(self._find_scan_dir, root, 1, expr, mindepth, maxdepth): 1}
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    depth = pending.pop(future)
+                    matches, subdirs = future.result()
+                    for path in subdirs:
+                        pending[pool.submit(self._find_scan_dir, path, depth + 1,
+                                            expr, mindepth, maxdepth)] = depth + 1
+                    yield from matches
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def cmd_find(self, args):
+        """Find files. Usage: find [path...] [-maxdepth N] [-mindepth N] [-j N] [expression]
+
+        Walks with os.scandir, using each entry's cached type and only
+        stat-ing when -size/-mtime/-mmin need it. Results are written as
+        they are found. -j N scans sibling directories in N threads.
+        """
+        paths = []
+        i = 0
+        while i < len(args) and not args[i].startswith('-') and args[i] not in ('!', '(', ')'):
+            paths.append(args[i])
+            i += 1
+        tokens = []
+        mindepth, maxdepth, workers = 0, float('inf'), 1
+        try:
+            while i < len(args):
+                a = args[i]
+                if a in ('-maxdepth', '-mindepth', '-j'):
+                    if i + 1 >= len(args) or not args[i+1].isdigit():
+                        raise ValueError(f"{a}: expected a non-negative number")
+                    value = int(args[i+1])
+                    if a == '-maxdepth':
+                        maxdepth = value
+                    elif a == '-mindepth':
+                        mindepth = value
+                    else:
+                        workers = max(value, 1)
+                    i += 2
+                    continue
+                tokens.append(a)
+                i += 1
+            expr = FindExpression(tokens)
+        except (ValueError, re.error) as e:
+            print(f"find: {e}", file=self.stderr)
+            return 1
+        out = self.stdout
+        status = 0
+        for root in paths or ['.']:
+            if not os.path.lexists(root):
+                print(f"find: '{root}': No such file or directory", file=self.stderr)
+                status = 1
+                continue
+            if workers > 1:
+                found = self._find_parallel(root, expr, mindepth, maxdepth, workers)
+            else:
+                found = self._find_serial(root, expr, mindepth, maxdepth)
+            for path in found:
+                out.write(path + '\n')
+        return status
+
+    def cmd_which(self, args):
+        """Locate a command in PATH."""
+        if not args:
+            print("which: missing operand", file=self.stderr)
+            return 1
+        status = 0
+        for cmd in args:
+            path = self.command_hash.lookup(cmd, count=False)
+            if path and not os.access(path, os.X_OK):
+                # Cached binary went missing; look it up afresh
+                self.command_hash.forget(cmd)
+                path = self.command_hash.lookup(cmd, count=False)
+            if path and os.access(path, os.X_OK):
+                print(path, file=self.stdout)
+            else:
+                print(f"which: no {cmd} in ({os.environ.get('PATH', '')})", file=self.stderr)
+                status = 1
+        return status
+
+    def cmd_hash(self, args):
+        """Remember or report command locations. Usage: hash [-lrt] [-d name] [-p path name] [name...]
+
+        With no arguments, lists remembered commands with their hit counts.
+        -r forgets everything, -l lists in a form that can be re-entered,
+        -d forgets names, -p sets a name's path and -t prints it.
+        """
+        table = self.command_hash
+        if not args:
+            items = table.items()
+            if not items:
+                print("hash: hash table empty", file=self.stdout)
+                return
+            lines = ["hits\tcommand"] + [f"{hits:4d}\t{path}" for _, path, hits in items]
+            self.stdout.write('\n'.join(lines) + '\n')
+            return
+        option = args[0] if args[0].startswith('-') else None
+        names = args[1:] if option else args
+        status = 0
+        if option == '-r':
+            table.clear()
+        elif option == '-l':
+            lines = [f"hash -p {path} {name}" for name, path, _ in table.items()]
+            if lines:
+                self.stdout.write('\n'.join(lines) + '\n')
+            else:
+                print("hash: hash table empty", file=self.stdout)
+        elif option == '-p':
+            if len(names) != 2:
+                print("hash: usage: hash -p path name", file=self.stderr)
+                return 2
+            table.remember(names[1], names[0])
+        elif option == '-d':
+            for name in names:
+                if not table.forget(name):
+                    print(f"hash: {name}: not found", file=self.stderr)
+                    status = 1
+        elif option == '-t':
+            for name in names:
+                path = table.lookup(name, count=False)
+                if path is None:
+                    print(f"hash: {name}: not found", file=self.stderr)
+                    status = 1
+                else:
+                    print(f"{name}\t{path}" if len(names) > 1 else path, file=self.stdout)
+        elif option is not None:
+            print(f"hash: {option}: invalid option", file=self.stderr)
+            return 2
+        else:
+            for name in names:
+                if name in self.get_builtins():
+                    continue
+                if table.lookup(name, count=False) is None:
+                    print(f"hash: {name}: not found", file=self.stderr)
+                    status = 1
+        return status
+
+    # Threads used by du to scan directories concurrently
+    DU_WORKERS = 8
+
+    def _du_scan(self, path, usage, root_dev, seen, seen_lock):
+        """Scan one directory for du; returns (size_of_files, subdirs).
+
+        subdirs is a list of (path, name, own_size). Each entry costs one
+        lstat (from DirEntry.stat). Files with several links are counted
+        once per (st_dev, st_ino).
+        """
+        total = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        print(f"du: cannot access '{entry.path}': {e.strerror}", file=self.stderr)
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        if root_dev is None or st.st_dev == root_dev:
+                            subdirs.append((entry.path, entry.name, usage(st)))
+                        continue
+                    if st.st_nlink > 1:
+                        key = (st.st_dev, st.st_ino)
+                        with seen_lock:
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                    total += usage(st)
+        except OSError as e:
+            print(f"du: cannot read directory '{path}': {e.strerror}", file=self.stderr)
+        return total, subdirs
+
+    def _du_tree(self, root, root_st, usage, one_fs, max_depth, workers, seen, seen_lock):
+        """Return [(path, size)] for directories under root, in post-order.
+
+        Each directory is scanned as a separate task, on a thread pool when
+        workers > 1. Sizes are rolled up into the parent once all of a
+        directory's subdirectories are done.
+        """
+        root_dev = root_st.st_dev if one_fs else None
+        results = []
+        pending = {}
+        todo = []
+        pool = None
+        if workers > 1:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        def submit(node):
+            if pool is None:
+                todo.append(node)
+            else:
+                pending[pool.submit(self._du_scan, node.path, usage, root_dev, seen, seen_lock)] = node
+
+        def finish(node):
+            # Roll finished directories up into their parents
+            while node is not None and node.pending == 0:
+                if len(node.parts) <= max_depth:
+                    results.append((node.parts, node.path, node.size))
+                parent = node.parent
+                if parent is not None:
+                    parent.size += node.size
+                    parent.pending -= 1
+                node = parent
+
+        try:
+            submit(DuNode(root, (), None, usage(root_st)))
+            while pending or todo:
+                if pool is None:
+                    node = todo.pop()
+                    done = [(node, self._du_scan(node.path, usage, root_dev, seen, seen_lock))]
+                else:
+                    finished, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    done = [(pending.pop(f), f.result()) for f in finished]
+                for node, (size, subdirs) in done:
+                    node.size += size
+                    node.pending = len(subdirs)
+                    for path, name, own in subdirs:
+                        submit(DuNode(path, node.parts + (name,), node, own))
+                    if not subdirs:
+                        finish(node)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        # Children before parents, siblings by name
+        results.sort(key=lambda r: r[0] + ('\U0010ffff',))
+        return [(path, size) for _, path, size in results]
+
+    def cmd_du(self, args):
+        """Disk usage. Usage: du [-shxb] [--max-depth=N] [--apparent-size] [-j N] [path...]
+
+        Sizes are allocated blocks (st_blocks) in KiB unless -b or
+        --apparent-size is given; hard-linked files are counted once.
+        """
+        summarize = human = one_fs = apparent = False
+        byte_units = False
+        max_depth = None
+        workers = self.DU_WORKERS
+        paths = []
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a.startswith('--max-depth=') or a in ('-d', '-j'):
+                value = a.split('=', 1)[1] if '=' in a else (args[i+1] if i + 1 < len(args) else '')
+                if not value.isdigit():
+                    print(f"du: invalid number: '{value}'", file=self.stderr)
+                    return 1
+                if a == '-j':
+                    workers = max(int(value), 1)
+                else:
+                    max_depth = int(value)
+                i += 1 if '=' in a else 2
+                continue
+            if a == '--apparent-size':
+                apparent = True
+            elif len(a) > 1 and a[0] == '-' and set(a[1:]) <= set('shxb'):
+                summarize = summarize or 's' in a
+                human = human or 'h' in a
+                one_fs = one_fs or 'x' in a
+                if 'b' in a:
+                    apparent = byte_units = True
+            else:
+                paths.append(a)
+            i += 1
+        if summarize:
+            max_depth = 0
+        if max_depth is None:
+            max_depth = float('inf')
+        if apparent:
+            usage = lambda st: st.st_size
+        else:
+            usage = lambda st: st.st_blocks * 512
+        if human:
+            fmt = human_size
+        elif byte_units:
+            fmt = str
+        else:
+            fmt = lambda n: str(-(-n // 1024))
+        out = self.stdout
+        seen = set()
+        seen_lock = threading.Lock()
+        status = 0
+        for p in paths or ['.']:
+            try:
+                st = os.lstat(p)
+            except OSError as e:
+                print(f"du: cannot access '{p}': {e.strerror}", file=self.stderr)
+                status = 1
+                continue
+            if not stat.S_ISDIR(st.st_mode):
+                rows = [(p, usage(st))]
+            else:
+                rows = self._du_tree(p, st, usage, one_fs, max_depth, workers, seen, seen_lock)
+            out.write(''.join(f"{fmt(size)}\t{path}\n" for path, size in rows))
+        return status
+
+    def cmd_env(self, args):
+        """Print environment variables."""
+        for k, v in os.environ.items():
+            print(f"{k}={v}", file=self.stdout)
+
+    # Lines buffered before tree writes a batch to the terminal
+    TREE_FLUSH_LINES = 2048
+
+    def _tree_entries(self, path, relbase, opts, ignore):
+        """Return the sorted entries of path that tree should show."""
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                if not opts['all'] and name.startswith('.'):
+                    continue
+                if opts['ignore'] and opts['ignore'].match(name):
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if opts['dirs_only'] and not is_dir:
+                    continue
+                if ignore is not None and (name == '.git' or ignore.ignored(relbase + name, is_dir)):
+                    continue
+                entries.append((name, entry, is_dir))
+        entries.sort(key=lambda e: e[0])
+        return entries
+
+    def _tree_walk(self, root, opts, out):
+        """Write the tree below root; returns the (directories, files) count.
+
+        The walk is iterative: a stack holds one frame per open directory,
+        so depth is bounded only by -L, not by the recursion limit. Lines are
+        collected and written in batches.
+        """
+        dirs = files = 0
+        lines = [root]
+        last_flush = time.monotonic()
+        ignore = GitIgnore.load(None, root, '') if opts['gitignore'] else None
+        stack = []
+        try:
+            stack.append([self._tree_entries(root, '', opts, ignore), 0, '', 1, '', ignore])
+        except OSError as e:
+            lines.append(f"{root} [error opening dir: {e.strerror}]")
+        while stack:
+            frame = stack[-1]
+            entries, pos, prefix, depth, relbase, ignore = frame
+            if pos == len(entries):
+                stack.pop()
+                continue
+            frame[1] = pos + 1
+            name, entry, is_dir = entries[pos]
+            last = pos == len(entries) - 1
+            label = name
+            if entry.is_symlink():
+                try:
+                    label = f"{name} -> {os.readlink(entry.path)}"
+                except OSError:
+                    pass
+            lines.append(prefix + ('└── ' if last else '├── ') + label)
+            if not is_dir:
+                files += 1
+                continue
+            dirs += 1
+            if opts['level'] is not None and depth >= opts['level']:
+                continue
+            rel = relbase + name + '/'
+            child_ignore = GitIgnore.load(ignore, entry.path, rel) if ignore is not None else None
+            child_prefix = prefix + ('    ' if last else '│   ')
+            try:
+                children = self._tree_entries(entry.path, rel, opts, child_ignore)
+            except OSError as e:
+                lines.append(f"{child_prefix}[error opening dir: {e.strerror}]")
+                continue
+            stack.append([children, 0, child_prefix, depth + 1, rel, child_ignore])
+            if self._cancelled():
+                break
+            if len(lines) >= self.TREE_FLUSH_LINES or time.monotonic() - last_flush > 0.1:
+                out.write('\n'.join(lines) + '\n')
+                lines = []
+                last_flush = time.monotonic()
+        if lines:
+            out.write('\n'.join(lines) + '\n')
+        return dirs, files
+
+    def cmd_tree(self, args):
+        """Display a directory tree. Usage: tree [-a] [-d] [-L N] [-I PAT] [--gitignore] [path...]
+
+        -L limits the depth, -d lists directories only, -I hides names
+        matching any of the '|'-separated wildcards and --gitignore hides
+        whatever the .gitignore files in the tree exclude.
+        """
+        opts = {'all': False, 'dirs_only': False, 'level': None, 'ignore': None, 'gitignore': False}
+        patterns = []
+        roots = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ('-L', '-I'):
+                if i + 1 >= len(args):
+                    print(f"tree: option requires an argument -- '{arg[1]}'", file=self.stderr)
+                    return 1
+                i += 1
+                if arg == '-I':
+                    patterns.extend(p for p in args[i].split('|') if p)
+                else:
+                    try:
+                        opts['level'] = int(args[i])
+                    except ValueError:
+                        opts['level'] = 0
+                    if opts['level'] < 1:
+                        print("tree: Invalid level, must be greater than 0.", file=self.stderr)
+                        return 1
+            elif arg == '--gitignore':
+                opts['gitignore'] = True
+            elif arg in ('-a', '-d'):
+                opts['all' if arg == '-a' else 'dirs_only'] = True
+            elif arg.startswith('-') and arg != '-':
+                print(f"tree: invalid option -- '{arg[1:]}'", file=self.stderr)
+                return 1
+            else:
+                roots.append(arg)
+            i += 1
+        if patterns:
+            opts['ignore'] = re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+        out = self.stdout
+        dirs = files = 0
+        status = 0
+        try:
+            for root in roots or ['.']:
+                if not os.path.isdir(root):
+                    out.write(f"{root} [error opening dir]\n")
+                    status = 1
+                    continue
+                d, f = self._tree_walk(root, opts, out)
+                dirs += d
+                files += f
+        except KeyboardInterrupt:
+            print(file=self.stdout)
+            return 130
+        if opts['dirs_only']:
+            summary = f"{dirs} director{'y' if dirs == 1 else 'ies'}"
+        else:
+            summary = (f"{dirs} director{'y' if dirs == 1 else 'ies'}, "
+                       f"{files} file{'' if files == 1 else 's'}")
+        out.write(f"\n{summary}\n")
+        return status
+
+    def cmd_history(self, args):
+        """Show or search command history. Usage: history [-l] [-s TEXT | -z TEXT] [N] | history -c
+
+        -s finds commands containing TEXT, -z does a fuzzy (in-order
+        characters) search; -l adds start time, exit status and cwd.
+        """
+        if args and args[0] == '-c':
+            # Clear history
+            self.history.clear()
+            if self.interactive:
+                readline.clear_history()
+            print("History cleared", file=self.stdout)
+            return
+        long_format = False
+        mode = text = None
+        limit = 50
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == '-l':
+                long_format = True
+            elif a in ('-s', '-z'):
+                if i + 1 >= len(args):
+                    print(f"history: option requires an argument -- '{a[1]}'", file=self.stderr)
+                    return 2
+                mode, text = a, args[i + 1]
+                i += 1
+            elif a.isdigit():
+                limit = int(a)
+            else:
+                print(f"history: invalid argument: '{a}'", file=self.stderr)
+                return 2
+            i += 1
+        if mode == '-s':
+            entries = self.history.search(text, limit)
+        elif mode == '-z':
+            entries = self.history.fuzzy(text, limit)
+        else:
+            entries = self.history.recent(limit)
+        # Show history with entry numbers
+        lines = []
+        for rowid, command, started, duration, cwd, status in entries:
+            if long_format:
+                when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)) if started else '-' * 19
+                code = '-' if status is None else str(status)
+                lines.append(f"{rowid:5d}  {when}  {code:>3}  {cwd or '-'}  {command}")
+            else:
+                lines.append(f"{rowid:5d}  {command}")
+        if lines:
+            self.stdout.write('\n'.join(lines) + '\n')
+    
+    def cmd_time(self, args):
+        """Run a command and report what it cost. Usage: time [-p] command [arg...]
+
+        Writes wall clock, user and system CPU time, peak resident memory
+        and block I/O counts to stderr (-p: POSIX format, times only).
+        Returns the command's status.
+        """
+        posix = args[:1] == ['-p']
+        if posix:
+            args = args[1:]
+        if args:
+            self.run_measured([args], report='posix' if posix else 'default')
+        else:
+            self.stderr.write(CommandMeter().stop().format(posix))
+        return self.last_status
+
+    def cmd_trace(self, args):
+        """Show the timings recorded under set -o trace.
+
+        Usage: trace [--json [FILE]] | trace -c
+
+        Prints one row per command with its count and wall-time total,
+        mean, p50, p99 and max; --json writes everything, including the
+        latency histograms, as JSON to stdout or FILE. -c clears it.
+        """
+        if args[:1] == ['-c']:
+            self.trace.clear()
+            return 0
+        if args[:1] == ['--json']:
+            if len(args) > 1:
+                try:
+                    with open(args[1], 'w') as f:
+                        f.write(self.trace_json() + '\n')
+                except OSError as e:
+                    print(f"trace: {args[1]}: {e.strerror}", file=self.stderr)
+                    return 1
+            else:
+                self.stdout.write(self.trace_json() + '\n')
+            return 0
+        if args:
+            print(f"trace: invalid argument: '{args[0]}'", file=self.stderr)
+            return 2
+        if not self.trace:
+            print("trace: nothing recorded (turn tracing on with set -o trace)", file=self.stderr)
+            return 0
+        ms = lambda t: f"{t * 1000:10.2f}"
+        lines = [f"{'count':>7} {'total ms':>10} {'mean ms':>10} {'p50 ms':>10} "
+                 f"{'p99 ms':>10} {'max ms':>10}  command"]
+        for name, stats in sorted(self.trace.items(), key=lambda item: -item[1].wall):
+            lines.append(f"{stats.count:7d} {ms(stats.wall)} {ms(stats.wall / stats.count)} "
+                         f"{ms(stats.percentile(0.5))} {ms(stats.percentile(0.99))} "
+                         f"{ms(stats.max_wall)}  {name}")
+        self.stdout.write('\n'.join(lines) + '\n')
+        return 0
+
+    def trace_json(self):
+        """The recorded trace as a JSON document."""
+        return json.dumps({
+            'commands': {name: stats.as_dict() for name, stats in sorted(self.trace.items())},
+        }, indent=2)
+
+    # Job control
+
+    def _find_job(self, name, spec, pids=False):
+        """Look up a job for a builtin, reporting it if there is none."""
+        job = self.job_table.find(spec, pids) if spec else self.job_table.current()
+        if job is None:
+            print(f"{name}: {spec or 'current'}: no such job", file=self.stderr)
+        return job
+
+    def cmd_jobs(self, args):
+        """List background jobs. Usage: jobs [-l | -p]
+
+        -l adds process ids and -p prints only those. Finished jobs are
+        listed once and then forgotten.
+        """
+        for a in args:
+            if a not in ('-l', '-p'):
+                print(f"jobs: {a}: invalid option", file=self.stderr)
+                return 2
+        table = self.job_table
+        if '-p' in args:
+            lines = [str(job.pid) for job in table if job.pid]
+        else:
+            lines = [table.format(job, pids='-l' in args) for job in table]
+        if lines:
+            self.stdout.write('\n'.join(lines) + '\n')
+        for job in table:
+            if job.finished.is_set():
+                table.remove(job)
+        return 0
+
+    def cmd_wait(self, args):
+        """Wait for background jobs. Usage: wait [%job | pid]...
+
+        Without arguments waits for every job and returns 0; otherwise
+        returns the status of the last job named. Ctrl+C stops waiting
+        but leaves the jobs running.
+        """
+        table = self.job_table
+        status = 0
+        try:
+            if not args:
+                for job in table:
+                    job.finished.wait()
+                    table.remove(job)
+                return 0
+            for spec in args:
+                job = self._find_job('wait', spec, pids=True)
+                if job is None:
+                    status = 127
+                    continue
+                job.finished.wait()
+                table.remove(job)
+                status = job.status
+        except KeyboardInterrupt:
+            print(file=self.stdout)
+            return 130
+        return status
+
+    def cmd_fg(self, args):
+        """Wait for a job in the foreground. Usage: fg [%job]
+
+        A stopped job is continued first, and Ctrl+C is passed on to the
+        job instead of interrupting the shell.
+        """
+        job = self._find_job('fg', args[0] if args else None)
+        if job is None:
+            return 1
+        print(job.command, file=self.stdout)
+        if job.stopped:
+            job.send(signal.SIGCONT)
+        while True:
+            try:
+                job.finished.wait()
+                break
+            except KeyboardInterrupt:
+                print(file=self.stdout)
+                job.send(signal.SIGINT)
+        self.job_table.remove(job)
+        return job.status
+
+    def cmd_bg(self, args):
+        """Continue stopped jobs in the background. Usage: bg [%job]..."""
+        status = 0
+        for spec in args or [None]:
+            job = self._find_job('bg', spec)
+            if job is None:
+                status = 1
+            elif not job.stopped:
+                print(f"bg: job {job.number} already in background", file=self.stderr)
+            else:
+                job.send(signal.SIGCONT)
+                print(f"[{job.number}] {job.command} &", file=self.stdout)
+        return status
+
+    def cmd_kill(self, args):
+        """Send a signal to jobs or processes.
+
+        Usage: kill [-s SIGNAL | -SIGNAL] %job|pid... | kill -l
+
+        The default signal is TERM. Builtin stages of a job cannot receive
+        signals; anything but a stop/continue signal cancels them.
+        """
+        if args and args[0] == '-l':
+            names = [sig.name[3:] for sig in sorted(signal.valid_signals())
+                     if isinstance(sig, signal.Signals)]
+            print(' '.join(names), file=self.stdout)
+            return 0
+        name = 'TERM'
+        if args and args[0] == '-s' and len(args) > 1:
+            name, args = args[1], args[2:]
+        elif args and len(args[0]) > 1 and args[0][0] == '-':
+            name, args = args[0][1:], args[1:]
+        try:
+            if name.isdigit():
+                sig = signal.Signals(int(name))
+            else:
+                sig = signal.Signals[name.upper() if name.upper().startswith('SIG') else 'SIG' + name.upper()]
+        except (KeyError, ValueError):
+            print(f"kill: {name}: invalid signal specification", file=self.stderr)
+            return 1
+        if not args:
+            print("kill: usage: kill [-s sigspec | -sigspec] pid | %job ... or kill -l",
+                  file=self.stderr)
+            return 2
+        status = 0
+        for target in args:
+            job = self.job_table.find(target, pids=True)
+            if job is not None:
+                job.send(sig)
+            elif target.startswith('%'):
+                print(f"kill: {target}: no such job", file=self.stderr)
+                status = 1
+            elif target.isdigit():
+                try:
+                    os.kill(int(target), sig)
+                except OSError as e:
+                    print(f"kill: ({target}) - {e.strerror}", file=self.stderr)
+                    status = 1
+            else:
+                print(f"kill: {target}: arguments must be process or job IDs", file=self.stderr)
+                status = 1
+        return status
+
+    def _parallel_job(self, argv):
+        """Run one job for parallel; returns (status, stdout, stderr) as bytes.
+
+        Builtins run in the calling worker thread with their output
+        captured; external commands get /dev/null as input.
+        """
+        func = self.get_builtins().get(argv[0])
+        if func is not None:
+            out, err = io.StringIO(), io.StringIO()
+            self._io.stdin = io.StringIO()
+            self._io.stdout = out
+            self._io.stderr = err
+            try:
+                status = func(argv[1:])
+                status = status if isinstance(status, int) else 0
+            except Exception as e:
+                status = 1
+                err.write(f"{argv[0]}: {e}\n")
+            finally:
+                self._io.stdin = None
+                self._io.stdout = None
+                self._io.stderr = None
+            return (status, out.getvalue().encode('utf-8', 'surrogateescape'),
+                    err.getvalue().encode('utf-8', 'surrogateescape'))
+        executable = self.command_hash.lookup(argv[0], count=False)
+        if executable is None:
+            return 127, b'', f"{argv[0]}: command not found\n".encode()
+        try:
+            result = subprocess.run(argv, executable=executable, stdin=subprocess.DEVNULL,
+                                    capture_output=True)
+        except OSError as e:
+            return 126, b'', f"{argv[0]}: {e.strerror}\n".encode()
+        return exit_status(result.returncode), result.stdout, result.stderr
+
+    def cmd_parallel(self, args):
+        """Run a command once per input, several at a time.
+
+        Usage: parallel [-j N] [-k] [--tag] COMMAND [ARG...] [::: VALUE...]...
+
+        Inputs are the values after ':::' (every combination when there
+        are several groups), or the lines of stdin. Jobs are builtins or
+        external commands run by a pool of N workers (default: one per
+        CPU). Each job's output is written in one block when it finishes,
+        in input order with -k, with every line prefixed by the input
+        under --tag. Returns the number of failed jobs, at most 101.
+        """
+        workers = os.cpu_count() or 1
+        keep_order = tag = False
+        i = 0
+        while i < len(args) and args[i].startswith('-'):
+            a = args[i]
+            if a in ('-j', '--jobs') or a.startswith('-j'):
+                if a.startswith('-j') and len(a) > 2:
+                    value = a[2:]
+                    i += 1
+                else:
+                    value = args[i + 1] if i + 1 < len(args) else ''
+                    i += 2
+                if not value.isdigit() or int(value) < 1:
+                    print(f"parallel: invalid number of jobs: '{value}'", file=self.stderr)
+                    return 2
+                workers = int(value)
+                continue
+            if a in ('-k', '--keep-order'):
+                keep_order = True
+            elif a == '--tag':
+                tag = True
+            else:
+                print(f"parallel: invalid option '{a}'", file=self.stderr)
+                return 2
+            i += 1
+        words = args[i:]
+        groups = []
+        if ':::' in words:
+            at = words.index(':::')
+            command = words[:at]
+            for word in words[at + 1:]:
+                if word == ':::':
+                    groups.append([])
+                elif groups:
+                    groups[-1].append(word)
+                else:
+                    groups.append([word])
+            inputs = itertools.product(*groups)
+        else:
+            command = words
+            inputs = ((line.rstrip('\n'),) for line in self.stdin if line.strip())
+        if not command:
+            print("parallel: missing command", file=self.stderr)
+            return 2
+        error_stream = self.stderr
+        pending = collections.deque()
+        failed = 0
+
+        def emit(values, future):
+            nonlocal failed
+            status, out, err = future.result()
+            if status:
+                failed += 1
+            if tag:
+                prefix = os.fsencode('\t'.join(values) + '\t')
+                out = b''.join(prefix + line for line in out.splitlines(True))
+                err = b''.join(prefix + line for line in err.splitlines(True))
+            if out:
+                self._write_bytes(out)
+            if err:
+                self._write_bytes(err, error_stream)
+                if type(error_stream) is not OutputSink:
+                    error_stream.flush()
+
+        def drain(limit):
+            while len(pending) > limit:
+                if keep_order:
+                    emit(*pending.popleft())
+                    continue
+                done, _ = concurrent.futures.wait(
+                    [future for _, future in pending],
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for item in [item for item in pending if item[1] in done]:
+                    pending.remove(item)
+                    emit(*item)
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            for values in inputs:
+                argv = parallel_argv(command, values)
+                pending.append((values, pool.submit(self._parallel_job, argv)))
+                # Queue a couple of jobs per worker; more just holds memory
+                drain(workers * 2)
+            drain(0)
+        except ValueError as e:
+            print(f"parallel: {e}", file=self.stderr)
+            return 2
+        except KeyboardInterrupt:
+            print(file=self.stdout)
+            return 130
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return min(failed, 101)
+
+    def cmd_alias(self, args):
+        """Create or display aliases."""
+        if not args:
+            # Display all aliases
+            if not self.aliases:
+                print("No aliases defined", file=self.stdout)
+            else:
+                for name, value in sorted(self.aliases.items()):
+                    print(f"alias {name}='{value}'", file=self.stdout)
+        else:
+            # Parse alias definition
+            if '=' in args[0]:
+                # New alias format: alias name=value
+                parts = args[0].split('=', 1)
+                name = parts[0]
+                value = parts[1].strip("'\"")
+                self.aliases[name] = value
+                self._parse_cache.clear()
+                self.save_config()
+                print(f"Alias created: {name}='{value}'", file=self.stdout)
+            else:
+                # Display specific alias
+                name = args[0]
+                if name in self.aliases:
+                    print(f"alias {name}='{self.aliases[name]}'", file=self.stdout)
+                else:
+                    print(f"alias: {name}: not found", file=self.stderr)
+                    return 1
+        return 0
+    
+    def cmd_unalias(self, args):
+        """Remove an alias."""
+        if not args:
+            print("unalias: usage: unalias name", file=self.stderr)
+            return 2
+        else:
+            name = args[0]
+            if name in self.aliases:
+                del self.aliases[name]
+                self._parse_cache.clear()
+                self.save_config()
+                print(f"Alias removed: {name}", file=self.stdout)
+            else:
+                print(f"unalias: {name}: not found", file=self.stderr)
+                return 1
+    
+    def cmd_exit(self, args):
+        """Exit the shell with status N, or the last command's status."""
+        status = self.last_status
+        if args:
+            try:
+                status = int(args[0]) & 0xFF
+            except ValueError:
+                print(f"exit: {args[0]}: numeric argument required", file=self.stderr)
+                status = 2
+        if self.interactive:
+            print("Goodbye!")
+        self.running = False
+        return status
+
+    # Names set -o accepts, and the single-letter forms of some of them
+    SHELL_OPTION_NAMES = ('errexit', 'noglob', 'trace')
+    SHELL_OPTIONS = {'e': 'errexit', 'f': 'noglob'}
+
+    def cmd_set(self, args):
+        """Turn shell options on (-e, -f, -o NAME) or off (+e, +f, +o NAME)."""
+        names = set(self.SHELL_OPTION_NAMES)
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if len(arg) < 2 or arg[0] not in '-+':
+                print(f"set: {arg}: invalid option", file=self.stderr)
+                return 2
+            enable = arg[0] == '-'
+            if arg[1:] == 'o':
+                if i == len(args):
+                    # set -o / set +o alone list the options
+                    for name in sorted(names):
+                        if enable:
+                            state = 'on' if name in self.options else 'off'
+                            print(f"{name:<15}{state}", file=self.stdout)
+                        else:
+                            flag = '-o' if name in self.options else '+o'
+                            print(f"set {flag} {name}", file=self.stdout)
+                    continue
+                wanted = [args[i]]
+                i += 1
+            else:
+                wanted = [self.SHELL_OPTIONS.get(c, c) for c in arg[1:]]
+            for name in wanted:
+                if name not in names:
+                    print(f"set: {name}: invalid option name", file=self.stderr)
+                    return 2
+                if enable:
+                    self.options.add(name)
+                else:
+                    self.options.discard(name)
+        if not args:
+            for name in sorted(self.options):
+                print(f"set -o {name}", file=self.stdout)
+        return 0
+    
+    def cmd_help(self, args):
+        """Display help information."""
+        out = self.stdout
+        print("\nMini Shell - Available Commands:", file=out)
+        print("=" * 50, file=out)
+        print("Built-in Commands:", file=out)
+        print("  cd [dir]       - Change directory (default: home)", file=out)
+        print("  pwd            - Print working directory", file=out)
+        print("  ls [-lahSRt] [path] - List directory contents", file=out)
+        print("  echo [args]    - Print arguments", file=out)
+        print("  clear          - Clear the screen", file=out)
+        print("  history        - Show command history", file=out)
+        print("  history -c     - Clear command history", file=out)
+        print("  history -s/-z TEXT - Search history (substring/fuzzy)", file=out)
+        print("  alias          - Show all aliases", file=out)
+        print("  alias name=cmd - Create an alias", file=out)
+        print("  unalias name   - Remove an alias", file=out)
+        print("  set [-/+ef] [-/+o name] - Set or clear shell options", file=out)
+        print("  time [-p] cmd  - Report a command's time, memory and I/O", file=out)
+        print("  trace [--json] - Show timings recorded under set -o trace", file=out)
+        print("  jobs / wait / fg / bg / kill - Manage background jobs (cmd &)", file=out)
+        print("  parallel [-j N] cmd ::: args - Run cmd once per arg, N at a time", file=out)
+        print("  help           - Show this help message", file=out)
+        print("  exit [N]       - Exit the shell (with status N)", file=out)
+        print("\nFeatures:", file=out)
+        print("  • Reverse Search: Press Ctrl+R to search history", file=out)
+        print("  • Arrow Keys: Navigate through command history", file=out)
+        print("  • Tab Completion: commands, aliases and file paths", file=out)
+        print("  • External Commands: Run any system command", file=out)
+        print("  • Pipelines: cmd1 | cmd2 | ... (builtins and external commands)", file=out)
+        print("  • Background jobs: cmd & (see jobs, fg, wait)", file=out)
+        print("  • Redirection: cmd > file, >> file, < file, 2> file, 2>&1", file=out)
+        print("  • Globbing: *.py, src/**/*.py, file.{txt,md}", file=out)
+        print("=" * 50, file=out)
+    
+    def get_builtins(self):
+        """Return the table mapping builtin names to their handlers."""
+        if self._builtins is not None:
+            return self._builtins
+        self._builtins = {
+            'cd': self.cmd_cd,
+            'pwd': self.cmd_pwd,
+            'ls': self.cmd_ls,
+            'tree': self.cmd_tree,
+            'cat': self.cmd_cat,
+            'touch': self.cmd_touch,
+            'mkdir': self.cmd_mkdir,
+            'rm': self.cmd_rm,
+            'rmdir': self.cmd_rmdir,
+            'mv': self.cmd_mv,
+            'cp': self.cmd_cp,
+            'echo': self.cmd_echo,
+            'head': self.cmd_head,
+            'tail': self.cmd_tail,
+            'grep': self.cmd_grep,
+            'wc': self.cmd_wc,
+            'md5sum': self.cmd_md5sum,
+            'sha1sum': self.cmd_sha1sum,
+            'sha256sum': self.cmd_sha256sum,
+            'sha512sum': self.cmd_sha512sum,
+            'sort': self.cmd_sort,
+            'diff': self.cmd_diff,
+            'find': self.cmd_find,
+            'which': self.cmd_which,
+            'hash': self.cmd_hash,
+            'du': self.cmd_du,
+            'env': self.cmd_env,
+            'clear': self.cmd_clear,
+            'history': self.cmd_history,
+            'alias': self.cmd_alias,
+            'unalias': self.cmd_unalias,
+            'set': self.cmd_set,
+            'time': self.cmd_time,
+            'trace': self.cmd_trace,
+            'jobs': self.cmd_jobs,
+            'wait': self.cmd_wait,
+            'fg': self.cmd_fg,
+            'bg': self.cmd_bg,
+            'kill': self.cmd_kill,
+            'parallel': self.cmd_parallel,
+            'exit': self.cmd_exit,
+            'quit': self.cmd_exit,
+            'help': self.cmd_help,
+        }
+        return self._builtins
+
+    def execute_builtin(self, command, args):
+        """Execute built-in commands."""
+        builtins = self.get_builtins()
+        if command in builtins:
+            status = builtins[command](args)
+            self.last_status = status if isinstance(status, int) else 0
+            return True
+        return False
+    
+    def execute_external(self, command, args):
+        """Execute external system commands."""
+        executable = self.command_hash.lookup(command)
+        if executable is None:
+            print(f"{command}: command not found", file=self.stderr)
+            self.last_status = 127
+            return False
+        try:
+            # Combine command and args; argv[0] stays the name typed
+            full_command = [command] + args
+            
+            # Keep our buffered output ahead of the child's
+            sys.stdout.flush()
+            
+            # Run the command
+            try:
+                proc = subprocess.Popen(full_command, executable=executable)
+            except FileNotFoundError:
+                # The remembered binary has gone; search PATH again
+                if not self.command_hash.forget(command):
+                    raise
+                executable = self.command_hash.lookup(command)
+                if executable is None:
+                    raise
+                proc = subprocess.Popen(full_command, executable=executable)
+            with proc:
+                try:
+                    self._note_child(wait_process(proc))
+                except BaseException:
+                    proc.kill()
+                    raise
+            
+            self.last_status = exit_status(proc.returncode)
+            return proc.returncode == 0
+        except FileNotFoundError:
+            print(f"{command}: command not found", file=self.stderr)
+            self.last_status = 127
+            return False
+        except Exception as e:
+            print(f"Error executing command: {e}", file=self.stderr)
+            self.last_status = 126
+            return False
+    
+    def _run_stage(self, func, args, stdin, stdout, cancel=None, stderr=None):
+        """Run one builtin pipeline stage with its own stdin/stdout/stderr.
+
+        The streams are closed afterwards, which flushes buffered output.
+        Returns the builtin's exit status.
+        """
+        self._io.stdin = stdin
+        self._io.stdout = stdout
+        self._io.stderr = stderr
+        self._io.cancel = cancel
+        try:
+            status = func(args)
+            return status if isinstance(status, int) else 0
+        except PipelineClosed:
+            # Downstream stopped reading; nothing more to do
+            return 0
+        finally:
+            self._io.stdin = None
+            self._io.stdout = None
+            self._io.stderr = None
+            self._io.cancel = None
+            for stream in (stdout, stderr, stdin):
+                # stderr may be stdout itself after 2>&1
+                if stream is not None and not stream.closed and stream is not sys.stdout:
+                    try:
+                        stream.close()
+                    except OSError as e:
+                        print(f"mini-shell: write error: {e.strerror}", file=sys.stderr)
+
+    def _spawn_stage(self, argv, read_fd, write_fd, background=False, error_fd=None):
+        """Start an external pipeline stage on the given pipe ends or files.
+
+        Background stages get a session of their own, away from the
+        terminal's Ctrl+C. The descriptors are closed once the child has
+        its copies.
+        """
+        try:
+            executable = self.command_hash.lookup(argv[0])
+            if executable is None:
+                raise FileNotFoundError(argv[0])
+            options = dict(stdin=read_fd, stdout=write_fd, stderr=error_fd,
+                           start_new_session=background)
+            try:
+                return subprocess.Popen(argv, executable=executable, **options)
+            except FileNotFoundError:
+                if not self.command_hash.forget(argv[0]):
+                    raise
+                executable = self.command_hash.lookup(argv[0])
+                if executable is None:
+                    raise
+                return subprocess.Popen(argv, executable=executable, **options)
+        except FileNotFoundError:
+            self._stage_error(f"{argv[0]}: command not found", error_fd)
+        except Exception as e:
+            self._stage_error(f"Error executing command: {e}", error_fd)
+        finally:
+            # The child holds its own copies now
+            for fd in (read_fd, write_fd, error_fd):
+                if fd is not None:
+                    os.close(fd)
+        return None
+
+    def _stage_error(self, message, error_fd=None):
+        """Report a stage that failed to start, on its own stderr if redirected."""
+        if error_fd is None:
+            print(message, file=self.stderr)
+        else:
+            os.write(error_fd, os.fsencode(message + '\n'))
+
+    def _open_redirects(self, redirects, read_fd, write_fd):
+        """Apply a stage's redirections to its stdin/stdout descriptors.
+
+        Returns (read_fd, write_fd, error_fd, error_is_output): None means
+        the shell's own descriptor. Pipe ends that a redirection replaces
+        are closed, so the neighbouring stage sees EOF or EPIPE. Raises
+        OSError (after closing everything) if a file can't be opened.
+        """
+        fds = {0: read_fd, 1: write_fd, 2: None}
+        # '2>&1' shares stdout, so a builtin's messages stay in order with it
+        error_is_output = False
+        try:
+            for op, target in redirects:
+                if op == '2>&1':
+                    fd, new = 2, os.dup(fds[1] if fds[1] is not None else 1)
+                    error_is_output = True
+                elif op == '>&2':
+                    fd, new = 1, os.dup(fds[2] if fds[2] is not None else 2)
+                else:
+                    fd = 0 if op == '<' else 2 if op.startswith('2') else 1
+                    if op == '<':
+                        flags = os.O_RDONLY
+                    elif op.endswith('>>'):
+                        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+                    else:
+                        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                    try:
+                        new = os.open(target, flags | os.O_CLOEXEC, 0o666)
+                    except OSError as e:
+                        e.filename = target
+                        raise
+                    if fd == 2:
+                        error_is_output = False
+                if fds[fd] is not None:
+                    os.close(fds[fd])
+                fds[fd] = new
+        except OSError:
+            for fd in fds.values():
+                if fd is not None:
+                    os.close(fd)
+            raise
+        return fds[0], fds[1], fds[2], error_is_output
+
+    def execute_pipeline(self, stages):
+        """Run a pipeline of builtins and external commands.
+
+        Stages are joined with OS pipes: external commands are connected
+        fd-to-fd, and builtins run in worker threads reading and writing
+        the pipe ends through self.stdin/self.stdout. Data therefore flows
+        through in bounded memory, and a stage that exits early (head)
+        stops its producers through EPIPE/SIGPIPE. The last stage runs in
+        the calling thread.
+        """
+        # Like sh, a pipeline's status is that of its last stage
+        self.last_status = self._run_pipeline(stages)
+        return self.last_status == 0
+
+    def _run_pipeline(self, stages, job=None):
+        """Run the stages of a pipeline and return the last one's status.
+
+        With a job, the pipeline is running in the background: its input
+        is /dev/null, external stages are recorded in job.procs and every
+        builtin stage watches job.cancel.
+        """
+        builtins = self.get_builtins()
+        threads = []
+        procs = []
+        # Set once the last stage is done, so idle producers such as
+        # tail -f notice that nobody is reading any more
+        cancel = job.cancel if job is not None else threading.Event()
+        read_fd = None
+        if job is not None:
+            read_fd = os.open(os.devnull, os.O_RDONLY | os.O_CLOEXEC)
+        status = 0
+        sys.stdout.flush()
+        try:
+            for i, argv in enumerate(stages):
+                last = i == len(stages) - 1
+                next_read_fd = write_fd = None
+                if not last:
+                    next_read_fd, write_fd = os.pipe()
+                command, args = argv[0], argv[1:]
+                error_fd, error_is_output, sink = None, False, False
+                if isinstance(argv, Argv):
+                    try:
+                        read_fd, write_fd, error_fd, error_is_output = self._open_redirects(
+                            argv.redirects, read_fd, write_fd)
+                    except OSError as e:
+                        print(f"mini-shell: {e.filename}: {e.strerror}", file=sys.stderr)
+                        read_fd = next_read_fd
+                        if last:
+                            status = 1
+                        continue
+                    # Anything but the pipe to the next stage is a file
+                    sink = any(op in ('>', '>>', '>&2') for op, _ in argv.redirects)
+                if command in builtins:
+                    stdin = stdout = stderr = None
+                    if read_fd is not None:
+                        stdin = open(read_fd, 'r', errors='surrogateescape', newline='\n')
+                    if write_fd is not None:
+                        if sink:
+                            stdout = OutputSink(write_fd)
+                        else:
+                            stdout = PipeWriter(open(write_fd, 'wb'), errors='surrogateescape')
+                    if error_is_output:
+                        os.close(error_fd)
+                        stderr = stdout or sys.stdout
+                    elif error_fd is not None:
+                        stderr = OutputSink(error_fd)
+                    stage_cancel = cancel if job is not None or not last else None
+                    if last:
+                        if job is not None:
+                            job.started.set()
+                        status = self._run_stage(builtins[command], args, stdin, stdout,
+                                                 stage_cancel, stderr)
+                    else:
+                        t = threading.Thread(target=self._run_stage,
+                                             args=(builtins[command], args, stdin, stdout,
+                                                   stage_cancel, stderr),
+                                             daemon=True)
+                        t.start()
+                        threads.append(t)
+                else:
+                    proc = self._spawn_stage(argv, read_fd, write_fd, background=job is not None,
+                                             error_fd=error_fd)
+                    if proc is not None:
+                        procs.append(proc)
+                        if job is not None:
+                            job.procs.append(proc)
+                    if last:
+                        if job is not None:
+                            job.started.set()
+                        status = 127
+                        if proc is not None:
+                            self._note_child(wait_process(proc))
+                            status = exit_status(proc.returncode)
+                read_fd = next_read_fd
+        finally:
+            if job is not None:
+                job.started.set()
+            cancel.set()
+            for p in procs:
+                self._note_child(wait_process(p))
+            for t in threads:
+                t.join()
+        return status
+
+    def execute_command(self, command_line):
+        """Parse and execute a command."""
+        if not command_line.strip():
+            return
+        
+        # Parse command with alias expansion
+        try:
+            jobs = self.parse_line(command_line)
+        except ValueError as e:
+            print(f"mini-shell: {e}", file=self.stderr)
+            self.last_status = 2
+            return
+        expander = GlobExpander()
+        for stages, background in jobs:
+            try:
+                stages = self.expand_stages(stages, expander)
+            except ValueError as e:
+                print(f"mini-shell: {e}", file=self.stderr)
+                self.last_status = 1
+                continue
+            if background:
+                self.start_job(stages)
+            elif stages[0][0] == 'time' and len(stages) > 1:
+                # time measures the whole pipeline it starts
+                posix = stages[0][1:2] == ['-p']
+                first = stages[0][2 if posix else 1:]
+                if isinstance(stages[0], Argv):
+                    first = stages[0].with_words(first)
+                if not first:
+                    print("mini-shell: syntax error: missing command after `time'",
+                          file=self.stderr)
+                    self.last_status = 2
+                    continue
+                self.run_measured([first] + stages[1:], report='posix' if posix else 'default')
+            elif 'trace' in self.options:
+                self.run_measured(stages)
+            else:
+                self.run_foreground(stages)
+
+    def expand_stages(self, stages, expander):
+        """Replace the GlobWords in stages by their brace/filename expansions.
+
+        Returns stages itself when there is nothing to expand (parse_line
+        gives those stages as GlobStages); otherwise new lists, since the
+        parsed stages are shared with the parse cache. With set -f
+        (noglob) only braces are expanded.
+        """
+        if type(stages) is not GlobStages:
+            return stages
+        glob = 'noglob' not in self.options
+        expanded = []
+        for argv in stages:
+            words = []
+            for word in argv:
+                if type(word) is GlobWord:
+                    words.extend(expander.expand_word(word, glob))
+                else:
+                    words.append(word)
+            if isinstance(argv, Argv):
+                words = argv.with_words(words)
+                for i, (op, target) in enumerate(words.redirects):
+                    if type(target) is GlobWord:
+                        targets = expander.expand_word(target, glob)
+                        # Like sh, a pattern must name exactly one file
+                        if len(targets) != 1:
+                            raise ValueError(f"{target}: ambiguous redirect")
+                        words.redirects[i] = (op, targets[0])
+            expanded.append(words)
+        return expanded
+
+    def run_foreground(self, stages):
+        """Run one pipeline (or a single command) and wait for it."""
+        if len(stages) > 1 or isinstance(stages[0], Argv):
+            # Redirections are set up by the pipeline machinery
+            self.execute_pipeline(stages)
+            return
+        parts = stages[0]
+        
+        command = parts[0]
+        args = parts[1:]
+        
+        # Try to execute as built-in
+        if self.execute_builtin(command, args):
+            return
+        
+        # Try to execute as external command
+        self.execute_external(command, args)
+
+    def _note_child(self, usage):
+        """Pass a reaped child's rusage to the command being measured."""
+        meter = getattr(self._io, 'meter', None)
+        if meter is not None:
+            meter.add_child(usage)
+
+    def run_measured(self, stages, report=None):
+        """Run a foreground pipeline under a CommandMeter; returns its cost.
+
+        With tracing on, the cost is added to the trace under the
+        pipeline's command names; with report ('default' or 'posix') it is
+        written to stderr the way time does.
+        """
+        builtins = self.get_builtins()
+        outer = getattr(self._io, 'meter', None)
+        meter = CommandMeter(builtins=any(argv[0] in builtins for argv in stages),
+                             reset_peak=report is not None)
+        self._io.meter = meter
+        try:
+            self.run_foreground(stages)
+        finally:
+            self._io.meter = outer
+            usage = meter.stop()
+            if outer is not None:
+                # time inside a traced command: the outer meter sees it all
+                outer.child_maxrss = max(outer.child_maxrss, usage.maxrss)
+        if outer is None and 'trace' in self.options:
+            names = [argv[0] for argv in stages]
+            first = stages[0]
+            if first[0] == 'time':
+                # Record time cmd under cmd
+                timed = first[2:] if first[1:2] == ['-p'] else first[1:]
+                names[0] = timed[0] if timed else 'time'
+            name = ' | '.join(names)
+            stats = self.trace.get(name)
+            if stats is None:
+                stats = self.trace[name] = CommandStats()
+            stats.add(usage, self.last_status)
+        if report:
+            sys.stdout.flush()
+            sys.stderr.write(usage.format(posix=report == 'posix'))
+            sys.stderr.flush()
+        return usage
+
+    def start_job(self, stages):
+        """Start a pipeline in the background and add it to the job table."""
+        command = ' | '.join(format_stage(argv) for argv in stages)
+        job = self.job_table.add(command)
+
+        def run():
+            try:
+                job.status = self._run_pipeline(stages, job)
+            except Exception as e:
+                print(f"Error: {e}", file=self.stderr)
+                job.status = 1
+            finally:
+                job.started.set()
+                job.finished.set()
+
+        threading.Thread(target=run, daemon=True).start()
+        job.started.wait()
+        if self.interactive:
+            print(f"[{job.number}] {job.pid}" if job.pid else f"[{job.number}]")
+        self.last_status = 0
+        return job
+
+    def report_jobs(self):
+        """Print a line for each background job that has finished."""
+        for line in self.job_table.reap():
+            print(line)
+    
+    def run(self):
+        """Main shell loop."""
+        print("\n" + "=" * 50)
+        print("Welcome to Mini Shell!")
+        print("Type 'help' for available commands")
+        print("Press Ctrl+R for reverse search")
+        print("Press Ctrl+C to cancel, Ctrl+D to exit")
+        print("=" * 50 + "\n")
+        self.start_interactive()
+        
+        while self.running:
+            entry = None
+            try:
+                self.report_jobs()
+                # Get input with custom prompt
+                command = input(self.get_prompt())
+                
+                # Add to history
+                entry = self.add_to_history(command)
+                
+                # Execute command
+                started = time.time()
+                self.execute_command(command)
+                self.finish_history(entry, started)
+                if self.last_status and 'errexit' in self.options:
+                    self.running = False
+                
+            except KeyboardInterrupt:
+                # Ctrl+C pressed
+                if entry is not None:
+                    self.last_status = 130
+                    self.finish_history(entry, started)
+                print("\n(Use 'exit' or Ctrl+D to quit)")
+            except EOFError:
+                # Ctrl+D pressed
+                print("\nGoodbye!")
+                break
+            except Exception as e:
+                print(f"Error: {e}", file=self.stderr)
+        
+        # Save history before exiting
+        self.save_history()
+
+    def script_commands(self, lines):
+        """Yield the commands in a script, one per logical line.
+
+        Blank lines and lines starting with '#' (including a #! line) are
+        skipped, and a trailing backslash continues a command on the
+        next line. lines may be a file, which is then read as it runs.
+        """
+        pending = ''
+        for line in lines:
+            line = line.rstrip('\n')
+            if (len(line) - len(line.rstrip('\\'))) % 2:
+                pending += line[:-1]
+                continue
+            line = pending + line
+            pending = ''
+            stripped = line.lstrip()
+            if stripped and not stripped.startswith('#'):
+                yield line
+        if pending.strip():
+            yield pending
+
+    def run_script(self, lines):
+        """Run commands without prompting; returns the final exit status.
+
+        Stops at exit, at the first failing command under set -e, or when
+        whatever reads our output goes away.
+        """
+        try:
+            for command in self.script_commands(lines):
+                try:
+                    self.execute_command(command)
+                except (BrokenPipeError, PipelineClosed):
+                    raise
+                except Exception as e:
+                    print(f"Error: {e}", file=self.stderr)
+                    self.last_status = 1
+                if not self.running or (self.last_status and 'errexit' in self.options):
+                    break
+            # A script's background jobs finish before it exits
+            for job in self.job_table:
+                job.finished.wait()
+            sys.stdout.flush()
+        except KeyboardInterrupt:
+            self.last_status = 130
+        except (BrokenPipeError, PipelineClosed):
+            # Like a shell killed by SIGPIPE; drop what is still buffered
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            self.last_status = 128 + 13
+        finally:
+            self.save_history()
+        return self.last_status
+
+
+def serve(path):
+    """Run a shell server on the Unix socket path until interrupted.
+
+    The server imports what commands need and builds a MiniShell once,
+    then forks a child per connection. The child starts warm, and since
+    it is a process of its own, each session has its own cwd,
+    environment, aliases and options and sessions run concurrently.
+    Alias changes reach later sessions through the config file, which is
+    re-read when it changes. Only the server's own user may connect.
+    """
+    shell = MiniShell(interactive=False)
+    shell.get_builtins()
+    shell.aliases
+    # Import what nearly every session needs, so no child pays for it
+    for module in (subprocess, json, re, shlex, signal, threading, resource):
+        module.__name__
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            # Left behind by a server that is gone
+            if os.path.exists(path):
+                os.unlink(path)
+        else:
+            print(f"mini-shell: a server is already listening on {path}", file=sys.stderr)
+            return 1
+        finally:
+            probe.close()
+        umask = os.umask(0o177)
+        try:
+            sock.bind(path)
+        finally:
+            os.umask(umask)
+        sock.listen(128)
+    except OSError as e:
+        print(f"mini-shell: {path}: {e.strerror}", file=sys.stderr)
+        sock.close()
+        return 1
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    # Finished sessions are reaped by the kernel
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f"mini-shell: serving on {path}", file=sys.stderr)
+
+    config_mtime = None
+    try:
+        while True:
+            conn, _ = sock.accept()
+            if hasattr(socket, 'SO_PEERCRED'):
+                cred = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, 12)
+                if int.from_bytes(cred[4:8], sys.byteorder) != os.getuid():
+                    conn.close()
+                    continue
+            try:
+                mtime = os.stat(shell.config_file).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != config_mtime:
+                shell.load_config()
+                config_mtime = mtime
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    sock.close()
+                    status = serve_session(shell, conn)
+                finally:
+                    os._exit(status)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return 0
+
+
+def serve_session(shell, conn):
+    """Run one client's request in a forked server child; returns its status.
+
+    The child's stdout and stderr become pipes whose contents relay
+    threads send to the client as they arrive. A closed connection
+    terminates the session's process group.
+    """
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    os.setpgid(0, 0)
+    header, fds, _, _ = socket.recv_fds(conn, mini_shell_client.FRAME_HEADER, 1)
+    frame = mini_shell_client.recv_frame(conn, header)
+    if frame is None or frame[0] != b'r':
+        return 2
+    command, cwd, environ = mini_shell_client.decode_request(frame[1])
+
+    stdin_fd = fds[0] if fds else os.open(os.devnull, os.O_RDONLY)
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    for fd, target in ((stdin_fd, 0), (out_w, 1), (err_w, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, 'r', errors='surrogateescape', closefd=False)
+    sys.stdout = open(1, 'w', errors='surrogateescape', closefd=False)
+    sys.stderr = open(2, 'w', errors='backslashreplace', closefd=False)
+
+    send_lock = threading.Lock()
+
+    def relay(fd, kind):
+        while True:
+            data = os.read(fd, 1 << 16)
+            if not data:
+                break
+            with send_lock:
+                mini_shell_client.send_frame(conn, kind, data)
+
+    def control():
+        while True:
+            frame = mini_shell_client.recv_frame(conn)
+            if frame is None:
+                # The client has gone; take the session's commands with it
+                os.killpg(0, signal.SIGTERM)
+                return
+            if frame[0] == b'i':
+                os.kill(os.getpid(), signal.SIGINT)
+
+    relays = [threading.Thread(target=relay, args=(out_r, b'1'), daemon=True),
+              threading.Thread(target=relay, args=(err_r, b'2'), daemon=True)]
+    for t in relays + [threading.Thread(target=control, daemon=True)]:
+        t.start()
+
+    try:
+        os.chdir(cwd)
+    except OSError as e:
+        print(f"mini-shell: {cwd}: {e.strerror}", file=sys.stderr)
+        status = 1
+    else:
+        os.environb.clear()
+        os.environb.update(environ)
+        shell.current_dir = os.getcwd()
+        status = shell.run_script(command.splitlines())
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # Close our ends so the relays see end of file once children are done
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    for t in relays:
+        t.join()
+    with send_lock:
+        mini_shell_client.send_frame(conn, b'x', str(status).encode())
+    conn.close()
+    return status
+
+
+def interpreter_startup(started):
+    """Seconds from process start to the perf_counter() time started, or None.
+
+    Read from the process start time in /proc, so it has the kernel's
+    clock tick resolution (usually 10ms).
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            ticks = int(f.read().rpartition(')')[2].split()[19])
+        uptime = time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (OSError, ValueError, AttributeError):
+        return None
+    age = uptime - ticks / os.sysconf('SC_CLK_TCK')
+    return max(age - (time.perf_counter() - started), 0.0)
+
+
+def profile_startup(started):
+    """Print a per-phase timing breakdown of startup (--profile-startup).
+
+    started is the perf_counter() time just before this module was
+    imported, so the import row includes loading its bytecode, or
+    compiling it when the cache is missing or stale. The phases after it
+    are the ones run() goes through before the first prompt, followed by
+    the work it defers until the prompt is showing.
+    """
+    python = interpreter_startup(started)
+    imported = time.perf_counter() - started
+    cached = __spec__ is not None and __spec__.cached
+    try:
+        # A bytecode file written during this import means it was compiled
+        reused = cached and os.stat(cached).st_mtime < time.time() - imported
+    except OSError:
+        reused = False
+    rows = [(f"import {__name__}", imported)]
+
+    def timed(name, func):
+        start = time.perf_counter()
+        result = func()
+        rows.append((name, time.perf_counter() - start))
+        return result
+
+    shell = timed('MiniShell()', MiniShell)
+    timed('open history', shell.load_history)
+    timed('readline history', shell.load_readline_history)
+    timed('render prompt', shell.get_prompt)
+    before = len(rows)
+    total = sum(t for _, t in rows)
+    timed('load config', shell.load_config)
+    timed('index PATH commands', shell._commands_for_completion)
+    lines = ['startup phase                 ms']
+    if python is not None:
+        lines.append(f"  {'python startup (±10ms)':<24}{python * 1000:8.2f}")
+    lines += [f"  {name:<24}{t * 1000:8.2f}" for name, t in rows[:before]]
+    lines.append(f"  {'time to first prompt':<24}{total * 1000:8.2f}")
+    lines.append('after the first prompt')
+    lines += [f"  {name:<24}{t * 1000:8.2f}" for name, t in rows[before:]]
+    lines.append(f"modules loaded: {len(sys.modules)}")
+    if not cached:
+        lines.append('bytecode: not cached (run as a script)')
+    elif reused:
+        lines.append('bytecode: cached')
+    elif sys.dont_write_bytecode:
+        lines.append('bytecode: compiled, not cached (PYTHONDONTWRITEBYTECODE is set)')
+    else:
+        lines.append('bytecode: compiled this run')
+    print('\n'.join(lines), file=sys.stderr)
+
+
+def main(started=None):
+    """Main entry point; started is when the launcher began importing us.
+
+    With -c COMMANDS, a script path ('-' for stdin) or a non-terminal
+    stdin the shell runs in batch mode and exits with the status of the
+    last command; otherwise it starts an interactive session.
+    """
+    args = sys.argv[1:]
+    if '--profile-startup' in args:
+        profile_startup(_STARTED if started is None else started)
+        return
+    if args and args[0].startswith('--server'):
+        sys.exit(serve(args[0].partition('=')[2] or mini_shell_client.default_socket_path()))
+    if args and args[0].startswith('--client'):
+        mini_shell_client.main()
+    # --trace[=FILE] records every command and dumps the trace at exit
+    trace = None
+    while args and args[0].startswith('--trace'):
+        trace = args[0].partition('=')[2] or '-'
+        args = args[1:]
+    if args and args[0] == '-c':
+        if len(args) < 2:
+            print("mini-shell: -c: option requires an argument", file=sys.stderr)
+            sys.exit(2)
+        shell = MiniShell(interactive=False)
+        script = args[1].splitlines()
+    elif args and args[0] != '-':
+        shell = MiniShell(interactive=False)
+        try:
+            script = open(args[0], 'r', errors='surrogateescape')
+        except OSError as e:
+            print(f"mini-shell: {args[0]}: {e.strerror}", file=sys.stderr)
+            sys.exit(127)
+    elif args or not sys.stdin.isatty():
+        shell = MiniShell(interactive=False)
+        script = sys.stdin
+    else:
+        shell = MiniShell()
+        script = None
+    if trace is not None:
+        shell.options.add('trace')
+    if script is None:
+        shell.run()
+    else:
+        shell.run_script(script)
+        if script is not sys.stdin and hasattr(script, 'close'):
+            script.close()
+    if trace == '-':
+        sys.stderr.write(shell.trace_json() + '\n')
+    elif trace is not None:
+        try:
+            with open(trace, 'w') as f:
+                f.write(shell.trace_json() + '\n')
+        except OSError as e:
+            print(f"mini-shell: {trace}: {e.strerror}", file=sys.stderr)
+    sys.exit(shell.last_status)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,15 @@ echo ""
 echo "Checking Python version..."
 if ! command -v python3 &> /dev/null; then
     echo "❌ Python 3 is not installed!"
-    echo "Please install Python 3.6 or higher"
+    echo "Please install Python 3.9 or higher"
     exit 1
 fi
 
 PYTHON_VERSION=$(python3 --version 2>&1 | awk '{print $2}')
+if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 9))'; then
+    echo "❌ Found Python $PYTHON_VERSION, but Mini Shell needs 3.9 or higher"
+    exit 1
+fi
 echo "✅ Found Python $PYTHON_VERSION"
 echo ""
 
@@ -0,0 +1,28 @@
+"""Shared fixtures for the Mini Shell tests."""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LAUNCHER = os.path.join(ROOT, 'mini_shell.py')
+
+
+@pytest.fixture
+def run_shell(tmp_path, monkeypatch):
+    """Run mini_shell.py -c COMMANDS in tmp_path; returns the CompletedProcess.
+
+    HOME points into tmp_path so the config, history and checksum cache
+    of the user running the tests are left alone.
+    """
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    def run(commands, stdin=None, **kwargs):
+        return subprocess.run([sys.executable, LAUNCHER, '-c', commands], cwd=tmp_path,
+                              input=stdin, capture_output=True, text=True, timeout=60,
+                              **kwargs)
+    return run
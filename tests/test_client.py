@@ -0,0 +1,57 @@
+"""The server protocol's request payload and frames."""
+
+import socket
+import threading
+
+import mini_shell_client as client
+
+
+def test_request_round_trip():
+    environ = {b'HOME': b'/home/me', b'EMPTY': b'', b'EQ': b'a=b', b'RAW': b'\xff\xfe'}
+    payload = client.encode_request("echo 'a b' | wc", '/tmp/dir', environ)
+    assert client.decode_request(payload) == ("echo 'a b' | wc", '/tmp/dir', environ)
+
+
+def test_request_with_non_utf8_path():
+    cwd = b'/tmp/caf\xe9'.decode('utf-8', 'surrogateescape')
+    command, decoded, environ = client.decode_request(client.encode_request('ls', cwd, {}))
+    assert (command, decoded, environ) == ('ls', cwd, {})
+
+
+def test_frames_round_trip():
+    a, b = socket.socketpair()
+    with a, b:
+        big = bytes(range(256)) * 8192
+        # Larger than the socket buffer, so send while the other end reads
+        sender = threading.Thread(target=lambda: [
+            client.send_frame(a, b'1', b'hello'),
+            client.send_frame(a, b'2'),
+            client.send_frame(a, b'1', big),
+            client.send_frame(a, b'x', b'141')])
+        sender.start()
+        frames = [client.recv_frame(b) for _ in range(4)]
+        sender.join()
+        assert frames == [(b'1', b'hello'), (b'2', b''), (b'1', big), (b'x', b'141')]
+        a.shutdown(socket.SHUT_WR)
+        assert client.recv_frame(b) is None
+
+
+def test_truncated_frame_is_end_of_stream():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(b'1' + (10).to_bytes(4, 'big') + b'short')
+        a.shutdown(socket.SHUT_WR)
+        assert client.recv_frame(b) is None
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(b'1\0\0')
+        a.shutdown(socket.SHUT_WR)
+        assert client.recv_frame(b) is None
+
+
+def test_header_already_read():
+    a, b = socket.socketpair()
+    with a, b:
+        client.send_frame(a, b'r', b'payload')
+        header = b.recv(2)
+        assert client.recv_frame(b, header) == (b'r', b'payload')
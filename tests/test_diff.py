@@ -0,0 +1,59 @@
+"""diff output is a unified diff that patch applies."""
+
+import random
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('patch') is None, reason="needs patch")
+
+
+def edited(lines, rng, edits):
+    lines = list(lines)
+    for _ in range(edits):
+        i = rng.randrange(len(lines) + 1)
+        choice = rng.random()
+        if choice < 0.4 and i < len(lines):
+            del lines[i:i + rng.randint(1, 5)]
+        elif choice < 0.7 and i < len(lines):
+            lines[i] = f"changed {rng.random()}\n"
+        else:
+            lines[i:i] = [f"new {rng.random()}\n" for _ in range(rng.randint(1, 5))]
+    return lines
+
+
+def check_patch(tmp_path, run_shell, old, new, options=''):
+    (tmp_path / 'old.txt').write_text(old)
+    (tmp_path / 'new.txt').write_text(new)
+    result = run_shell(f"diff {options} old.txt new.txt > changes.diff")
+    assert result.returncode == (0 if old == new else 1), result.stderr
+    subprocess.run(['patch', '-s', 'old.txt', 'changes.diff'], cwd=tmp_path, check=True)
+    assert (tmp_path / 'old.txt').read_text() == new
+
+
+@pytest.mark.parametrize('old, new', [
+    ('a\nb\nc\n', 'a\nB\nc\n'),
+    ('', 'a\nb\n'),
+    ('a\nb\n', ''),
+    ('a\nb', 'a\nc'),
+    ('a\nb\n', 'a\nb'),
+    ('same\n', 'same\n'),
+])
+def test_small_edits(tmp_path, run_shell, old, new):
+    check_patch(tmp_path, run_shell, old, new)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_random_edits(tmp_path, run_shell, seed):
+    rng = random.Random(seed)
+    old = [f"line {rng.randrange(50)}\n" for _ in range(2000)]
+    new = edited(old, rng, 40)
+    check_patch(tmp_path, run_shell, ''.join(old), ''.join(new))
+
+
+def test_context_option(tmp_path, run_shell):
+    old = ''.join(f"{i}\n" for i in range(100))
+    new = old.replace('50\n', 'fifty\n').replace('52\n', '')
+    check_patch(tmp_path, run_shell, old, new, '-U 0')
+    check_patch(tmp_path, run_shell, old, new, '-U 10')
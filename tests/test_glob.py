@@ -0,0 +1,57 @@
+"""Brace and filename expansion."""
+
+import pytest
+
+import mini_shell_core as ms
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for path in ['a.py', 'b.py', 'c.txt', '.hidden.py', 'src/x.py', 'src/deep/y.py',
+                 'src/.cache/z.py', '.git/config']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text('')
+    monkeypatch.chdir(tmp_path)
+
+
+def expand(word):
+    token, = ms.split_command_line(word)
+    if type(token) is not ms.GlobWord:
+        return [token]
+    return ms.GlobExpander().expand_word(token)
+
+
+def test_star_skips_hidden_files(tree):
+    assert expand('*.py') == ['a.py', 'b.py']
+    assert expand('.*.py') == ['.hidden.py']
+    assert expand('*') == ['a.py', 'b.py', 'c.txt', 'src']
+
+
+def test_character_classes_and_directories(tree):
+    assert expand('[ab].py') == ['a.py', 'b.py']
+    assert expand('[!a].py') == ['b.py']
+    assert expand('?.txt') == ['c.txt']
+    assert expand('*/') == ['src/']
+    assert expand('src/*/*.py') == ['src/deep/y.py']
+
+
+def test_double_star(tree):
+    # Like bash's globstar, '**' skips hidden directories
+    assert expand('**/*.py') == ['a.py', 'b.py', 'src/deep/y.py', 'src/x.py']
+    assert expand('src/**') == ['src/deep', 'src/deep/y.py', 'src/x.py']
+
+
+def test_braces(tree):
+    assert expand('{a,c}.*') == ['a.py', 'c.txt']
+    assert expand('{b,a}.py') == ['b.py', 'a.py']
+    assert expand('f{1..3}') == ['f1', 'f2', 'f3']
+    assert expand('x{a,b{c,d}}') == ['xa', 'xbc', 'xbd']
+    # No comma or range: left alone, as parallel's {} needs
+    assert expand('{}') == ['{}']
+
+
+def test_no_match_is_kept_literally(tree):
+    assert expand('*.rs') == ['*.rs']
+    assert expand('"*".py') == ['*.py']
+    assert expand('nothing/[x]') == ['nothing/[x]']
+    assert expand('\\*.py') == ['*.py']
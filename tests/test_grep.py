@@ -0,0 +1,39 @@
+"""grep output format and exit statuses."""
+
+
+def write_files(tmp_path):
+    (tmp_path / 'a.txt').write_text('one foo\ntwo\nthree foo\n')
+    (tmp_path / 'b.txt').write_text('foo\n')
+    (tmp_path / 'c.txt').write_text('none\n')
+
+
+def test_single_file_has_no_name_prefix(tmp_path, run_shell):
+    write_files(tmp_path)
+    assert run_shell('grep foo a.txt').stdout == 'one foo\nthree foo\n'
+    assert run_shell('grep -c foo a.txt').stdout == '2\n'
+
+
+def test_several_files_are_prefixed(tmp_path, run_shell):
+    write_files(tmp_path)
+    assert run_shell('grep foo a.txt b.txt').stdout == 'a.txt:one foo\na.txt:three foo\nb.txt:foo\n'
+    assert run_shell('grep -c foo a.txt c.txt').stdout == 'a.txt:2\nc.txt:0\n'
+
+
+def test_recursive_prefixes_names(tmp_path, run_shell):
+    (tmp_path / 'd').mkdir()
+    (tmp_path / 'd' / 'x.txt').write_text('foo\n')
+    assert run_shell('grep -r foo d').stdout == 'd/x.txt:foo\n'
+
+
+def test_exit_status(tmp_path, run_shell):
+    write_files(tmp_path)
+    assert run_shell('grep foo a.txt').returncode == 0
+    assert run_shell('grep nothing a.txt').returncode == 1
+    assert run_shell('grep foo missing.txt').returncode == 2
+
+
+def test_line_numbers(tmp_path, run_shell):
+    write_files(tmp_path)
+    assert run_shell('grep -n foo a.txt').stdout == '1:one foo\n3:three foo\n'
+    assert run_shell('grep -n foo a.txt b.txt').stdout == 'a.txt:1:one foo\na.txt:3:three foo\nb.txt:1:foo\n'
+    assert run_shell('cat a.txt | grep -n three').stdout == '3:three foo\n'
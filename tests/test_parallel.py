@@ -0,0 +1,31 @@
+"""Process pools started from pipeline and job threads."""
+
+import threading
+import functools
+
+import mini_shell_core as ms
+
+
+def test_process_pool_from_a_thread(tmp_path):
+    files = []
+    for i in range(4):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text('foo\n' * (i + 1))
+        files.append(str(path))
+    search = functools.partial(ms.grep_file, pattern=b'foo', mode='count', show_names=False)
+    results = {}
+
+    def work():
+        pool = ms.process_pool(2)
+        try:
+            results['method'] = pool._mp_context.get_start_method()
+            results['counts'] = [output for output, _, _ in pool.map(search, files)]
+        finally:
+            pool.shutdown()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join(60)
+    # Never forked from a process with other threads running
+    assert results['method'] == 'forkserver'
+    assert results['counts'] == [b'1\n', b'2\n', b'3\n', b'4\n']
@@ -0,0 +1,72 @@
+"""Tokenizing command lines and parsing pipelines with redirections."""
+
+import pytest
+
+import mini_shell_core as ms
+
+
+def test_words_and_quotes():
+    assert ms.split_command_line('echo  hello   world') == ['echo', 'hello', 'world']
+    assert ms.split_command_line('''echo 'a b' "c d" e\\ f''') == ['echo', 'a b', 'c d', 'e f']
+    assert ms.split_command_line('echo "say \\"hi\\"" \'\\n\'') == ['echo', 'say "hi"', '\\n']
+
+
+def test_quoted_operators_are_words():
+    tokens = ms.split_command_line("grep '|' a | wc -l")
+    assert tokens == ['grep', '|', 'a', '|', 'wc', '-l']
+    assert [type(t) is ms.Operator for t in tokens] == [False, False, False, True, False, False]
+
+
+def test_redirect_operators():
+    assert ms.split_command_line('cmd >out 2>>err <in') == ['cmd', '>', 'out', '2>>', 'err', '<', 'in']
+    assert ms.split_command_line('cmd 2>&1 >&2') == ['cmd', '2>&1', '>&2']
+    # Only a lone unquoted 1 or 2 names a descriptor
+    assert ms.split_command_line('echo x2>f') == ['echo', 'x2', '>', 'f']
+    assert ms.split_command_line("echo '2'>f") == ['echo', '2', '>', 'f']
+    # Redirecting a descriptor to itself is dropped
+    assert ms.split_command_line('cmd 1>&1') == ['cmd']
+
+
+def test_glob_words_keep_quoted_characters_literal():
+    word, quoted = ms.split_command_line('ls *.py "*.txt"')[1:]
+    assert type(word) is ms.GlobWord and word.pattern == '*.py'
+    assert type(quoted) is str and quoted == '*.txt'
+    mixed = ms.split_command_line('ls "a*"*')[1]
+    assert mixed == 'a**' and mixed.pattern == 'a\\**'
+
+
+@pytest.mark.parametrize('line', ["echo 'open", 'echo "open', 'echo "a\\"'])
+def test_unterminated_quotes(line):
+    with pytest.raises(ValueError):
+        ms.split_command_line(line)
+
+
+@pytest.fixture
+def shell(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    shell = ms.MiniShell(interactive=False)
+    shell.aliases = {'ll': 'ls -l', 'count': 'sort | uniq -c'}
+    return shell
+
+
+def test_pipeline_stages_and_redirects(shell):
+    (stages, background), = shell.parse_line('cat < in.txt | sort -n 2>&1 > out.txt')
+    assert not background
+    assert [list(stage) for stage in stages] == [['cat'], ['sort', '-n']]
+    assert stages[0].redirects == [('<', 'in.txt')]
+    assert stages[1].redirects == [('2>&1', None), ('>', 'out.txt')]
+
+
+def test_background_jobs_and_aliases(shell):
+    jobs = shell.parse_line('sleep 1 & ll /tmp')
+    assert [(stages, background) for stages, background in jobs] == [
+        ([['sleep', '1']], True), ([['ls', '-l', '/tmp']], False)]
+    # Only the command word is an alias, and values may hold operators
+    (stages, _), = shell.parse_line('echo ll | count')
+    assert stages == [['echo', 'll'], ['sort'], ['uniq', '-c']]
+
+
+@pytest.mark.parametrize('line', ['cat >', '| wc', 'cat |', '> out', 'cat > | wc', 'cat >& x'])
+def test_parse_errors(shell, line):
+    with pytest.raises(ValueError):
+        shell.parse_line(line)
@@ -0,0 +1,27 @@
+"""A reader that goes away early ends the shell like SIGPIPE would."""
+
+import subprocess
+import sys
+
+from conftest import LAUNCHER
+
+
+def test_internal_pipeline_stops_at_head(tmp_path, run_shell):
+    (tmp_path / 'big.txt').write_text(''.join(f"{i}\n" for i in range(200000)))
+    result = run_shell("cat big.txt | head -n 2\ncat big.txt | grep 9 | head -n 1")
+    assert result.returncode == 0
+    assert result.stdout == '0\n1\n9\n'
+    assert result.stderr == ''
+
+
+def test_closed_stdout_exits_141(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    (tmp_path / 'big.txt').write_text(''.join(f"{i}\n" for i in range(200000)))
+    shell = subprocess.Popen([sys.executable, LAUNCHER, '-c', "cat big.txt\ntouch after"],
+                             cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert shell.stdout.readline() == b'0\n'
+    shell.stdout.close()
+    assert shell.wait(60) == 141
+    # Quietly, and without running the rest of the script
+    assert shell.stderr.read() == b''
+    assert not (tmp_path / 'after').exists()